@@ -0,0 +1,283 @@
+"""
+Contact Admission
+Cheap checks SubmitContactForm runs before any Cosmos write or NLP work:
+per-client token buckets, the keyword/pattern spam heuristics, duplicate
+suppression and a cap on submissions in flight, so a spam flood is turned
+away with 429s while real senders keep their latency
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import azure.functions as func
+
+from sentiment_analyzer import SentimentAnalyzer
+
+# Outcomes answered with 429 and Retry-After
+THROTTLED = ('rate_limited', 'overloaded', 'in_progress')
+
+# Seconds a client is asked to wait when the worker is saturated or the
+# same submission is still being stored
+BUSY_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 3600
+
+# A network (office, mobile carrier NAT) may hold several senders, so the
+# per-IP bucket is this many times larger than the per-client one
+IP_BURST_FACTOR = 4
+
+# client_address() when X-Forwarded-For is missing
+UNKNOWN_ADDRESS = 'unknown'
+
+# Proxies of our own (e.g. Front Door) in front of the Functions front end;
+# each appends one X-Forwarded-For hop after the caller's address
+TRUSTED_PROXIES = int(os.environ.get("CONTACT_TRUSTED_PROXIES", "0"))
+
+_controller: Optional['AdmissionController'] = None
+_controller_configured = False
+_controller_lock = threading.Lock()
+
+
+@dataclass
+class Decision:
+    """What AdmissionController.admit decided for one submission"""
+    outcome: str
+    retry_after: float = 0.0
+    # Id the first copy of a suppressed duplicate was stored under
+    message_id: Optional[str] = None
+    fingerprint: Optional[str] = None
+
+    @property
+    def admitted(self) -> bool:
+        return self.outcome == 'admitted'
+
+
+class TokenBucket:
+    """`capacity` tokens, refilled at `rate` tokens per second"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def wait(self, now: float, cost: float = 1.0) -> float:
+        """Seconds until cost tokens are available (0 when they are now)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def spend(self, cost: float = 1.0) -> None:
+        self.tokens -= cost
+
+
+def fingerprint(email: str, subject: str, message: str) -> str:
+    """Identity of a submission: sender and text, ignoring case and whitespace"""
+    normalized = '\0'.join(' '.join(part.lower().split()) for part in (email, subject, message))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def client_address(req: func.HttpRequest, trusted_proxies: int = TRUSTED_PROXIES) -> str:
+    """
+    Caller's IP, without a port
+
+    The Functions front end appends the address it saw to X-Forwarded-For,
+    after whatever the caller sent, so only the last hop (or the one before
+    `trusted_proxies` hops appended by our own proxies) can be trusted; the
+    leading hops are caller-controlled.
+    """
+    hops = [hop.strip() for hop in req.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    if not hops:
+        return UNKNOWN_ADDRESS
+    forwarded = hops[max(0, len(hops) - 1 - trusted_proxies)]
+    if forwarded.startswith('['):  # [IPv6]:port
+        return forwarded[1:].split(']')[0]
+    if forwarded.count(':') == 1:  # IPv4:port
+        return forwarded.split(':')[0]
+    return forwarded
+
+
+class AdmissionController:
+    """
+    Admission state of one worker, consulted before a submission is stored.
+
+    A submission spends a token from three buckets: its client (IP and
+    User-Agent), its IP and its email address; any empty bucket rejects it
+    as rate_limited. Without a known IP the IP bucket is skipped, since
+    every such caller would share it. A resend of a submission seen within
+    `duplicate_window` seconds is a duplicate and is answered with the id
+    of the first copy (or 429 while that copy is still being stored). Text
+    scoring at least `spam_threshold` on SentimentAnalyzer's keyword and
+    pattern heuristics is dropped as spam without a write; the score is
+    the analyzer's own, so anything below the threshold is stored and
+    classified as before. At most `max_in_flight` admitted submissions are
+    processed at once; beyond that they are rejected as overloaded.
+
+    Each worker keeps its own buckets, so the effective limits scale with
+    the number of instances.
+    """
+
+    def __init__(self, rate_per_hour: float = 10, burst: int = 3, duplicate_window: float = 600,
+                 spam_threshold: float = 1.0, max_in_flight: int = 32, max_clients: int = 10000):
+        self.rate = rate_per_hour / 3600
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.spam_threshold = spam_threshold
+        self.max_in_flight = max_in_flight
+        self.max_clients = max_clients
+        self.counts: Dict[str, int] = {}
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        # fingerprint -> (first seen, outcome, message id once stored)
+        self._recent: "OrderedDict[str, Tuple[float, str, Optional[str]]]" = OrderedDict()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def admit(self, address: str, user_agent: str, email: str, subject: str, message: str,
+              now: Optional[float] = None) -> Decision:
+        """
+        Decide whether a submission may be stored
+
+        An admitted Decision holds an in-flight slot until complete() is
+        called with it.
+        """
+        now = time.monotonic() if now is None else now
+        key = fingerprint(email, subject, message)
+        # Pure regex and keyword matching: no TextBlob, no I/O
+        spam_score, _ = SentimentAnalyzer._detect_spam(f"{subject} {message}".lower())
+
+        with self._lock:
+            self._expire(now)
+            buckets = [self._bucket(('client', f'{address} {user_agent}'), self.burst, now),
+                       self._bucket(('email', email.strip().lower()), self.burst, now)]
+            if address != UNKNOWN_ADDRESS:
+                buckets.append(self._bucket(('ip', address), self.burst * IP_BURST_FACTOR, now))
+            wait = max(bucket.wait(now) for bucket in buckets)
+            if wait > 0:
+                return self._decide(Decision('rate_limited', retry_after=wait))
+
+            seen = self._recent.get(key)
+            if seen is None and spam_score < self.spam_threshold and self._in_flight >= self.max_in_flight:
+                return self._decide(Decision('overloaded', retry_after=BUSY_RETRY_AFTER))
+
+            for bucket in buckets:
+                bucket.spend()
+            if seen is not None:
+                _, outcome, message_id = seen
+                if outcome == 'admitted':
+                    return self._decide(Decision('in_progress', retry_after=BUSY_RETRY_AFTER))
+                return self._decide(Decision('duplicate', message_id=message_id))
+
+            if spam_score >= self.spam_threshold:
+                self._recent[key] = (now, 'spam', None)
+                return self._decide(Decision('spam', fingerprint=key))
+
+            self._recent[key] = (now, 'admitted', None)
+            self._in_flight += 1
+            return self._decide(Decision('admitted', fingerprint=key))
+
+    def complete(self, decision: Decision, message_id: Optional[str]) -> None:
+        """
+        Release an admitted submission's slot. With the id it was stored
+        under, resends are answered as duplicates; without one (it failed)
+        a retry is admitted again.
+        """
+        if not decision.admitted:
+            return
+        with self._lock:
+            self._in_flight -= 1
+            seen = self._recent.get(decision.fingerprint)
+            if seen is None:
+                return
+            if message_id is None:
+                del self._recent[decision.fingerprint]
+            else:
+                self._recent[decision.fingerprint] = (seen[0], 'stored', message_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts, in_flight=self._in_flight, clients=len(self._buckets),
+                        recent_submissions=len(self._recent))
+
+    def _bucket(self, key: Tuple[str, str], capacity: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity, self.rate, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _expire(self, now: float) -> None:
+        # Insertion order is arrival order, so expired entries are at the front
+        while len(self._recent) > self.max_clients:
+            self._recent.popitem(last=False)
+        while self._recent:
+            key, (seen_at, outcome, _) = next(iter(self._recent.items()))
+            if now - seen_at < self.duplicate_window or outcome == 'admitted':
+                break
+            del self._recent[key]
+
+    def _decide(self, decision: Decision) -> Decision:
+        self.counts[decision.outcome] = self.counts.get(decision.outcome, 0) + 1
+        return decision
+
+
+def get_controller() -> Optional[AdmissionController]:
+    """
+    Process-wide admission controller configured from app settings, or None when disabled
+
+    Settings:
+        CONTACT_ADMISSION_ENABLED: run admission checks (default true)
+        CONTACT_RATE_PER_HOUR: submissions per client, IP and email address (default 10)
+        CONTACT_RATE_BURST: submissions allowed back to back (default 3)
+        CONTACT_DUPLICATE_WINDOW: seconds a resent submission counts as a duplicate (default 600)
+        CONTACT_PREFILTER_SPAM_SCORE: heuristic spam score dropped before storage
+            (default 1.0, above 1 disables the pre-filter)
+        CONTACT_MAX_IN_FLIGHT: submissions processed at once per worker (default 32)
+        CONTACT_TRUSTED_PROXIES: proxies of our own in front of the Functions front end,
+            whose X-Forwarded-For hops are skipped to find the caller (default 0)
+    """
+    global _controller, _controller_configured
+    if not _controller_configured:
+        with _controller_lock:
+            if not _controller_configured:
+                if os.environ.get("CONTACT_ADMISSION_ENABLED", "true").lower() == "true":
+                    _controller = AdmissionController(
+                        rate_per_hour=float(os.environ.get("CONTACT_RATE_PER_HOUR", "10")),
+                        burst=int(os.environ.get("CONTACT_RATE_BURST", "3")),
+                        duplicate_window=float(os.environ.get("CONTACT_DUPLICATE_WINDOW", "600")),
+                        spam_threshold=float(os.environ.get("CONTACT_PREFILTER_SPAM_SCORE", "1.0")),
+                        max_in_flight=int(os.environ.get("CONTACT_MAX_IN_FLIGHT", "32"))
+                    )
+                _controller_configured = True
+    return _controller
+
+
+def rejection(decision: Decision) -> func.HttpResponse:
+    """
+    Response for a submission that was not admitted: 429 with Retry-After
+    when throttled; otherwise (duplicate, spam) the usual success body, so
+    resends and spam bots learn nothing
+    """
+    headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if decision.outcome in THROTTLED:
+        headers['Retry-After'] = str(max(1, math.ceil(min(decision.retry_after, MAX_RETRY_AFTER))))
+        return func.HttpResponse(
+            json.dumps({"error": "Too many submissions, please try again later"}),
+            status_code=429,
+            headers=headers
+        )
+    body = {"success": True, "message": "Message received successfully"}
+    if decision.message_id is not None:
+        body["message_id"] = decision.message_id
+    return func.HttpResponse(json.dumps(body), status_code=200, headers=headers)
@@ -0,0 +1,187 @@
+"""
+Analysis Cache
+Bounded LRU + TTL memo of SentimentAnalyzer results keyed by a hash of the
+analyzed text and the analyzer version, with a SimHash index that lets
+near-copies of known spam skip the NLP pipeline
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+SIMHASH_BITS = 64
+# Eight 8-bit bands: two hashes within 7 bits of each other share at least one band
+SIMHASH_BANDS = 8
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+
+# Only the leading words are fingerprinted; spam templates are short and
+# this bounds the cost for very long messages
+SIMHASH_MAX_WORDS = 256
+
+# A SimHash of a few words is dominated by each one of them, so unrelated
+# short texts land within a few bits of each other; shorter texts are only
+# matched exactly
+NEAR_DUPLICATE_MIN_WORDS = 12
+
+WORD = re.compile(r'\w+')
+
+_cache: Optional['AnalysisCache'] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over the words of text"""
+    return _simhash(WORD.findall(text)[:SIMHASH_MAX_WORDS])
+
+
+def _simhash(features: List[str]) -> int:
+    if not features:
+        return 0
+    # A bit is set when more than half the feature hashes have it set;
+    # counting per column of the binary strings keeps the loop in C
+    rows = [format(int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big'),
+                   f'0{SIMHASH_BITS}b') for feature in features]
+    half = len(rows) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in zip(*rows)), 2)
+
+
+def _bands(fingerprint: int) -> List[Tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(band, fingerprint >> (band * BAND_BITS) & mask) for band in range(SIMHASH_BANDS)]
+
+
+class AnalysisCache:
+    """
+    Memo consulted by SentimentAnalyzer.analyze_many.
+
+    Exact entries are keyed by sha256(version + text), so bumping
+    ANALYSIS_VERSION invalidates everything. With `near_duplicates` on, spam
+    results are also indexed by SimHash; a new text within `max_distance`
+    bits of a cached spam text reuses that result. Only spam is shared this
+    way, since a spam template's score does not depend on the details that
+    vary between copies, while priority for real messages can. Texts of
+    fewer than `min_words` words are neither indexed nor looked up.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600, near_duplicates: bool = True,
+                 max_distance: int = 6, min_words: int = NEAR_DUPLICATE_MIN_WORDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_duplicates = near_duplicates
+        self.max_distance = min(max_distance, SIMHASH_BANDS - 1)
+        self.min_words = min_words
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        # key -> (stored_at, result, fingerprint or None)
+        self._entries: "OrderedDict[str, Tuple[float, Dict, Optional[int]]]" = OrderedDict()
+        self._bands: Dict[Tuple[int, int], set] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, version: str) -> str:
+        return hashlib.sha256(f'{version}\0{text}'.encode('utf-8')).hexdigest()
+
+    def get(self, text: str, version: str) -> Optional[Dict]:
+        """Cached result for text, or for a near-copy of known spam; None on a miss"""
+        key = self.key(text, version)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry is not None:
+                self._evict(key)
+
+        fingerprint = self._fingerprint(text) if self.near_duplicates else None
+        if fingerprint is not None:
+            result = self._near_duplicate(fingerprint, version, now)
+            if result is not None:
+                return result
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, version: str, result: Dict) -> None:
+        key = self.key(text, version)
+        fingerprint = self._fingerprint(text) if self.near_duplicates and result.get('is_spam') else None
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.time(), dict(result), fingerprint)
+            if fingerprint is not None:
+                for band in _bands(fingerprint):
+                    self._bands.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'near_hits': self.near_hits, 'misses': self.misses}
+
+    def _fingerprint(self, text: str) -> Optional[int]:
+        """SimHash of text, or None when it is too short to match approximately"""
+        features = WORD.findall(text)[:SIMHASH_MAX_WORDS]
+        if len(features) < self.min_words:
+            return None
+        return _simhash(features)
+
+    def _near_duplicate(self, fingerprint: int, version: str, now: float) -> Optional[Dict]:
+        with self._lock:
+            candidates = set()
+            for band in _bands(fingerprint):
+                candidates.update(self._bands.get(band, ()))
+            for key in candidates:
+                stored_at, result, other = self._entries[key]
+                if (now - stored_at < self.ttl and result.get('analysis_version') == version
+                        and bin(fingerprint ^ other).count('1') <= self.max_distance):
+                    self.near_hits += 1
+                    return dict(result)
+        return None
+
+    def _evict(self, key: str) -> None:
+        """Drop an entry and its band postings; caller holds the lock"""
+        _, _, fingerprint = self._entries.pop(key)
+        if fingerprint is not None:
+            for band in _bands(fingerprint):
+                postings = self._bands.get(band)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._bands[band]
+
+
+def get_cache() -> Optional[AnalysisCache]:
+    """
+    Process-wide cache configured from app settings, or None when disabled
+
+    Settings:
+        ANALYSIS_CACHE_SIZE: cached results (default 2048, 0 disables the cache)
+        ANALYSIS_CACHE_TTL: seconds a result is reused (default 3600)
+        ANALYSIS_NEAR_DUPLICATES: reuse spam results for near-copies (default true)
+        ANALYSIS_NEAR_DUPLICATE_BITS: SimHash distance counted as a near-copy (default 6, max 7)
+        ANALYSIS_NEAR_DUPLICATE_MIN_WORDS: shortest text matched as a near-copy (default 12)
+    """
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                size = int(os.environ.get("ANALYSIS_CACHE_SIZE", "2048"))
+                if size > 0:
+                    _cache = AnalysisCache(
+                        max_entries=size,
+                        ttl=float(os.environ.get("ANALYSIS_CACHE_TTL", "3600")),
+                        near_duplicates=os.environ.get("ANALYSIS_NEAR_DUPLICATES", "true").lower() == "true",
+                        max_distance=int(os.environ.get("ANALYSIS_NEAR_DUPLICATE_BITS", "6")),
+                        min_words=int(os.environ.get("ANALYSIS_NEAR_DUPLICATE_MIN_WORDS", "12"))
+                    )
+                _cache_configured = True
+    return _cache
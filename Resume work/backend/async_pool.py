@@ -0,0 +1,205 @@
+"""
+Async I/O Pool
+azure.cosmos.aio client, shared aiohttp session and CPU executor behind the
+async HTTP routes, so one worker's event loop overlaps many Cosmos and
+outbound HTTP round trips instead of parking a thread on each
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import aiohttp
+from azure.cosmos.aio import CosmosClient, DatabaseProxy
+
+import cosmos_pool
+import partitioning
+from telemetry import instrument_async_container
+
+_cpu_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool_lock = threading.Lock()
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class AsyncCosmosPool:
+    """
+    Lazily connected azure.cosmos.aio client and container registry.
+
+    aio clients belong to the event loop that created them. The Functions
+    host runs every async function of a worker on one loop; if the pool is
+    used from another (a script, a benchmark) it reconnects there. Like
+    CosmosPool, a connection-level failure drops the client so the next
+    request reconnects.
+    """
+
+    def __init__(self, database_name: str = cosmos_pool.DATABASE_NAME,
+                 connection_setting: str = cosmos_pool.CONNECTION_SETTING):
+        self.database_name = database_name
+        self.connection_setting = connection_setting
+        self._client: Optional[CosmosClient] = None
+        self._database: Optional[DatabaseProxy] = None
+        self._containers: Dict[str, object] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get_container(self, name: str):
+        """Return a pooled aio container client, connecting on first use (instrumented, see telemetry.py)"""
+        if self._loop is not asyncio.get_running_loop():
+            self.reset()
+            self._loop = asyncio.get_running_loop()
+            self._lock = asyncio.Lock()
+        container = self._containers.get(name)
+        if container is not None:
+            return container
+
+        async with self._lock:
+            if self._database is None:
+                connection_string = os.environ.get(self.connection_setting)
+                if not connection_string:
+                    raise RuntimeError(f'{self.connection_setting} is not configured')
+                client = CosmosClient.from_connection_string(connection_string)
+                await client.__aenter__()
+                self._client = client
+                self._database = client.get_database_client(self.database_name)
+                logging.info(f'Async Cosmos client initialized for database {self.database_name}')
+            container = self._containers.get(name)
+            if container is None:
+                container = instrument_async_container(self._database.get_container_client(name))
+                self._containers[name] = container
+            return container
+
+    def report_failure(self, error: Exception) -> None:
+        if cosmos_pool.is_connection_error(error):
+            logging.warning(f'Async Cosmos connection failure, resetting pool: {str(error)}')
+            self.reset()
+
+    def reset(self) -> None:
+        """Discard the client (closed in the background on its own loop) and every cached container"""
+        client, loop = self._client, self._loop
+        self._client = None
+        self._database = None
+        self._containers = {}
+        if client is not None and loop is not None and not loop.is_closed():
+            try:
+                if asyncio.get_running_loop() is loop:
+                    loop.create_task(client.close())
+            except RuntimeError:
+                pass
+
+
+class ThreadedContainer:
+    """
+    Async face of a synchronous container client: every call runs on a
+    worker thread with asyncio.to_thread. Serves the containers routed
+    through partitioning.BucketedContainer, whose dual writes only exist
+    synchronously, while a partition migration is in progress.
+    """
+
+    OPERATIONS = ('read_item', 'create_item', 'upsert_item', 'replace_item', 'patch_item',
+                  'delete_item', 'execute_item_batch')
+
+    def __init__(self, container):
+        self._container = container
+
+    @property
+    def id(self) -> str:
+        return self._container.id
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._container, name)
+        if name in self.OPERATIONS:
+            return functools.partial(asyncio.to_thread, attribute)
+        return attribute
+
+    def query_items(self, query: str, **kwargs):
+        return _ThreadedQuery(self._container, query, kwargs)
+
+
+class _ThreadedQuery:
+    """Async iterable over a synchronous query, fetched on a worker thread"""
+
+    def __init__(self, container, query: str, kwargs: Dict):
+        self._container = container
+        self._query = query
+        self._kwargs = dict(kwargs, enable_cross_partition_query=True)
+
+    async def _iterate(self):
+        results = await asyncio.to_thread(
+            lambda: list(self._container.query_items(query=self._query, **self._kwargs)))
+        for item in results:
+            yield item
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+# Shared by every async function in this worker process
+async_cosmos_pool = AsyncCosmosPool()
+
+
+async def get_container(name: str):
+    """
+    Async container client for name: the pooled aio client, or the
+    synchronous partitioning client on a thread when name is mid-migration
+    (PARTITION_MIGRATION_MODE other than legacy)
+
+    Both expose awaitable point operations and an async-iterable
+    query_items (cross-partition by default, as in the aio SDK).
+    """
+    if name in partitioning.BUCKETED_CONTAINERS and partitioning.get_mode() != 'legacy':
+        return ThreadedContainer(await asyncio.to_thread(partitioning.get_container, name))
+    return await async_cosmos_pool.get_container(name)
+
+
+def report_failure(error: Exception) -> None:
+    """Reset whichever Cosmos pools a connection-level error may have come from"""
+    cosmos_pool.cosmos_pool.report_failure(error)
+    async_cosmos_pool.report_failure(error)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Keep-alive aiohttp session for outbound calls (GitHub, Resend), shared
+    by every request on the running event loop
+
+    Setting:
+        HTTP_MAX_CONNECTIONS: open connections across all hosts (default 100)
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=int(os.environ.get("HTTP_MAX_CONNECTIONS", "100")))
+        )
+        _session_loop = loop
+    return _session
+
+
+def get_cpu_pool() -> ThreadPoolExecutor:
+    """
+    Executor for CPU-bound work (SentimentAnalyzer) started from async
+    handlers, so the event loop keeps serving other requests meanwhile
+
+    Setting:
+        ASYNC_CPU_WORKERS: threads (default 4)
+    """
+    global _cpu_pool
+    if _cpu_pool is None:
+        with _cpu_pool_lock:
+            if _cpu_pool is None:
+                _cpu_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("ASYNC_CPU_WORKERS", "4")),
+                                               thread_name_prefix='async-cpu')
+    return _cpu_pool
+
+
+async def offload(fn: Callable, *args, **kwargs):
+    """Run fn on the CPU pool and await its result (the telemetry context goes with it)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_cpu_pool(), functools.partial(context.run, fn, *args, **kwargs))
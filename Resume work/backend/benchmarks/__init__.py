@@ -0,0 +1,4 @@
+"""
+Backend Benchmarks
+Run from the backend directory, e.g. `python -m benchmarks.counter_load`
+"""
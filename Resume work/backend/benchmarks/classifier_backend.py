@@ -0,0 +1,104 @@
+"""
+Classifier Backend Benchmark
+Labels a synthetic set of contact messages with the heuristic analyzer
+(keywords + TextBlob), trains the hashed-feature classifier on part of it,
+and compares the two backends: SentimentAnalyzer.analyze_many throughput on
+single messages and batches, agreement with the heuristic labels on the
+held-out part, and the size of the weights file
+
+Usage:
+    python -m benchmarks.classifier_backend [--messages 4000] [--batch 200] [--seconds 1.0]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Measure scoring itself, not the analysis cache
+os.environ.setdefault('ANALYSIS_CACHE_SIZE', '0')
+
+import classifier
+from classifier import HashedClassifier, evaluate, labelled, train
+from sentiment_analyzer import SentimentAnalyzer, warm_up
+
+OPENERS = ['Hi Sean,', 'Hello,', 'Hey there!', 'Good morning,', 'Dear Sean,', '']
+POSITIVE = ['I really enjoyed your portfolio, great work.', 'Thanks for the amazing write-up on Azure Functions!',
+            'Your resume site is impressive and the design is excellent.', 'Love the architecture diagram, brilliant idea.']
+NEGATIVE = ['The download link is broken and I get an error.', 'The contact page failed twice, very frustrating.',
+            'Your GitHub stats widget looks wrong and the numbers are bad.', 'I am disappointed, the site is useless on mobile.']
+NEUTRAL = ['We are hiring a cloud engineer in Dublin.', 'Are you available for an interview next week?',
+           'Could you send your resume as a PDF?', 'I have a question about the Terraform setup.']
+SPAM = ['Congratulations, you are a winner! Click here to claim your prize.', 'Earn cash fast with our guaranteed '
+        'crypto investment, no risk!', 'Limited time offer: free money, act now!!!!! $$$',
+        'Work from home and get rich, visit http://promo.example.com http://win.example.com']
+
+
+def synthetic_export(count: int) -> list:
+    """ContactMessages-like documents whose analysis comes from the heuristic analyzer"""
+    rng = random.Random(3)
+    docs = []
+    for n in range(count):
+        pools = rng.choice([[POSITIVE, NEUTRAL], [NEGATIVE, NEUTRAL], [NEUTRAL], [SPAM, SPAM], [SPAM, POSITIVE]])
+        sentences = [rng.choice(pool) for pool in pools for _ in range(rng.randint(1, 2))]
+        rng.shuffle(sentences)
+        subject = rng.choice(['Hello', 'Opportunity', 'Question', 'Issue', 'You won'])
+        message = f'{rng.choice(OPENERS)} {" ".join(sentences)} #{n}'
+        docs.append({'subject': subject, 'message': message,
+                     'analysis': SentimentAnalyzer.analyze(subject, message)})
+    return docs
+
+
+def rate(fn, seconds: float) -> float:
+    """Calls per second of fn(), measured for roughly `seconds`"""
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def use(model) -> None:
+    # Swap the process-wide backend (get_classifier) for this measurement
+    classifier._classifier, classifier._classifier_configured = model, True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=4000, help='synthetic labelled messages')
+    parser.add_argument('--batch', type=int, default=200, help='messages per analyze_many batch')
+    parser.add_argument('--seconds', type=float, default=1.0, help='measurement time per cell')
+    args = parser.parse_args()
+
+    use(None)
+    warm_up()
+    docs = synthetic_export(args.messages)
+    examples = labelled(docs)
+    held_out = len(examples) // 5
+    model = train(examples[held_out:])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'classifier_weights.npz')
+        model.save(path)
+        size = os.path.getsize(path)
+        model = HashedClassifier.load(path)
+    agreement = evaluate(model, examples[:held_out])
+    print(f'trained on {len(examples) - held_out} messages, weights {size / 1024:.0f} KB; agreement with the '
+          f'heuristics on {held_out} held out: spam {agreement["spam_accuracy"]:.1%}, '
+          f'sentiment {agreement["sentiment_accuracy"]:.1%}')
+
+    pairs = [(doc['subject'], doc['message']) for doc in docs[:args.batch]]
+    print(f'{"backend":<10} {"single msg/s":>14} {"batch msg/s":>14}')
+    for label, backend in (('heuristic', None), ('hashed', model)):
+        use(backend)
+        single = rate(lambda: SentimentAnalyzer.analyze(*pairs[0]), args.seconds)
+        batch = rate(lambda: SentimentAnalyzer.analyze_many(pairs), args.seconds) * len(pairs)
+        print(f'{label:<10} {single:>14,.0f} {batch:>14,.0f}')
+    use(None)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Cold Start Benchmark
+Starts a fresh interpreter per endpoint and reports the time to import
+function_app (with its Azure SDK dependencies) and the latency of the first
+and second request, with the NLP pre-warm off and on. Cosmos is replaced
+with in-memory containers.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 3] [--startup-gap 0.5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (endpoint, method, query params, JSON body)
+ENDPOINTS = [
+    ('GetVisitorCount', 'GET', {}, None),
+    ('GetResumeStats', 'GET', {}, None),
+    ('GetAnalytics', 'GET', {'metric': 'downloads'}, None),
+    ('GetPrioritizedMessages', 'GET', {}, None),
+    ('SubmitContactForm', 'POST', {}, {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Interview',
+                                       'message': 'Great portfolio, are you free this week?'}),
+    ('AnalyzeMessage', 'POST', {}, {'message_id': 'seed-message'}),
+]
+
+# Runs in the child interpreter; timings are printed as one JSON line
+CHILD = r'''
+import asyncio, json, sys, time
+started = time.perf_counter()
+import async_pool, cosmos_pool
+from benchmarks.fakes import AsyncInMemoryContainer, InMemoryContainer
+containers = {}
+def get_container(name):
+    return containers.setdefault(name, InMemoryContainer(name))
+async def get_async_container(name):
+    return AsyncInMemoryContainer(get_container(name))
+cosmos_pool.get_container = get_container
+async_pool.get_container = get_async_container
+get_container('ContactMessages').create_item(body={
+    'id': 'seed-message', 'subject': 'Broken link', 'message': 'The download is not working, please help'})
+
+import function_app
+import azure.functions as func
+imported = time.perf_counter()
+
+name, method, params, body, gap = json.loads(sys.argv[1])
+time.sleep(gap)
+
+class Out:
+    def set(self, value): self.value = value
+    def get(self): return getattr(self, 'value', None)
+
+handler = getattr(function_app, name).build().get_user_function()
+loop = asyncio.new_event_loop()
+def call():
+    req = func.HttpRequest(method=method, url=f'/api/{name}', params=params,
+                           body=json.dumps(body).encode() if body is not None else b'')
+    t = time.perf_counter()
+    response = loop.run_until_complete(handler(req, Out()) if name == 'SubmitContactForm' else handler(req))
+    return (time.perf_counter() - t) * 1000, response.status_code
+
+first_ms, status = call()
+second_ms, _ = call()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_ms': first_ms,
+                  'second_ms': second_ms, 'status': status,
+                  'textblob_loaded': 'textblob' in sys.modules}))
+'''
+
+
+def measure(endpoint: tuple, prewarm: bool, gap: float) -> dict:
+    env = dict(os.environ, NLP_PREWARM='true' if prewarm else 'false',
+               WRITE_BEHIND_ENABLED='false', CONTACT_QUEUE_ENABLED='false',
+               CONTACT_ADMISSION_ENABLED='false')
+    name, method, params, body = endpoint
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, json.dumps([name, method, params, body, gap])],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per endpoint and mode')
+    parser.add_argument('--startup-gap', type=float, default=0.5,
+                        help='seconds between import and the first request (host startup)')
+    args = parser.parse_args()
+
+    print(f'{"endpoint":<24} {"prewarm":<8} {"import ms":>10} {"first ms":>10} {"second ms":>10}  textblob')
+    for endpoint in ENDPOINTS:
+        for prewarm in (False, True):
+            runs = [measure(endpoint, prewarm, args.startup_gap) for _ in range(args.runs)]
+            median = {key: statistics.median(r[key] for r in runs) for key in ('import_ms', 'first_ms', 'second_ms')}
+            print(f'{endpoint[0]:<24} {"on" if prewarm else "off":<8} {median["import_ms"]:>10.1f} '
+                  f'{median["first_ms"]:>10.1f} {median["second_ms"]:>10.1f}  '
+                  f'{"loaded" if runs[-1]["textblob_loaded"] else "-"}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Contact Flood Benchmark
+Replays a spam flood against SubmitContactForm (in-memory Cosmos with
+simulated latency and RU) arriving at a fixed rate, with a trickle of real
+submissions mixed in, once
+with admission control off and once on, and reports the real senders'
+latency and status codes next to the Cosmos writes and RU the flood cost.
+Each mode runs in a fresh interpreter.
+
+Bots post from a few addresses: blatant templated spam (dropped by the
+pre-filter), subtler pitches (stored, unless rate limited) and exact resends.
+Real senders each have their own address.
+
+Usage:
+    python -m benchmarks.contact_flood [--requests 2000] [--rate 200]
+        [--real-ratio 0.05] [--bots 8]
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.endpoint_load import BACKEND_DIR, percentile
+
+BLATANT = ("Congratulations {name}!!!!! You are a winner, click here to claim your free prize "
+           "$$$ at http://promo{n}.example.com and http://win{n}.example.com limited time offer, act now")
+SUBTLE = "Hi {name}, we help developers earn cash with a guaranteed crypto investment. Reply for details ({n})"
+RESEND = "Quick question about your Azure portfolio, can we talk?"
+REAL = ("Hi Sean, I'm {name} from {company}. I saw your Azure portfolio and would like to talk "
+        "about a cloud engineering role. Message #{n}")
+
+NAMES = ['Ada', 'Grace', 'Linus', 'Ken', 'Barbara', 'Alan', 'Margaret', 'Dennis']
+COMPANIES = ['Contoso', 'Fabrikam', 'Northwind', 'Tailspin']
+BROWSER = 'Mozilla/5.0 (Windows NT 10.0) Chrome/120.0'
+
+
+def submissions(count: int, real_ratio: float, bots: int) -> List[Dict]:
+    rng = random.Random(7)
+    burst = []
+    for n in range(count):
+        name = rng.choice(NAMES)
+        if rng.random() < real_ratio:
+            burst.append({'kind': 'real', 'ip': f'198.51.100.{n % 250}', 'agent': BROWSER,
+                          'body': {'name': name, 'email': f'{name.lower()}{n}@example.com', 'subject': 'Opportunity',
+                                   'message': REAL.format(name=name, company=rng.choice(COMPANIES), n=n)}})
+            continue
+        bot = rng.randrange(bots)
+        template = rng.choice([BLATANT, SUBTLE, RESEND])
+        burst.append({'kind': 'spam', 'ip': f'203.0.113.{bot}', 'agent': 'python-requests/2.31',
+                      'body': {'name': name, 'email': f'bot{bot}@spam.example', 'subject': 'Hello',
+                               'message': template.format(name=name, n=n)}})
+    return burst
+
+
+def worker(config: Dict) -> Dict:
+    import os
+    os.environ.update({
+        'CONTACT_ADMISSION_ENABLED': 'true' if config['admission'] else 'false',
+        'CONTACT_QUEUE_ENABLED': 'true',
+        'WRITE_BEHIND_ENABLED': 'false',
+        'NLP_PREWARM': 'false',
+        'TELEMETRY_EXPORTER': 'memory',
+        'PAYLOAD_LOG_SAMPLE_RATE': '0',
+    })
+    from benchmarks.fakes import AsyncInMemoryContainer, InMemoryContainer
+
+    import async_pool
+    import cosmos_pool
+
+    raw: Dict[str, InMemoryContainer] = {}
+    wrapped_async = {}
+
+    def get_container(name: str):
+        if name not in raw:
+            raw[name] = InMemoryContainer(name, latency=config['cosmos_latency'], request_charge=1.0)
+        return raw[name]
+
+    async def get_async_container(name: str):
+        if name not in wrapped_async:
+            wrapped_async[name] = AsyncInMemoryContainer(get_container(name))
+        return wrapped_async[name]
+
+    cosmos_pool.get_container = get_container
+    async_pool.get_container = get_async_container
+
+    import azure.functions as func
+    import function_app
+    from sentiment_analyzer import warm_up
+    warm_up()
+
+    class Out:
+        def set(self, value):
+            self.value = value
+
+    handler = function_app.SubmitContactForm.build().get_user_function()
+
+    async def call(submission: Dict):
+        req = func.HttpRequest(method='POST', url='/api/SubmitContactForm', params={},
+                               headers={'X-Forwarded-For': f'{submission["ip"]}:50000',
+                                        'User-Agent': submission['agent']},
+                               body=json.dumps(submission['body']).encode())
+        t = time.perf_counter()
+        response = await handler(req, submissions=Out())
+        return submission['kind'], (time.perf_counter() - t) * 1000, response.status_code
+
+    async def run(burst: List[Dict]):
+        # Open loop: submissions arrive on schedule however slowly earlier ones are answered
+        started = time.perf_counter()
+
+        async def one(i: int, submission: Dict):
+            await asyncio.sleep(max(0.0, started + i / config['rate'] - time.perf_counter()))
+            return await call(submission)
+        return await asyncio.gather(*(one(i, submission) for i, submission in enumerate(burst)))
+
+    burst = submissions(config['requests'], config['real_ratio'], config['bots'])
+    t = time.perf_counter()
+    samples = asyncio.run(run(burst))
+    elapsed = time.perf_counter() - t
+
+    result = {'admission': config['admission'], 'seconds': elapsed,
+              'stored': raw['ContactMessages'].call_counts.get('create_item', 0) if 'ContactMessages' in raw else 0,
+              'ru': sum(c.total_request_charge for c in raw.values())}
+    for kind in ('real', 'spam'):
+        latencies = [ms for k, ms, _ in samples if k == kind]
+        statuses: Dict[str, int] = {}
+        for k, _, status in samples:
+            if k == kind:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        result[kind] = {'count': len(latencies), 'p50_ms': percentile(latencies, 0.50),
+                        'p95_ms': percentile(latencies, 0.95), 'statuses': statuses}
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='submissions in the flood')
+    parser.add_argument('--real-ratio', type=float, default=0.05, help='fraction from real senders')
+    parser.add_argument('--bots', type=int, default=8, help='distinct bot addresses')
+    parser.add_argument('--rate', type=float, default=200, help='submissions arriving per second')
+    parser.add_argument('--cosmos-latency', type=float, default=0.005, help='simulated seconds per Cosmos call')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker))))
+        return 0
+
+    print(f'{"admission":<10} {"sender":<6} {"count":>6} {"p50 ms":>8} {"p95 ms":>8}  statuses')
+    for admission in (False, True):
+        config = {'admission': admission, 'requests': args.requests, 'real_ratio': args.real_ratio,
+                  'bots': args.bots, 'rate': args.rate, 'cosmos_latency': args.cosmos_latency}
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.contact_flood', '--worker', json.dumps(config)],
+                                cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        mode = 'on' if admission else 'off'
+        for kind in ('real', 'spam'):
+            row = run[kind]
+            statuses = ' '.join(f'{status}x{count}' for status, count in sorted(row['statuses'].items()))
+            print(f'{mode:<10} {kind:<6} {row["count"]:>6} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f}  {statuses}')
+        print(f'{"":<10} {run["seconds"]:.1f}s, {run["stored"]} messages stored, {run["ru"]:.0f} RU')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Visitor Counter Load Test
+Fires concurrent increments at ShardedCounter backed by an in-memory
+container and checks that no increment is lost
+
+Usage:
+    python -m benchmarks.counter_load [--requests 5000] [--threads 64] [--shards 1,4,16]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import InMemoryContainer
+from visitor_counter import ShardedCounter
+
+
+def run(total_requests: int, threads: int, shards: int, latency: float) -> bool:
+    container = InMemoryContainer('Counter', latency=latency)
+    counter = ShardedCounter(container, 'visitor-counter', shard_count=shards)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: counter.increment(), range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    final = counter.read()
+    ok = final == total_requests
+    print(f'shards={shards:<3} requests={total_requests:<6} threads={threads:<4} '
+          f'final={final:<6} {"OK" if ok else "MISMATCH"}  '
+          f'{total_requests / elapsed:,.0f} increments/sec  '
+          f'({container.call_counts})')
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--shards', default='1,4,16', help='comma-separated shard counts')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per Cosmos call')
+    args = parser.parse_args()
+
+    results = [run(args.requests, args.threads, int(s), args.latency) for s in args.shards.split(',')]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
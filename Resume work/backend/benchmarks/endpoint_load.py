@@ -0,0 +1,297 @@
+"""
+Endpoint Load Benchmark
+Runs every HTTP route in function_app.py against in-process stand-ins
+(InMemoryContainer for Cosmos with simulated latency and RU, FakeGitHubServer,
+FakeResendServer) and reports throughput, p50/p95/p99 latency and RU per
+request at several concurrency levels and data sizes. Each data size runs in
+a fresh interpreter, seeded with that many downloads and contact messages.
+The async handlers run on one event loop, as in a Functions worker, with
+`concurrency` requests in flight at a time.
+
+Usage:
+    python -m benchmarks.endpoint_load [--sizes 1000,100000] [--concurrency 1,8,32]
+        [--requests 50] [--routes GetResumeStats,...] [--json results.json]
+        [--compare baseline.json --tolerance 0.25]
+
+--compare exits with status 1 when a route's p95 latency or RU per request
+grew by more than the tolerance against a previous --json run. Seeding and
+scanning 100k documents in memory takes a few minutes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (route, method, query params, JSON body or None); '{message_id}' is
+# replaced with a random seeded message per request
+ROUTES = [
+    ('GetVisitorCount', 'GET', {}, None),
+    ('TrackResumeDownload', 'POST', {}, None),
+    ('GetResumeStats', 'GET', {}, None),
+    ('GetAnalytics', 'GET', {'metric': 'downloads', 'granularity': 'day'}, None),
+    ('GetGitHubStats', 'GET', {}, None),
+    ('SubmitContactForm', 'POST', {}, {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Interview',
+                                       'message': 'Great portfolio, are you free for a call this week?'}),
+    ('AnalyzeMessage', 'POST', {}, {'message_id': '{message_id}'}),
+    ('BatchAnalyzeMessages', 'POST', {}, {'page_size': 50, 'max_seconds': 0}),
+    ('GetPrioritizedMessages', 'GET', {'limit': '50'}, None),
+    ('GetInboxSummary', 'GET', {}, None),
+    ('GetReanalysisStatus', 'GET', {}, None),
+    ('GetTelemetry', 'GET', {}, None),
+]
+
+SUBJECTS = ['Job opportunity', 'Question about your project', 'Collaboration', 'Broken link', 'Hello']
+USER_AGENTS = ['Mozilla/5.0 (Windows NT 10.0) Chrome/120.0', 'Mozilla/5.0 (Macintosh) Safari/605.1',
+               'Mozilla/5.0 (X11; Linux) Firefox/121.0', 'curl/8.4.0']
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+# ============================================================================
+# Worker (one data size, fresh interpreter)
+# ============================================================================
+
+def seed(containers, size: int, now: datetime) -> List[str]:
+    """Fill ResumeDownloads and ContactMessages with `size` documents each; returns the message ids"""
+    rng = random.Random(size)
+    downloads = containers('ResumeDownloads')
+    for _ in range(size):
+        moment = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        downloads.upsert_item(body={'id': str(uuid.uuid4()), 'timestamp': moment.isoformat(),
+                                    'user_agent': rng.choice(USER_AGENTS)})
+
+    messages = containers('ContactMessages')
+    message_ids = []
+    for i in range(size):
+        moment = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        doc = {'id': str(uuid.uuid4()), 'name': f'Sender {i}', 'email': f'sender{i}@example.com',
+               'subject': rng.choice(SUBJECTS), 'message': 'Hi! ' * rng.randint(5, 200),
+               'timestamp': moment.isoformat(), 'status': 'new'}
+        if rng.random() < 0.03:
+            doc['analysis_status'] = 'pending'
+        else:
+            score = rng.randint(1, 10)
+            doc.update({'analysis_status': 'complete', 'analyzed_at': moment.isoformat(), 'analysis': {
+                'sentiment': rng.choice(['positive', 'neutral', 'negative']),
+                'is_spam': rng.random() < 0.1,
+                'spam_score': rng.randint(0, 10),
+                'priority_score': score,
+                'priority': 'high' if score >= 7 else 'medium' if score >= 4 else 'low',
+                'analysis_version': '1.0' if rng.random() < 0.2 else '1.1'
+            }})
+        messages.upsert_item(body=doc)
+        message_ids.append(doc['id'])
+    return message_ids
+
+
+def worker(config: Dict) -> Dict:
+    from benchmarks.fakes import AsyncInMemoryContainer, FakeGitHubServer, FakeResendServer, InMemoryContainer
+
+    github = FakeGitHubServer(repo_count=config['repos'], latency=config['http_latency']).__enter__()
+    resend = FakeResendServer(latency=config['http_latency']).__enter__()
+    os.environ.update({
+        'WRITE_BEHIND_ENABLED': 'false',
+        'CONTACT_ADMISSION_ENABLED': 'false',
+        'CONTACT_QUEUE_ENABLED': 'false',
+        'NLP_PREWARM': 'false',
+        'RESPONSE_CACHE_ENABLED': 'true' if config['response_cache'] else 'false',
+        'TELEMETRY_EXPORTER': 'memory',
+        'PAYLOAD_LOG_SAMPLE_RATE': '0',
+        'GITHUB_USERNAME': github.username,
+        'GITHUB_API_URL': github.url,
+        'GITHUB_CACHE_SHARED': 'false',
+        'RESEND_API_URL': f'{resend.url}/emails',
+        'RESEND_API_KEY': 'benchmark',
+        'CONTACT_EMAIL': 'owner@example.com',
+    })
+
+    import async_pool
+    import cosmos_pool
+    from telemetry import instrument_async_container, instrument_container
+
+    raw: Dict[str, InMemoryContainer] = {}
+    wrapped = {}
+    wrapped_async = {}
+
+    def get_container(name: str):
+        if name not in wrapped:
+            raw[name] = InMemoryContainer(name, latency=config['cosmos_latency'],
+                                          request_charge=1.0, charge_per_item=0.05)
+            wrapped[name] = instrument_container(raw[name])
+        return wrapped[name]
+
+    async def get_async_container(name: str):
+        if name not in wrapped_async:
+            get_container(name)
+            wrapped_async[name] = instrument_async_container(AsyncInMemoryContainer(raw[name]))
+        return wrapped_async[name]
+
+    def fake(name: str) -> InMemoryContainer:
+        get_container(name)
+        return raw[name]
+
+    cosmos_pool.get_container = get_container
+    async_pool.get_container = get_async_container
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    message_ids = seed(fake, config['size'], now)
+    seed_seconds = time.perf_counter() - started
+    for container in raw.values():
+        container.total_request_charge = 0.0
+
+    import azure.functions as func
+    import function_app
+    from sentiment_analyzer import warm_up
+    warm_up()
+
+    class Out:
+        def set(self, value):
+            self.value = value
+
+    async def call(route: str, method: str, params: Dict, body: Optional[Dict]):
+        if body is not None:
+            body = json.loads(json.dumps(body).replace('{message_id}', random.choice(message_ids)))
+        req = func.HttpRequest(method=method, url=f'/api/{route}', params=params,
+                               body=json.dumps(body).encode() if body is not None else b'')
+        handler = getattr(function_app, route).build().get_user_function()
+        t = time.perf_counter()
+        response = await (handler(req, submissions=Out()) if route == 'SubmitContactForm' else handler(req))
+        return (time.perf_counter() - t) * 1000, response.status_code
+
+    async def run(route: str, method: str, params: Dict, body: Optional[Dict], concurrency: int):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                return await call(route, method, params, body)
+        return await asyncio.gather(*(one() for _ in range(config['requests'])))
+
+    loop = asyncio.new_event_loop()
+    results = []
+    for route, method, params, body in ROUTES:
+        if config['routes'] and route not in config['routes']:
+            continue
+        # warm-up: lazy seeding, snapshots, first GitHub fetch
+        loop.run_until_complete(call(route, method, params, body))
+        for concurrency in config['concurrency']:
+            charge_before = sum(c.total_request_charge for c in raw.values())
+            t = time.perf_counter()
+            samples = loop.run_until_complete(run(route, method, params, body, concurrency))
+            elapsed = time.perf_counter() - t
+            latencies = [ms for ms, _ in samples]
+            results.append({
+                'size': config['size'],
+                'route': route,
+                'concurrency': concurrency,
+                'requests': len(samples),
+                'throughput': len(samples) / elapsed,
+                'p50_ms': percentile(latencies, 0.50),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'ru_per_request': (sum(c.total_request_charge for c in raw.values()) - charge_before) / len(samples),
+                'errors': sum(1 for _, status in samples if status >= 500)
+            })
+
+    github.__exit__(None, None, None)
+    resend.__exit__(None, None, None)
+    return {'seed_seconds': seed_seconds, 'emails_sent': len(resend.sent), 'results': results}
+
+
+# ============================================================================
+# Driver
+# ============================================================================
+
+def run_size(size: int, args) -> Dict:
+    config = {
+        'size': size,
+        'concurrency': [int(c) for c in args.concurrency.split(',')],
+        'requests': args.requests,
+        'routes': args.routes.split(',') if args.routes else [],
+        'repos': args.repos,
+        'cosmos_latency': args.cosmos_latency,
+        'http_latency': args.http_latency,
+        'response_cache': not args.no_response_cache,
+    }
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.endpoint_load', '--worker', json.dumps(config)],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Rows whose p95 or RU per request exceeds the baseline by more than tolerance"""
+    with open(baseline_path) as f:
+        baseline = {(r['size'], r['route'], r['concurrency']): r for r in json.load(f)['results']}
+    regressions = []
+    for row in results:
+        before = baseline.get((row['size'], row['route'], row['concurrency']))
+        if before is None:
+            continue
+        for metric in ('p95_ms', 'ru_per_request'):
+            # Small absolute floors keep sub-millisecond noise from failing the run
+            floor = 1.0 if metric == 'p95_ms' else 0.1
+            if row[metric] > before[metric] * (1 + tolerance) + floor:
+                regressions.append(f'{row["route"]} size={row["size"]} c={row["concurrency"]}: '
+                                   f'{metric} {before[metric]:.2f} -> {row[metric]:.2f}')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000', help='documents per container, comma-separated')
+    parser.add_argument('--concurrency', default='1,8,32', help='concurrent requests, comma-separated')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route and concurrency')
+    parser.add_argument('--routes', default='', help='only these routes (comma-separated)')
+    parser.add_argument('--repos', type=int, default=50, help='repositories served by the fake GitHub API')
+    parser.add_argument('--cosmos-latency', type=float, default=0.002, help='simulated seconds per Cosmos call')
+    parser.add_argument('--http-latency', type=float, default=0.02, help='simulated seconds per GitHub/Resend call')
+    parser.add_argument('--no-response-cache', action='store_true', help='run with RESPONSE_CACHE_ENABLED=false')
+    parser.add_argument('--json', help='write all results to this file')
+    parser.add_argument('--compare', help='baseline --json file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(json.loads(args.worker))))
+        return 0
+
+    results = []
+    print(f'{"size":>7} {"route":<24} {"conc":>4} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"RU/req":>8} {"errors":>6}')
+    for size in [int(s) for s in args.sizes.split(',')]:
+        run = run_size(size, args)
+        for row in run['results']:
+            print(f'{row["size"]:>7} {row["route"]:<24} {row["concurrency"]:>4} {row["throughput"]:>9.1f} '
+                  f'{row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} {row["p99_ms"]:>8.1f} '
+                  f'{row["ru_per_request"]:>8.2f} {row["errors"]:>6}')
+        print(f'{"":>7} seeded in {run["seed_seconds"]:.1f}s, {run["emails_sent"]} notification emails sent')
+        results.extend(run['results'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generated_at': datetime.utcnow().isoformat(), 'args': vars(args), 'results': results}, f,
+                      indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
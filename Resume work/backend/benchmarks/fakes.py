@@ -0,0 +1,864 @@
+"""
+Local Stand-ins
+In-process fakes for the Cosmos DB container API, Storage queues, the
+GitHub REST API and the Resend email API used by the backend, so benchmarks and load tests run
+without Azure or network access
+"""
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+# Marker for a path that does not exist on a document (Cosmos 'undefined')
+UNDEFINED = object()
+
+
+class InMemoryContainer:
+    """
+    Thread-safe in-memory subset of azure.cosmos.ContainerProxy.
+
+    Supports point reads and writes, patch operations (including atomic
+    'incr'), single-partition transactional batches and a small SQL dialect
+    covering the queries in function_app.py. A partition_key passed to a
+    read, patch or query is checked against `partition_key_path`.
+    Every call sleeps for `latency` seconds (a `latency=` keyword overrides
+    it per call) and adds `request_charge` RU to `total_request_charge`, to
+    roughly model a remote service; queries add `charge_per_item` RU per
+    result returned.
+    """
+
+    def __init__(self, name: str = 'container', partition_key_path: str = '/id',
+                 latency: float = 0.0, request_charge: float = 1.0, charge_per_item: float = 0.0):
+        self.name = name
+        self.partition_key_path = partition_key_path
+        self.latency = latency
+        self.request_charge = request_charge
+        self.charge_per_item = charge_per_item
+        self.total_request_charge = 0.0
+        self.call_counts: Dict[str, int] = {}
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._etag = 0
+
+    @property
+    def id(self) -> str:
+        return self.name
+
+    # ------------------------------------------------------------------
+    # Point operations
+    # ------------------------------------------------------------------
+
+    def read_item(self, item, partition_key=None, **kwargs) -> Dict[str, Any]:
+        self._charge('read_item', kwargs)
+        with self._lock:
+            doc = self._items.get(self._id(item))
+            if doc is None or not self._in_partition(doc, partition_key):
+                raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+            return copy.deepcopy(doc)
+
+    def create_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._charge('create_item', kwargs)
+        with self._lock:
+            if body['id'] in self._items:
+                raise CosmosResourceExistsError(status_code=409, message='Entity with the specified id already exists')
+            return self._store(body)
+
+    def upsert_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._charge('upsert_item', kwargs)
+        with self._lock:
+            return self._store(body)
+
+    def replace_item(self, item, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._charge('replace_item', kwargs)
+        with self._lock:
+            current = self._items.get(self._id(item))
+            if current is None:
+                raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+            self._check_etag(current, kwargs)
+            return self._store(body)
+
+    def delete_item(self, item, partition_key=None, **kwargs) -> None:
+        self._charge('delete_item', kwargs)
+        with self._lock:
+            if self._items.pop(self._id(item), None) is None:
+                raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+
+    def patch_item(self, item, partition_key=None, patch_operations: Optional[List[Dict[str, Any]]] = None,
+                   **kwargs) -> Dict[str, Any]:
+        self._charge('patch_item', kwargs)
+        with self._lock:
+            current = self._items.get(self._id(item))
+            if current is None or not self._in_partition(current, partition_key):
+                raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+            self._check_etag(current, kwargs)
+            predicate = kwargs.get('filter_predicate')
+            if predicate and not run_query(f'SELECT * {predicate}', [current], {}):
+                raise CosmosAccessConditionFailedError(status_code=412, message='Precondition failed')
+            doc = copy.deepcopy(current)
+            for operation in patch_operations or []:
+                _apply_patch(doc, operation)
+            return self._store(doc)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        params = {p['name']: p['value'] for p in parameters or []}
+        partition_key = kwargs.get('partition_key')
+        # Stored documents are replaced, never mutated, so the query can read
+        # them outside the lock; only the results are copied
+        with self._lock:
+            docs = [d for d in self._items.values() if self._in_partition(d, partition_key)]
+        results = copy.deepcopy(run_query(query, docs, params))
+        self._charge('query_items', kwargs, self.charge_per_item * len(results))
+        return _QueryResults(results, kwargs.get('max_item_count'))
+
+    def execute_item_batch(self, batch_operations: List[tuple], partition_key=None, **kwargs) -> List[Dict[str, Any]]:
+        """Transactional batch of create/upsert/replace/delete within one partition (all or nothing)"""
+        self._charge('execute_item_batch', kwargs)
+        if len(batch_operations) > 100:
+            raise ValueError('A transactional batch holds at most 100 operations')
+        with self._lock:
+            snapshot = dict(self._items)
+            try:
+                results = []
+                for operation in batch_operations:
+                    kind, args = operation[0], operation[1]
+                    if kind in ('create', 'upsert', 'replace'):
+                        body = args[-1]
+                        if self._partition_value(body) != partition_key:
+                            raise ValueError('Batch item is outside the batch partition')
+                        if kind == 'create' and body['id'] in self._items:
+                            raise CosmosResourceExistsError(status_code=409, message='Entity with the specified id already exists')
+                        if kind == 'replace' and body['id'] not in self._items:
+                            raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+                        results.append(self._store(body))
+                    elif kind == 'delete':
+                        if self._items.pop(self._id(args[0]), None) is None:
+                            raise CosmosResourceNotFoundError(status_code=404, message='Entity with the specified id does not exist')
+                        results.append({})
+                    else:
+                        raise ValueError(f'Unsupported batch operation: {kind}')
+                return results
+            except Exception:
+                self._items = snapshot
+                raise
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def items(self) -> List[Dict[str, Any]]:
+        """Snapshot of every stored document"""
+        with self._lock:
+            return [copy.deepcopy(d) for d in self._items.values()]
+
+    def _charge(self, operation: str, kwargs: Dict[str, Any], extra: float = 0.0) -> None:
+        latency = kwargs.pop('latency', self.latency)
+        if latency:
+            time.sleep(latency)
+        charge = self.request_charge + extra
+        with self._lock:
+            self.total_request_charge += charge
+            self.call_counts[operation] = self.call_counts.get(operation, 0) + 1
+        # Like the SDK, report the charge to a caller-supplied response_hook
+        hook = kwargs.get('response_hook')
+        if hook is not None:
+            hook({'x-ms-request-charge': str(charge)}, None)
+
+    def _store(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self._etag += 1
+        doc = copy.deepcopy(body)
+        doc['_etag'] = f'"{self._etag}"'
+        doc['_ts'] = int(time.time())
+        self._items[doc['id']] = doc
+        return copy.deepcopy(doc)
+
+    def _partition_value(self, doc: Dict[str, Any]):
+        value = doc
+        for part in [p for p in self.partition_key_path.split('/') if p]:
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def _in_partition(self, doc: Dict[str, Any], partition_key) -> bool:
+        return partition_key is None or self._partition_value(doc) == partition_key
+
+    @staticmethod
+    def _id(item) -> str:
+        return item['id'] if isinstance(item, dict) else item
+
+    @staticmethod
+    def _check_etag(current: Dict[str, Any], kwargs: Dict[str, Any]) -> None:
+        etag = kwargs.get('etag')
+        if etag is not None and kwargs.get('match_condition') is not None and current.get('_etag') != etag:
+            raise CosmosAccessConditionFailedError(status_code=412, message='Precondition failed')
+
+
+class AsyncInMemoryContainer:
+    """
+    azure.cosmos.aio-style view of an InMemoryContainer, sharing its
+    documents and RU accounting. Operations are coroutines whose latency is
+    an asyncio.sleep, so concurrent requests overlap on one event loop the
+    way they do against the real service; query_items is async-iterable.
+    """
+
+    OPERATIONS = ('read_item', 'create_item', 'upsert_item', 'replace_item', 'delete_item',
+                  'patch_item', 'execute_item_batch')
+
+    def __init__(self, container: InMemoryContainer):
+        self.container = container
+
+    @property
+    def id(self) -> str:
+        return self.container.id
+
+    def __getattr__(self, name: str):
+        method = getattr(self.container, name)
+        if name not in self.OPERATIONS:
+            return method
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self.container.latency)
+            return method(*args, latency=0, **kwargs)
+        return call
+
+    def query_items(self, query: str, **kwargs):
+        return _AsyncQueryResults(self.container, query, kwargs)
+
+
+class _AsyncQueryResults:
+    def __init__(self, container: InMemoryContainer, query: str, kwargs: Dict[str, Any]):
+        self._container = container
+        self._query = query
+        self._kwargs = kwargs
+
+    async def _iterate(self):
+        await asyncio.sleep(self._container.latency)
+        for item in self._container.query_items(self._query, latency=0, **self._kwargs):
+            yield item
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class _QueryResults:
+    """Iterable query result with the SDK's by_page() paging"""
+
+    def __init__(self, results: List[Any], max_item_count: Optional[int] = None):
+        self._results = results
+        self._page_size = max_item_count if max_item_count and max_item_count > 0 else max(len(results), 1)
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def by_page(self, continuation_token: Optional[str] = None) -> '_Pager':
+        return _Pager(self._results, self._page_size, int(continuation_token) if continuation_token else 0)
+
+
+class _Pager:
+    """Page iterator whose continuation_token is an offset, None once exhausted"""
+
+    def __init__(self, results: List[Any], page_size: int, offset: int):
+        self._results = results
+        self._page_size = page_size
+        self._offset = offset
+        self.continuation_token: Optional[str] = str(offset) if offset else None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._offset >= len(self._results):
+            raise StopIteration
+        page = self._results[self._offset:self._offset + self._page_size]
+        self._offset += len(page)
+        self.continuation_token = str(self._offset) if self._offset < len(self._results) else None
+        return iter(page)
+
+
+def _apply_patch(doc: Dict[str, Any], operation: Dict[str, Any]) -> None:
+    parts = [p for p in operation['path'].split('/') if p]
+    parent = doc
+    for part in parts[:-1]:
+        parent = parent.setdefault(part, {})
+    key = parts[-1]
+    op = operation['op']
+    if op in ('add', 'set', 'replace'):
+        parent[key] = copy.deepcopy(operation['value'])
+    elif op == 'remove':
+        parent.pop(key, None)
+    elif op == 'incr':
+        parent[key] = parent.get(key, 0) + operation['value']
+    else:
+        raise ValueError(f'Unsupported patch operation: {op}')
+
+
+# ============================================================================
+# Minimal Cosmos SQL evaluator
+# ============================================================================
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<param>@\w+)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><=|>=|!=|<>|=|<|>|\(|\)|\[|\]|,|\.|\*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'SELECT', 'VALUE', 'TOP', 'FROM', 'WHERE', 'ORDER', 'BY', 'ASC', 'DESC',
+             'AND', 'OR', 'NOT', 'AS', 'TRUE', 'FALSE', 'NULL', 'OFFSET', 'LIMIT'}
+
+
+def _tokenize(query: str) -> List[tuple]:
+    tokens, pos = [], 0
+    query = query.strip()
+    while pos < len(query):
+        match = _TOKEN_RE.match(query, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f'Cannot parse query near: {query[pos:pos + 20]!r}')
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.upper() in _KEYWORDS:
+            kind, value = 'kw', value.upper()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, query: str):
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def peek(self, offset: int = 0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, value: Optional[str] = None):
+        token = self.peek()
+        if value is not None and token[1] != value:
+            raise ValueError(f'Expected {value}, found {token[1]}')
+        self.pos += 1
+        return token
+
+    def accept(self, value: str) -> bool:
+        if self.peek()[1] == value:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> Dict[str, Any]:
+        self.take('SELECT')
+        plan: Dict[str, Any] = {'top': None, 'value': False, 'projection': None,
+                                'where': None, 'order_by': [], 'offset': 0, 'limit': None}
+        if self.accept('TOP'):
+            plan['top'] = self.take()[1]
+        if self.accept('VALUE'):
+            plan['value'] = True
+            plan['projection'] = [(self.expr(), None)]
+        elif self.accept('*'):
+            plan['projection'] = None
+        else:
+            plan['projection'] = self.projection_list()
+        self.take('FROM')
+        self.take()  # collection alias, always 'c'
+        if self.accept('WHERE'):
+            plan['where'] = self.expr()
+        if self.accept('ORDER'):
+            self.take('BY')
+            while True:
+                path = self.expr()
+                descending = False
+                if self.accept('DESC'):
+                    descending = True
+                else:
+                    self.accept('ASC')
+                plan['order_by'].append((path, descending))
+                if not self.accept(','):
+                    break
+        if self.accept('OFFSET'):
+            plan['offset'] = self.take()[1]
+            self.take('LIMIT')
+            plan['limit'] = self.take()[1]
+        return plan
+
+    def projection_list(self) -> List[tuple]:
+        items = []
+        while True:
+            expression = self.expr()
+            alias = None
+            if self.accept('AS'):
+                alias = self.take()[1]
+            elif expression[0] == 'path':
+                alias = expression[1][-1]
+            items.append((expression, alias or f'${len(items) + 1}'))
+            if not self.accept(','):
+                return items
+
+    def expr(self):
+        left = self.and_expr()
+        while self.accept('OR'):
+            left = ('or', left, self.and_expr())
+        return left
+
+    def and_expr(self):
+        left = self.not_expr()
+        while self.accept('AND'):
+            left = ('and', left, self.not_expr())
+        return left
+
+    def not_expr(self):
+        if self.accept('NOT'):
+            return ('not', self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        left = self.atom()
+        if self.peek()[1] in ('=', '!=', '<>', '<', '<=', '>', '>='):
+            op = self.take()[1]
+            return ('cmp', op, left, self.atom())
+        return left
+
+    def atom(self):
+        kind, value = self.take()
+        if value == '(':
+            inner = self.expr()
+            self.take(')')
+            return inner
+        if value == '[':
+            elements = []
+            if not self.accept(']'):
+                while True:
+                    elements.append(self.expr())
+                    if self.accept(']'):
+                        break
+                    self.take(',')
+            return ('array', elements)
+        if kind == 'number':
+            return ('lit', float(value) if '.' in value else int(value))
+        if kind == 'string':
+            return ('lit', value[1:-1])
+        if kind == 'param':
+            return ('param', value)
+        if kind == 'kw' and value in ('TRUE', 'FALSE', 'NULL'):
+            return ('lit', {'TRUE': True, 'FALSE': False, 'NULL': None}[value])
+        if kind == 'name' and self.peek()[1] == '(':
+            self.take('(')
+            args = []
+            if not self.accept(')'):
+                while True:
+                    args.append(self.expr())
+                    if self.accept(')'):
+                        break
+                    self.take(',')
+            return ('call', value.upper(), args)
+        if kind == 'name':
+            path = []
+            while True:
+                if self.accept('.'):
+                    path.append(self.take()[1])
+                elif self.peek()[1] == '[':
+                    self.take('[')
+                    path.append(self.atom()[1])
+                    self.take(']')
+                else:
+                    return ('path', path)
+        raise ValueError(f'Unexpected token {value!r}')
+
+
+_AGGREGATES = {'COUNT', 'SUM', 'MIN', 'MAX', 'AVG'}
+
+
+def _eval(node, doc, params):
+    kind = node[0]
+    if kind == 'lit':
+        return node[1]
+    if kind == 'param':
+        return params.get(node[1], UNDEFINED)
+    if kind == 'array':
+        return [_eval(e, doc, params) for e in node[1]]
+    if kind == 'path':
+        value = doc
+        for part in node[1]:
+            if isinstance(value, dict) and part in value:
+                value = value[part]
+            elif isinstance(value, list) and isinstance(part, int) and part < len(value):
+                value = value[part]
+            else:
+                return UNDEFINED
+        return value
+    if kind == 'and':
+        return _truthy(_eval(node[1], doc, params)) and _truthy(_eval(node[2], doc, params))
+    if kind == 'or':
+        return _truthy(_eval(node[1], doc, params)) or _truthy(_eval(node[2], doc, params))
+    if kind == 'not':
+        value = _eval(node[1], doc, params)
+        return UNDEFINED if value is UNDEFINED else not _truthy(value)
+    if kind == 'cmp':
+        return _compare(node[1], _eval(node[2], doc, params), _eval(node[3], doc, params))
+    if kind == 'call':
+        name, args = node[1], [_eval(a, doc, params) for a in node[2]]
+        if name == 'IS_DEFINED':
+            return args[0] is not UNDEFINED
+        if name == 'ARRAY_CONTAINS':
+            return isinstance(args[0], list) and args[1] in args[0]
+        if name == 'STARTSWITH':
+            return isinstance(args[0], str) and args[0].startswith(args[1])
+        if name == 'LOWER':
+            return args[0].lower() if isinstance(args[0], str) else UNDEFINED
+        if name == 'LEFT':
+            return args[0][:args[1]] if isinstance(args[0], str) else UNDEFINED
+        if name == 'IS_NULL':
+            return args[0] is None
+        raise ValueError(f'Unsupported function {name}')
+    raise ValueError(f'Unsupported expression {kind}')
+
+
+def _truthy(value) -> bool:
+    return value is True
+
+
+def _compare(op, left, right):
+    if left is UNDEFINED or right is UNDEFINED:
+        return UNDEFINED
+    if op == '=':
+        return left == right
+    if op in ('!=', '<>'):
+        return left != right
+    if type(left) is not type(right) and not (isinstance(left, (int, float)) and isinstance(right, (int, float))):
+        return UNDEFINED
+    return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+
+
+def _aggregate(node, docs, params):
+    name, args = node[1], node[2]
+    if name == 'COUNT':
+        return len(docs)
+    values = [_eval(args[0], d, params) for d in docs]
+    values = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if name == 'SUM':
+        return sum(values)
+    if not values:
+        return UNDEFINED
+    if name == 'MIN':
+        return min(values)
+    if name == 'MAX':
+        return max(values)
+    return sum(values) / len(values)
+
+
+def _sort_key(value):
+    # Cosmos orders undefined < null < booleans < numbers < strings
+    if value is UNDEFINED:
+        return (0, 0)
+    if value is None:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    return (4, str(value))
+
+
+def run_query(query: str, docs: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Any]:
+    """Evaluate a Cosmos SQL query against a list of documents"""
+    plan = _plan(query)
+
+    if plan['where'] is not None:
+        docs = [d for d in docs if _truthy(_eval(plan['where'], d, params))]
+
+    projection = plan['projection']
+    if plan['value'] and projection[0][0][0] == 'call' and projection[0][0][1] in _AGGREGATES:
+        result = _aggregate(projection[0][0], docs, params)
+        return [] if result is UNDEFINED else [result]
+
+    for path, descending in reversed(plan['order_by']):
+        docs = sorted(docs, key=lambda d: _sort_key(_eval(path, d, params)), reverse=descending)
+
+    offset = _resolve_int(plan['offset'], params)
+    limit = _resolve_int(plan['limit'], params)
+    top = _resolve_int(plan['top'], params)
+    if limit is not None:
+        docs = docs[offset:offset + limit]
+    elif offset:
+        docs = docs[offset:]
+    if top is not None:
+        docs = docs[:top]
+
+    if projection is None:
+        return docs
+    if plan['value']:
+        values = [_eval(projection[0][0], d, params) for d in docs]
+        return [v for v in values if v is not UNDEFINED]
+
+    rows = []
+    for doc in docs:
+        row = {}
+        for expression, alias in projection:
+            value = _eval(expression, doc, params)
+            if value is not UNDEFINED:
+                row[alias] = value
+        rows.append(row)
+    return rows
+
+
+@functools.lru_cache(maxsize=256)
+def _plan(query: str) -> Dict[str, Any]:
+    # Plans are only read, so one parse per distinct query text is enough
+    return _Parser(query).parse()
+
+
+def _resolve_int(value, params) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, str) and value.startswith('@'):
+        return int(params[value])
+    return int(value)
+
+
+# ============================================================================
+# Fake GitHub API
+# ============================================================================
+
+class InMemoryQueue:
+    """
+    Storage queue stand-in with the Functions host's retry semantics.
+
+    drain() hands each message to `handler` like a queue trigger: a handler
+    exception puts the message back with its dequeue_count bumped, and
+    after `max_dequeue_count` attempts it moves to `poison`.
+
+    Usage:
+        queue = InMemoryQueue()
+        queue.send(contact_pipeline.queue_message(message_id))
+        queue.drain(lambda body, attempt: asyncio.run(contact_pipeline.process_submission(
+            container, contact_pipeline.parse_queue_message(body))))
+    """
+
+    def __init__(self, max_dequeue_count: int = 5):
+        self.max_dequeue_count = max_dequeue_count
+        self.poison: List[str] = []
+        self._messages: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def send(self, body: str) -> None:
+        with self._lock:
+            self._messages.append((body, 0))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._messages)
+
+    def drain(self, handler) -> int:
+        """Deliver messages until the queue is empty; returns successful deliveries"""
+        delivered = 0
+        while True:
+            with self._lock:
+                if not self._messages:
+                    return delivered
+                body, dequeue_count = self._messages.pop(0)
+            dequeue_count += 1
+            try:
+                handler(body, dequeue_count)
+                delivered += 1
+            except Exception:
+                with self._lock:
+                    if dequeue_count >= self.max_dequeue_count:
+                        self.poison.append(body)
+                    else:
+                        self._messages.append((body, dequeue_count))
+
+
+class _LocalServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent
+    # load, and a dropped SYN costs a 1s retransmit
+    request_queue_size = 128
+
+
+class FakeGitHubServer:
+    """
+    Local HTTP server answering the GitHub endpoints GetGitHubStats uses:
+    /users/{user}, /users/{user}/repos (paginated with Link headers) and
+    /repos/{user}/{repo}/languages. Responses carry an ETag and honour
+    If-None-Match with a 304. Every response waits `latency` seconds.
+
+    Usage:
+        with FakeGitHubServer(repo_count=50, latency=0.05) as server:
+            client = AsyncGitHubClient(base_url=server.url)
+    """
+
+    def __init__(self, username: str = 'octocat', repo_count: int = 10, latency: float = 0.0):
+        self.username = username
+        self.latency = latency
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.repos = [
+            {
+                'name': f'repo-{i}',
+                'html_url': f'https://github.com/{username}/repo-{i}',
+                'description': f'Repository {i}',
+                'language': 'Python' if i % 2 else 'JavaScript',
+                'stargazers_count': i % 7,
+                'forks_count': i % 3,
+                'fork': i % 10 == 9,
+                'updated_at': f'2026-01-{1 + i % 28:02d}T00:00:00Z',
+                'pushed_at': f'2026-01-{1 + i % 28:02d}T00:00:00Z'
+            }
+            for i in range(repo_count)
+        ]
+        self._lock = threading.Lock()
+        self._server = _LocalServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def languages(self, repo_name: str) -> Dict[str, int]:
+        index = int(repo_name.rsplit('-', 1)[-1])
+        return {'Python': 1000 * (index + 1), 'JavaScript': 500 * (index % 4), 'HCL': 100}
+
+    def __enter__(self) -> 'FakeGitHubServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _route(self, path: str, query: Dict[str, List[str]]):
+        """Return (status, body, extra headers) for a request path"""
+        parts = [p for p in path.split('/') if p]
+        if parts == ['users', self.username]:
+            return 200, {'login': self.username, 'public_repos': len(self.repos),
+                         'followers': 42, 'following': 7}, {}
+        if parts == ['users', self.username, 'repos']:
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            chunk = self.repos[(page - 1) * per_page:page * per_page]
+            headers = {}
+            if page * per_page < len(self.repos):
+                headers['Link'] = (f'<{self.url}/users/{self.username}/repos?per_page={per_page}'
+                                   f'&page={page + 1}>; rel="next"')
+            return 200, chunk, headers
+        if len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'languages':
+            return 200, self.languages(parts[2]), {}
+        return 404, {'message': 'Not Found'}, {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.request_count += 1
+                parsed = urlparse(self.path)
+                status, body, headers = server._route(parsed.path, parse_qs(parsed.query))
+                payload = json.dumps(body).encode('utf-8')
+                etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    with server._lock:
+                        server.not_modified_count += 1
+                    status, payload = 304, b''
+                self.send_response(status)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ============================================================================
+# Fake Resend API
+# ============================================================================
+
+class FakeResendServer:
+    """
+    Local HTTP server accepting POST /emails like Resend and keeping the
+    payloads in `sent`. Every response waits `latency` seconds; set
+    `fail_status` to answer every request with that status instead.
+
+    Usage:
+        with FakeResendServer(latency=0.1) as server:
+            os.environ['RESEND_API_URL'] = f'{server.url}/emails'
+    """
+
+    def __init__(self, latency: float = 0.0, fail_status: Optional[int] = None):
+        self.latency = latency
+        self.fail_status = fail_status
+        self.sent: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = _LocalServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'FakeResendServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                email = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if urlparse(self.path).path != '/emails':
+                    status, body = 404, {'message': 'Not Found'}
+                elif server.fail_status:
+                    status, body = server.fail_status, {'message': 'Simulated failure'}
+                else:
+                    with server._lock:
+                        server.sent.append(email)
+                        status, body = 200, {'id': f'email-{len(server.sent)}'}
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,53 @@
+"""
+GitHub Fan-out Benchmark
+Times github_stats.build_stats_async against a local fake GitHub API,
+comparing one-at-a-time /languages requests (the old behaviour) with the
+concurrent fan-out on the pooled session
+
+Usage:
+    python -m benchmarks.github_fanout [--repos 10,50,100] [--latency 0.05] [--workers 16]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import async_pool
+from benchmarks.fakes import FakeGitHubServer
+from github_stats import AsyncGitHubClient, build_stats_async
+
+
+async def time_build(server: FakeGitHubServer, workers: int, runs: int) -> float:
+    client = AsyncGitHubClient(base_url=server.url, max_workers=workers)
+    try:
+        await build_stats_async(client, server.username)  # warm the connection pool
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            await build_stats_async(client, server.username)
+            samples.append(time.perf_counter() - start)
+    finally:
+        await async_pool.get_http_session().close()
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repos', default='10,50,100', help='comma-separated repo counts')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per GitHub call')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"repos":>6} {"sequential":>12} {"concurrent":>12} {"speedup":>8}')
+    for repo_count in (int(r) for r in args.repos.split(',')):
+        with FakeGitHubServer(repo_count=repo_count, latency=args.latency) as server:
+            sequential = asyncio.run(time_build(server, 1, args.runs))
+            concurrent = asyncio.run(time_build(server, args.workers, args.runs))
+        print(f'{repo_count:>6} {sequential * 1000:>10.0f}ms {concurrent * 1000:>10.0f}ms {sequential / concurrent:>7.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Keyword Matcher Benchmark
+Compares the old per-keyword substring scans with the precompiled
+KeywordMatcher, and reports full SentimentAnalyzer.analyze throughput, on
+short messages and ~50KB messages
+
+Usage:
+    python -m benchmarks.sentiment_matcher [--seconds 1.0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Measure scoring itself, not the analysis cache
+os.environ.setdefault('ANALYSIS_CACHE_SIZE', '0')
+
+from sentiment_analyzer import SentimentAnalyzer, warm_up
+
+SHORT_MESSAGE = ("Hi Sean, great portfolio! We're hiring a cloud engineer and I'd love to "
+                 "set up an interview. Are you free this week?")
+
+VOCABULARY = (
+    "hello thanks for the download link the deployment is broken again and the error "
+    "keeps coming back could you take a look when you have time good work overall on "
+    "the terraform setup not working after the upgrade please advise"
+).split()
+
+
+def legacy_keyword_scan(text: str) -> tuple:
+    """The pre-matcher approach: one substring scan per keyword per list"""
+    return (
+        sum(1 for k in SentimentAnalyzer.SPAM_KEYWORDS if k in text),
+        sum(1 for k in SentimentAnalyzer.URGENT_KEYWORDS if k in text),
+        sum(1 for k in SentimentAnalyzer.POSITIVE_WORDS if k in text),
+        sum(1 for k in SentimentAnalyzer.NEGATIVE_WORDS if k in text),
+    )
+
+
+def rate(fn, text: str, seconds: float) -> float:
+    """Calls per second of fn(text), measured for roughly `seconds`"""
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn(text)
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=1.0, help='measurement time per cell')
+    args = parser.parse_args()
+
+    warm_up()
+    random.seed(7)
+    large_message = ' '.join(random.choice(VOCABULARY) for _ in range(8000))[:50_000]
+    messages = [('short', SHORT_MESSAGE.lower()), ('50KB', large_message.lower())]
+
+    print(f'{"message":<8} {"legacy scan":>14} {"matcher":>14} {"speedup":>8} {"full analyze":>14}')
+    for label, text in messages:
+        legacy = rate(legacy_keyword_scan, text, args.seconds)
+        matcher = rate(SentimentAnalyzer.MATCHER.count, text, args.seconds)
+        analyze = rate(lambda t: SentimentAnalyzer.analyze('', t), text, args.seconds)
+        print(f'{label:<8} {legacy:>10,.0f}/sec {matcher:>10,.0f}/sec {matcher / legacy:>7.1f}x {analyze:>10,.0f}/sec')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
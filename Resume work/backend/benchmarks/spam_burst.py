@@ -0,0 +1,68 @@
+"""
+Spam Burst Benchmark
+Replays a burst of templated spam (each copy with a different link and
+name) mixed with distinct real messages through SentimentAnalyzer.analyze,
+with the analysis cache off, exact-match only, and with near-duplicates
+
+Usage:
+    python -m benchmarks.spam_burst [--messages 2000] [--spam-ratio 0.8]
+"""
+import argparse
+import random
+import sys
+import time
+
+import analysis_cache
+from analysis_cache import AnalysisCache
+from sentiment_analyzer import SentimentAnalyzer, warm_up
+
+SPAM_TEMPLATE = ("Congratulations {name}!!!!! You are a winner, click here to claim your free prize "
+                 "$$$ at http://promo{n}.example.com and http://win{n}.example.com limited time offer, act now")
+
+REAL_TEMPLATE = ("Hi Sean, I'm {name} from {company}. I saw your Azure portfolio and would like to talk "
+                 "about a cloud engineering role. Message #{n}")
+
+NAMES = ['Ada', 'Grace', 'Linus', 'Ken', 'Barbara', 'Alan', 'Margaret', 'Dennis']
+COMPANIES = ['Contoso', 'Fabrikam', 'Northwind', 'Tailspin']
+
+
+def messages(count: int, spam_ratio: float) -> list:
+    random.seed(11)
+    burst = []
+    for n in range(count):
+        name = random.choice(NAMES)
+        if random.random() < spam_ratio:
+            burst.append(('You won', SPAM_TEMPLATE.format(name=name, n=n)))
+        else:
+            burst.append(('Opportunity', REAL_TEMPLATE.format(name=name, company=random.choice(COMPANIES), n=n)))
+    return burst
+
+
+def run(label: str, cache, burst: list) -> None:
+    # get_cache() is what SentimentAnalyzer consults; swap in this run's cache
+    analysis_cache._cache, analysis_cache._cache_configured = cache, True
+
+    start = time.perf_counter()
+    spam = sum(SentimentAnalyzer.analyze(subject, message)['is_spam'] for subject, message in burst)
+    elapsed = time.perf_counter() - start
+    stats = cache.stats() if cache else {}
+    print(f'{label:<16} {len(burst) / elapsed:>9,.0f} msgs/sec  spam={spam:<5} '
+          f'hits={stats.get("hits", 0):<5} near_hits={stats.get("near_hits", 0):<5} misses={stats.get("misses", 0)}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--spam-ratio', type=float, default=0.8)
+    args = parser.parse_args()
+
+    warm_up()
+    burst = messages(args.messages, args.spam_ratio)
+    run('no cache', None, burst)
+    run('exact only', AnalysisCache(near_duplicates=False), burst)
+    run('near-duplicates', AnalysisCache(near_duplicates=True), burst)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Hashed-Feature Classifier
+Multinomial naive Bayes models for spam and sentiment over hashed word
+unigrams and bigrams, scored with NumPy in a few vector operations per
+batch instead of a TextBlob per message. Trained offline from a labelled
+ContactMessages export and loaded by SentimentAnalyzer from a small .npz
+weights file (see get_classifier); without one, or without NumPy, the
+keyword heuristics and TextBlob stay in use. NumPy is imported only when a
+model is loaded or trained, so workers without weights start without it.
+
+Labels come from a document's `labels` object ({"spam": bool, "sentiment":
+"positive" | "neutral" | "negative"}) when present, otherwise from its
+stored `analysis`, so an export of already analyzed messages trains a
+model that reproduces the current analyzer and hand-corrected labels
+refine it.
+
+Usage:
+    python classifier.py train --input messages.json [--output classifier_weights.npz]
+        [--features 32768] [--holdout 0.2]
+    python classifier.py evaluate --input messages.json [--weights classifier_weights.npz]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bound by _import_numpy() on first use
+np = None
+_numpy_lock = threading.Lock()
+
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classifier_weights.npz')
+
+SENTIMENTS = ('negative', 'neutral', 'positive')
+SPAM_CLASSES = ('ham', 'spam')
+
+# Long messages are classified on their leading words; the verdict rarely
+# changes after that and the cost stays bounded
+MAX_TOKENS = 512
+
+# The spam heuristics' patterns (sentiment_analyzer.py) become tokens, so
+# the model can weigh them like words
+PATTERNS = [
+    (re.compile(r'https?://\S+'), ' xxurl '),
+    (re.compile(r'(.)\1{4,}'), ' xxrepeat '),
+    (re.compile(r'\$\$+'), ' xxdollars '),
+]
+WORD = re.compile(r'\w+')
+
+_classifier: Optional['HashedClassifier'] = None
+_classifier_configured = False
+_classifier_lock = threading.Lock()
+
+
+def _import_numpy() -> bool:
+    """Import NumPy into the module on first call; False when it is not installed"""
+    global np
+    if np is None:
+        with _numpy_lock:
+            if np is None:
+                try:
+                    import numpy
+                except ImportError:  # optional: pip install numpy
+                    return False
+                np = numpy
+    return True
+
+
+def _require_numpy() -> None:
+    if not _import_numpy():
+        raise RuntimeError('numpy is required: pip install numpy')
+
+
+def tokens(text: str) -> List[str]:
+    """Lowercased words of text, with URLs, repeated characters and $$ as marker tokens"""
+    text = text.lower()
+    for pattern, marker in PATTERNS:
+        text = pattern.sub(marker, text)
+    words = WORD.findall(text)[:MAX_TOKENS]
+    return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+
+def hash_features(texts: Sequence[str], n_features: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Sparse bag of hashed unigrams and bigrams for a batch
+
+    Returns (rows, columns): one entry per token occurrence, the row being
+    the text's position in texts. n_features must be a power of two.
+    """
+    _require_numpy()
+    mask = n_features - 1
+    rows: List[int] = []
+    columns: List[int] = []
+    for row, text in enumerate(texts):
+        hashed = [zlib.crc32(token.encode('utf-8')) & mask for token in tokens(text)]
+        rows.extend([row] * len(hashed))
+        columns.extend(hashed)
+    return np.asarray(rows, dtype=np.int32), np.asarray(columns, dtype=np.int32)
+
+
+class NaiveBayesHead:
+    """
+    One multinomial naive Bayes model: a class prior and a log probability
+    per class and hashed feature
+    """
+
+    def __init__(self, classes: Sequence[str], class_log_prior: 'np.ndarray', feature_log_prob: 'np.ndarray'):
+        self.classes = tuple(classes)
+        self.class_log_prior = class_log_prior.astype(np.float32)
+        self.feature_log_prob = feature_log_prob.astype(np.float32)
+
+    @classmethod
+    def fit(cls, classes: Sequence[str], labels: Sequence[int], rows: 'np.ndarray', columns: 'np.ndarray',
+            n_features: int, alpha: float = 1.0) -> 'NaiveBayesHead':
+        """Fit from label indexes (one per text) and the texts' hash_features; alpha is Laplace smoothing"""
+        labels = np.asarray(labels, dtype=np.int64)
+        n_classes = len(classes)
+        class_counts = np.bincount(labels, minlength=n_classes).astype(np.float64)
+        feature_counts = np.zeros((n_classes, n_features))
+        token_labels = labels[rows]
+        for index in range(n_classes):
+            feature_counts[index] = np.bincount(columns[token_labels == index], minlength=n_features)
+        smoothed = feature_counts + alpha
+        return cls(
+            classes,
+            np.log((class_counts + 1) / (class_counts.sum() + n_classes)),
+            np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        )
+
+    def predict_proba(self, rows: 'np.ndarray', columns: 'np.ndarray', n_texts: int) -> 'np.ndarray':
+        """Class probabilities, shape (n_texts, classes)"""
+        joint = np.empty((n_texts, len(self.classes)), dtype=np.float64)
+        for index in range(len(self.classes)):
+            joint[:, index] = self.class_log_prior[index] + np.bincount(
+                rows, weights=self.feature_log_prob[index, columns], minlength=n_texts)
+        joint -= joint.max(axis=1, keepdims=True)
+        probabilities = np.exp(joint)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+class HashedClassifier:
+    """
+    Spam and sentiment heads sharing one hashed feature space.
+
+    score_many returns what SentimentAnalyzer's spam and sentiment stages
+    return: (spam_score, is_spam) with spam_score the spam probability, and
+    (sentiment, polarity) with polarity P(positive) - P(negative) in -1..1.
+    """
+
+    def __init__(self, spam: NaiveBayesHead, sentiment: NaiveBayesHead, n_features: int,
+                 version: Optional[str] = None):
+        if n_features & (n_features - 1):
+            raise ValueError('n_features must be a power of two')
+        self.spam = spam
+        self.sentiment = sentiment
+        self.n_features = n_features
+        # Part of the analysis version, so re-analysis picks up a new model
+        self.version = version or hashlib.sha256(
+            spam.feature_log_prob.tobytes() + sentiment.feature_log_prob.tobytes()).hexdigest()[:8]
+
+    def score_many(self, texts: Sequence[str]) -> Tuple[List[Tuple[float, bool]], List[Tuple[str, float]]]:
+        """(spam results, sentiment results), one of each per text, in order"""
+        if not texts:
+            return [], []
+        rows, columns = hash_features(texts, self.n_features)
+        spam = self.spam.predict_proba(rows, columns, len(texts))[:, self.spam.classes.index('spam')]
+        sentiment = self.sentiment.predict_proba(rows, columns, len(texts))
+        polarity = (sentiment[:, self.sentiment.classes.index('positive')]
+                    - sentiment[:, self.sentiment.classes.index('negative')])
+        labels = sentiment.argmax(axis=1)
+        return (
+            [(float(score), bool(score > 0.5)) for score in spam],
+            [(self.sentiment.classes[label], float(score)) for label, score in zip(labels, polarity)]
+        )
+
+    def save(self, path: str) -> None:
+        # Through a file object, so numpy does not append .npz to the path
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                n_features=np.int64(self.n_features),
+                version=np.array(self.version),
+                spam_classes=np.array(self.spam.classes),
+                spam_prior=self.spam.class_log_prior,
+                spam_weights=self.spam.feature_log_prob,
+                sentiment_classes=np.array(self.sentiment.classes),
+                sentiment_prior=self.sentiment.class_log_prior,
+                sentiment_weights=self.sentiment.feature_log_prob
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'HashedClassifier':
+        _require_numpy()
+        with np.load(path) as weights:
+            return cls(
+                NaiveBayesHead(weights['spam_classes'].tolist(), weights['spam_prior'], weights['spam_weights']),
+                NaiveBayesHead(weights['sentiment_classes'].tolist(), weights['sentiment_prior'],
+                               weights['sentiment_weights']),
+                n_features=int(weights['n_features']),
+                version=str(weights['version'])
+            )
+
+
+def get_classifier() -> Optional[HashedClassifier]:
+    """
+    Process-wide classifier configured from app settings, or None when the
+    heuristic analyzer should be used
+
+    Settings:
+        ANALYSIS_BACKEND: auto (default: the classifier when its weights file
+            exists), hashed, or heuristic (keywords and TextBlob)
+        ANALYSIS_CLASSIFIER_PATH: weights file (default classifier_weights.npz
+            next to this module)
+    """
+    global _classifier, _classifier_configured
+    if not _classifier_configured:
+        with _classifier_lock:
+            if not _classifier_configured:
+                _classifier = _load_configured()
+                _classifier_configured = True
+    return _classifier
+
+
+def _load_configured() -> Optional[HashedClassifier]:
+    backend = os.environ.get("ANALYSIS_BACKEND", "auto").lower()
+    path = os.environ.get("ANALYSIS_CLASSIFIER_PATH", DEFAULT_WEIGHTS_PATH)
+    if backend == 'heuristic' or (backend == 'auto' and not os.path.exists(path)):
+        return None
+    if not _import_numpy():
+        logging.warning('numpy is not installed; analysis uses the keyword heuristics')
+        return None
+    try:
+        classifier = HashedClassifier.load(path)
+        logging.info(f'Hashed-feature classifier {classifier.version} loaded from {path}')
+        return classifier
+    except Exception as e:
+        logging.warning(f'Could not load classifier weights from {path}, analysis uses the keyword heuristics: {str(e)}')
+        return None
+
+
+# ============================================================================
+# Offline training
+# ============================================================================
+
+def read_export(path: str) -> List[Dict]:
+    """Documents from a ContactMessages export: a JSON array, or one document per line"""
+    with open(path, encoding='utf-8') as f:
+        content = f.read().strip()
+    if content.startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def labelled(docs: Iterable[Dict]) -> List[Tuple[str, bool, str]]:
+    """(text, is_spam, sentiment) for every document with both labels"""
+    examples = []
+    for doc in docs:
+        labels = doc.get('labels') or {}
+        analysis = doc.get('analysis') or {}
+        spam = labels.get('spam', analysis.get('is_spam'))
+        sentiment = labels.get('sentiment', analysis.get('sentiment'))
+        if spam is None or sentiment not in SENTIMENTS:
+            continue
+        # The text SentimentAnalyzer.analyze_many scores
+        examples.append((f"{doc.get('subject', '')} {doc.get('message', '')}".lower(), bool(spam), sentiment))
+    return examples
+
+
+def train(examples: Sequence[Tuple[str, bool, str]], n_features: int = 2 ** 15,
+          alpha: float = 1.0) -> HashedClassifier:
+    texts = [text for text, _, _ in examples]
+    rows, columns = hash_features(texts, n_features)
+    spam = NaiveBayesHead.fit(SPAM_CLASSES, [int(is_spam) for _, is_spam, _ in examples],
+                              rows, columns, n_features, alpha)
+    sentiment = NaiveBayesHead.fit(SENTIMENTS, [SENTIMENTS.index(label) for _, _, label in examples],
+                                   rows, columns, n_features, alpha)
+    return HashedClassifier(spam, sentiment, n_features)
+
+
+def evaluate(classifier: HashedClassifier, examples: Sequence[Tuple[str, bool, str]]) -> Dict:
+    """Accuracy of both heads against the examples' labels"""
+    spam, sentiment = classifier.score_many([text for text, _, _ in examples])
+    count = len(examples) or 1
+    return {
+        'examples': len(examples),
+        'spam_accuracy': round(sum(predicted == is_spam for (_, predicted), (_, is_spam, _)
+                                   in zip(spam, examples)) / count, 4),
+        'sentiment_accuracy': round(sum(predicted == label for (predicted, _), (_, _, label)
+                                        in zip(sentiment, examples)) / count, 4)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('train', 'evaluate'))
+    parser.add_argument('--input', required=True, help='ContactMessages export (JSON array or JSON lines)')
+    parser.add_argument('--output', default=DEFAULT_WEIGHTS_PATH, help='train: weights file to write')
+    parser.add_argument('--weights', default=DEFAULT_WEIGHTS_PATH, help='evaluate: weights file to load')
+    parser.add_argument('--features', type=int, default=2 ** 15, help='train: hashed feature space (power of two)')
+    parser.add_argument('--alpha', type=float, default=1.0, help='train: Laplace smoothing')
+    parser.add_argument('--holdout', type=float, default=0.2, help='train: fraction held out to report accuracy')
+    args = parser.parse_args()
+
+    if not _import_numpy():
+        print('numpy is required: pip install numpy', file=sys.stderr)
+        return 1
+    examples = labelled(read_export(args.input))
+    if not examples:
+        print(f'No labelled messages in {args.input}', file=sys.stderr)
+        return 1
+
+    if args.command == 'evaluate':
+        print(json.dumps(evaluate(HashedClassifier.load(args.weights), examples), indent=2))
+        return 0
+
+    random.Random(0).shuffle(examples)
+    held_out = int(len(examples) * args.holdout)
+    result = {'trained_at': datetime.utcnow().isoformat(), 'examples': len(examples)}
+    if held_out:
+        result['holdout'] = evaluate(train(examples[held_out:], args.features, args.alpha), examples[:held_out])
+    # The saved model learns from every example
+    classifier = train(examples, args.features, args.alpha)
+    classifier.save(args.output)
+    result.update({'version': classifier.version, 'output': args.output,
+                   'bytes': os.path.getsize(args.output)})
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Contact Submission Pipeline
+Analysis under a time budget before the single write in SubmitContactForm,
+and the slow steps (pending analysis, Resend notification) that the queue
+worker or the pending-analysis timer finish afterwards
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import aiohttp
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
+
+import async_pool
+import inbox
+from sentiment_analyzer import SentimentAnalyzer
+from telemetry import http_span
+
+QUEUE_NAME = "contact-submissions"
+POISON_QUEUE_NAME = f"{QUEUE_NAME}-poison"
+QUEUE_CONNECTION = "AzureWebJobsStorage"
+
+RESEND_URL = os.environ.get("RESEND_API_URL", "https://api.resend.com/emails")
+RESEND_TIMEOUT = 10
+
+PENDING_PREDICATE = "FROM c WHERE NOT IS_DEFINED(c.analysis)"
+
+# Everything process_submission needs to analyze and notify
+PENDING_QUERY = ("SELECT TOP @limit c.id, c.name, c.email, c.subject, c.message, c.timestamp, c.notified_at FROM c "
+                 "WHERE c.analysis_status = 'pending' AND NOT IS_DEFINED(c.analysis) AND c.timestamp < @cutoff")
+
+# Seconds a pending submission is left to the queue worker before the
+# pending-analysis timer takes it over
+PENDING_MIN_AGE = 600
+
+# Analyses that overrun the budget keep running here; the result is dropped
+_analysis_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='contact-analysis')
+
+
+async def analyze_within_async(subject: str, message: str, budget_seconds: float) -> Optional[Dict]:
+    """
+    Run the analyzer, giving up after budget_seconds; waits on the event
+    loop instead of blocking a thread
+
+    Returns:
+        The analysis, or None if it failed or did not finish in time
+    """
+    future = _analysis_pool.submit(SentimentAnalyzer.analyze, subject=subject, message=message)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), budget_seconds)
+    except asyncio.TimeoutError:
+        logging.info(f'Analysis exceeded its {budget_seconds}s budget; storing as pending')
+    except Exception as e:
+        logging.warning(f'Analysis failed; storing as pending: {str(e)}')
+    return None
+
+
+def new_submission(message_id: str, name: str, email: str, subject: str, message: str,
+                   analysis: Optional[Dict]) -> Dict:
+    """The complete document written by SubmitContactForm"""
+    now = datetime.utcnow().isoformat()
+    doc = {
+        'id': message_id,
+        'name': name,
+        'email': email,
+        'subject': subject,
+        'message': message,
+        'timestamp': now,
+        'status': 'new'
+    }
+    if analysis is None:
+        doc['analysis_status'] = 'pending'
+    else:
+        doc.update({'analysis': analysis, 'analyzed_at': now, 'analysis_status': 'complete'})
+    return doc
+
+
+def queue_message(message_id: str) -> str:
+    """Queue payload for a stored submission"""
+    return json.dumps({'message_id': message_id})
+
+
+def parse_queue_message(body: str) -> str:
+    return json.loads(body)['message_id']
+
+
+async def process_submission(container, message_id: str, doc: Optional[Dict] = None) -> Dict:
+    """
+    Finish a stored submission: complete a pending analysis, then notify.
+
+    Each step records its completion on the document (/analysis,
+    /notified_at) with a patch, so a retried queue message skips the steps
+    that already succeeded. Any exception propagates so the queue retries
+    the message and eventually moves it to the poison queue.
+
+    Args:
+        container: async ContactMessages client (async_pool.get_container)
+        doc: the stored document, when the caller already has it
+
+    Returns:
+        The message document after processing
+    """
+    if doc is None:
+        doc = await container.read_item(item=message_id, partition_key=message_id)
+
+    if 'analysis' not in doc:
+        fields = await complete_analysis_async(container, doc)
+        if fields is None:
+            # Another worker analyzed it first; that worker sends the notification
+            return await container.read_item(item=message_id, partition_key=message_id)
+        doc.update(fields)
+
+    await notify(container, doc)
+    return doc
+
+
+async def notify(container, doc: Dict) -> None:
+    """
+    Email an analyzed submission unless it is spam or /notified_at shows
+    it was already sent, then record /notified_at
+    """
+    message_id = doc['id']
+    if doc['analysis'].get('is_spam', False):
+        logging.info(f'Email notification skipped for message {message_id} - marked as spam')
+    elif not doc.get('notified_at'):
+        await send_notification(doc)
+        doc['notified_at'] = datetime.utcnow().isoformat()
+        await container.patch_item(item=message_id, partition_key=message_id, patch_operations=[
+            {'op': 'set', 'path': '/notified_at', 'value': doc['notified_at']},
+        ])
+        logging.info(f'Email notification sent for message {message_id}')
+
+
+async def complete_analysis_async(container, doc: Dict) -> Optional[Dict]:
+    """
+    Analyze a pending submission on the CPU pool and patch in only the
+    analysis fields
+
+    Returns:
+        The patched fields, or None if another worker analyzed it first (and
+        so owns its notification)
+    """
+    analysis = await async_pool.offload(SentimentAnalyzer.analyze, subject=doc.get('subject', ''),
+                                        message=doc.get('message', ''))
+    fields = _analysis_fields(analysis)
+    try:
+        # Conditional on still being pending, so when the queue worker and
+        # the pending timer race only one of them counts it in the summary
+        await container.patch_item(item=doc['id'], partition_key=doc['id'], patch_operations=_set_operations(fields),
+                                   filter_predicate=PENDING_PREDICATE)
+    except CosmosAccessConditionFailedError:
+        logging.info(f'Message {doc["id"]} was already analyzed')
+        return None
+    await asyncio.to_thread(inbox.record, inbox.analysis_delta(None, analysis))
+    logging.info(f'Message {doc["id"]} analyzed: sentiment={analysis["sentiment"]}, spam={analysis["is_spam"]}, priority={analysis["priority"]}')
+    return fields
+
+
+def _analysis_fields(analysis: Dict) -> Dict:
+    return {'analysis': analysis, 'analyzed_at': datetime.utcnow().isoformat(), 'analysis_status': 'complete'}
+
+
+def _set_operations(fields: Dict) -> List[Dict]:
+    return [{'op': 'set', 'path': f'/{field}', 'value': value} for field, value in fields.items()]
+
+
+async def finish_pending(container, limit: int = 100, min_age: float = PENDING_MIN_AGE) -> List[str]:
+    """
+    Complete up to `limit` submissions left pending for at least `min_age`
+    seconds and send their notification, as process_submission would have
+
+    Args:
+        container: async ContactMessages client (async_pool.get_container)
+
+    Returns:
+        Ids whose analysis was completed
+    """
+    cutoff = (datetime.utcnow() - timedelta(seconds=min_age)).isoformat()
+    pending = [doc async for doc in container.query_items(
+        query=PENDING_QUERY,
+        parameters=[{'name': '@limit', 'value': limit}, {'name': '@cutoff', 'value': cutoff}]
+    )]
+    completed = []
+    for doc in pending:
+        try:
+            fields = await complete_analysis_async(container, doc)
+            if fields is None:
+                continue
+            doc.update(fields)
+            completed.append(doc['id'])
+            await notify(container, doc)
+        except Exception as e:
+            logging.warning(f'Could not finish pending submission {doc["id"]}: {str(e)}')
+    return completed
+
+
+def mark_failed(container: ContainerProxy, message_id: str) -> None:
+    """Flag a submission whose processing exhausted its retries"""
+    doc = container.read_item(item=message_id, partition_key=message_id)
+    if doc.get('status') == 'processing_failed':
+        return
+    container.patch_item(item=message_id, partition_key=message_id, patch_operations=[
+        {'op': 'set', 'path': '/status', 'value': 'processing_failed'},
+    ])
+    inbox.record(inbox.status_delta(doc.get('status', 'new'), 'processing_failed'))
+
+
+async def send_notification(doc: Dict) -> None:
+    """Email the submission through Resend; raises on failure so the caller can retry"""
+    with http_span('api.resend.com', 'POST') as span:
+        async with async_pool.get_http_session().post(
+            RESEND_URL,
+            headers={"Authorization": f"Bearer {os.environ.get('RESEND_API_KEY')}"},
+            json=notification_email(doc),
+            timeout=aiohttp.ClientTimeout(total=RESEND_TIMEOUT)
+        ) as response:
+            span.set('status_code', response.status)
+            if response.status != 200:
+                raise RuntimeError(f'Email notification failed ({response.status}): {await response.text()}')
+
+
+def notification_email(doc: Dict) -> Dict:
+    """Resend request body for a stored submission"""
+    analysis = doc.get('analysis', {})
+    return {
+        "from": "onboarding@resend.dev",
+        "to": [os.environ.get("CONTACT_EMAIL")],
+        "subject": f"New Contact Form Submission: {doc['subject']}",
+        "html": f"""
+        <h2>New Contact Form Message</h2>
+        <p><strong>From:</strong> {doc['name']} ({doc['email']})</p>
+        <p><strong>Subject:</strong> {doc['subject']}</p>
+        <p><strong>Message:</strong></p>
+        <p>{doc['message']}</p>
+        <hr>
+        <p><strong>AI Analysis:</strong></p>
+        <ul>
+            <li>Sentiment: {analysis.get('sentiment', 'N/A')}</li>
+            <li>Priority: {analysis.get('priority', 'N/A')} (Score: {analysis.get('priority_score', 'N/A')}/10)</li>
+            <li>Spam Score: {analysis.get('spam_score', 'N/A')}</li>
+        </ul>
+        <p><em>Received at {datetime.fromisoformat(doc['timestamp']).strftime('%Y-%m-%d %H:%M:%S')} UTC</em></p>
+        """
+    }
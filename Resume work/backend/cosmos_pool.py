@@ -0,0 +1,127 @@
+"""
+Cosmos DB Connection Pool
+Process-wide CosmosClient and container registry shared by every function,
+so a warm worker reuses its connections instead of reconnecting per request
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from azure.cosmos import ContainerProxy, CosmosClient, DatabaseProxy
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from telemetry import instrument_container
+
+DATABASE_NAME = "ProjectDB"
+CONNECTION_SETTING = "AzureCosmosDBConnectionString"
+
+
+class CosmosPool:
+    """
+    Lazily initialized, thread-safe registry of Cosmos container clients.
+
+    The client is created on first use and kept for the lifetime of the
+    worker. A cheap health check runs at most once per HEALTH_CHECK_INTERVAL
+    and the client is rebuilt when the check or a request reports a
+    connection-level failure.
+    """
+
+    # Seconds between health checks on a warm worker
+    HEALTH_CHECK_INTERVAL = 300
+
+    # Errors that mean the connection itself is bad, not the request
+    CONNECTION_ERRORS = (ServiceRequestError, ServiceResponseError, ConnectionError)
+
+    def __init__(self, database_name: str = DATABASE_NAME, connection_setting: str = CONNECTION_SETTING):
+        self.database_name = database_name
+        self.connection_setting = connection_setting
+        self._lock = threading.RLock()
+        self._client: Optional[CosmosClient] = None
+        self._database: Optional[DatabaseProxy] = None
+        self._containers: Dict[str, ContainerProxy] = {}
+        self._last_health_check = 0.0
+        self._checking = False
+
+    def get_container(self, name: str) -> ContainerProxy:
+        """Return a pooled container client, connecting on first use (instrumented, see telemetry.py)"""
+        self._maybe_health_check()
+        container = self._containers.get(name)
+        if container is not None:
+            return container
+
+        with self._lock:
+            container = self._containers.get(name)
+            if container is None:
+                container = instrument_container(self._get_database().get_container_client(name))
+                self._containers[name] = container
+            return container
+
+    def report_failure(self, error: Exception) -> None:
+        """
+        Drop the pooled client if the error points at a broken connection,
+        so the next request reconnects instead of reusing it
+        """
+        if is_connection_error(error):
+            logging.warning(f'Cosmos connection failure, resetting pool: {str(error)}')
+            self.reset()
+
+    def reset(self) -> None:
+        """Discard the pooled client and every cached container"""
+        with self._lock:
+            self._client = None
+            self._database = None
+            self._containers = {}
+            self._last_health_check = 0.0
+
+    def _get_database(self) -> DatabaseProxy:
+        with self._lock:
+            if self._database is None:
+                connection_string = os.environ.get(self.connection_setting)
+                if not connection_string:
+                    raise RuntimeError(f'{self.connection_setting} is not configured')
+                self._client = CosmosClient.from_connection_string(connection_string)
+                self._database = self._client.get_database_client(self.database_name)
+                self._last_health_check = time.monotonic()
+                logging.info(f'Cosmos client initialized for database {self.database_name}')
+            return self._database
+
+    def _maybe_health_check(self) -> None:
+        """Verify the pooled connection, at most once per interval and one thread at a time"""
+        if time.monotonic() - self._last_health_check < self.HEALTH_CHECK_INTERVAL:
+            return
+
+        with self._lock:
+            if self._checking or time.monotonic() - self._last_health_check < self.HEALTH_CHECK_INTERVAL:
+                return
+            self._checking = True
+            database = self._database
+
+        try:
+            if database is not None:
+                database.read()
+            self._last_health_check = time.monotonic()
+        except Exception as e:
+            logging.warning(f'Cosmos health check failed, resetting pool: {str(e)}')
+            self.reset()
+        finally:
+            self._checking = False
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether error means the client's connection is bad, rather than the request"""
+    if isinstance(error, CosmosPool.CONNECTION_ERRORS):
+        return True
+    # 401/403 usually mean rotated keys; a fresh client picks up new settings
+    return isinstance(error, CosmosHttpResponseError) and error.status_code in (401, 403)
+
+
+# Shared by every function in this worker process
+cosmos_pool = CosmosPool()
+
+
+def get_container(name: str) -> ContainerProxy:
+    """Shortcut for cosmos_pool.get_container"""
+    return cosmos_pool.get_container(name)
@@ -1,41 +1,127 @@
 import azure.functions as func
+import asyncio
 import logging
 import json
 import os
-from azure.cosmos import CosmosClient
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime, timedelta, timezone
 import uuid
-from sentiment_analyzer import SentimentAnalyzer
+from sentiment_analyzer import SentimentAnalyzer, start_warm_up
+from partitioning import get_container
+import async_pool
+from visitor_counter import ShardedCounter, increment_fields, increment_fields_async
+from write_behind import BufferedCounter, get_buffer
+import resume_stats
+from rollups import RollupStore
+import github_stats
+import message_analysis
+import inbox
+import contact_pipeline
+import admission
+from reanalysis import ReanalysisJob
+import response_cache
+from response_cache import cached_response
+import telemetry
+from telemetry import traced_route
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+# TextBlob is imported lazily; optionally load it in the background right
+# after startup so the first contact submission does not pay for it
+if os.environ.get("NLP_PREWARM", "true").lower() == "true":
+    start_warm_up()
+
+# Buffer tracking writes (visitor count, resume downloads) and flush them in bulk
+# Off by default: buffered writes are lost if a worker dies without a clean shutdown
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+write_buffer = get_buffer(get_container) if WRITE_BEHIND_ENABLED else None
+
+# Contact submissions are finished by ProcessContactSubmission off the request path
+CONTACT_QUEUE_ENABLED = os.environ.get("CONTACT_QUEUE_ENABLED", "true").lower() == "true"
+CONTACT_ANALYSIS_BUDGET = float(os.environ.get("CONTACT_ANALYSIS_BUDGET_MS", "250")) / 1000
+
+VISITOR_COUNTER_ID = "visitor-counter"
+VISITOR_COUNTER_SHARDS = int(os.environ.get("VISITOR_COUNTER_SHARDS", "1"))
+buffered_visitor_counter = (
+    BufferedCounter(write_buffer, "Counter", VISITOR_COUNTER_ID, shard_count=VISITOR_COUNTER_SHARDS)
+    if write_buffer is not None else None
+)
+
+
+def apply_increments(container_name: str, increments: dict) -> None:
+    """Apply {document id: {path: amount}} increments, buffered when write-behind is on"""
+    for item_id, fields in increments.items():
+        if write_buffer is not None:
+            for path, amount in fields.items():
+                write_buffer.add_increment(container_name, item_id, path, amount)
+        else:
+            increment_fields(get_container(container_name), item_id, fields)
+
+
+async def apply_increments_async(container_name: str, increments: dict) -> None:
+    """apply_increments() for async routes: unbuffered documents are incremented concurrently"""
+    if write_buffer is not None:
+        apply_increments(container_name, increments)
+        return
+    container = await async_pool.get_container(container_name)
+    await asyncio.gather(*(increment_fields_async(container, item_id, fields)
+                           for item_id, fields in increments.items()))
+
+
+def reanalysis_job() -> ReanalysisJob:
+    """Re-analysis job for the current analyzer version, checkpointed in the Counter container"""
+    ru_per_second = float(os.environ.get("REANALYSIS_RU_PER_SECOND", "100"))
+    return ReanalysisJob(
+        get_container("ContactMessages"),
+        get_container("Counter"),
+        batch_size=int(os.environ.get("REANALYSIS_BATCH_SIZE", "100")),
+        max_workers=int(os.environ.get("REANALYSIS_MAX_WORKERS", "8")),
+        ru_per_second=ru_per_second if ru_per_second > 0 else None
+    )
+
+
+def reconcile_inbox() -> dict:
+    """inbox.reconcile() on the pooled containers (blocking: call it through asyncio.to_thread)"""
+    return inbox.reconcile(get_container("ContactMessages"), get_container(inbox.SUMMARY_CONTAINER))
+
+
+def parse_utc(value: str) -> datetime:
+    """Parse an ISO timestamp into a naive UTC datetime (the format stored in Cosmos)"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 # ============================================================================
 # EXISTING FUNCTIONS (Unchanged)
 # ============================================================================
 
 @app.route(route="GetVisitorCount", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET", "POST"])
-def GetVisitorCount(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+async def GetVisitorCount(req: func.HttpRequest) -> func.HttpResponse:
     """Get and increment visitor counter"""
     logging.info('GetVisitorCount function triggered')
     
     try:
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("Counter")
-        
-        counter_id = "visitor-counter"
-        
-        try:
-            item = container.read_item(item=counter_id, partition_key=counter_id)
-            current_count = item.get('count', 0)
-            new_count = current_count + 1
-            item['count'] = new_count
-            container.replace_item(item=counter_id, body=item)
-        except:
-            new_count = 1
-            container.create_item(body={'id': counter_id, 'count': new_count})
+        if buffered_visitor_counter is not None:
+            # In memory, except for re-reading the base count after a flush
+            increment = asyncio.to_thread(buffered_visitor_counter.increment)
+        else:
+            counter = ShardedCounter(await async_pool.get_container("Counter"), VISITOR_COUNTER_ID,
+                                     shard_count=VISITOR_COUNTER_SHARDS)
+            increment = counter.increment_async()
+        
+        # The counter and the rollups are independent writes; overlap them
+        visitors = RollupStore(None, "visitors")
+        new_count, rollup_error = await asyncio.gather(
+            increment,
+            apply_increments_async("Counter", visitors.increments(datetime.utcnow(), req.headers.get('User-Agent'))),
+            return_exceptions=True
+        )
+        if isinstance(new_count, BaseException):
+            raise new_count
+        if rollup_error is not None:
+            logging.warning(f'Visitor rollup update failed: {str(rollup_error)}')
         
         return func.HttpResponse(
             json.dumps({"count": new_count}),
@@ -48,6 +134,7 @@ def GetVisitorCount(req: func.HttpRequest) -> func.HttpResponse:
         )
     except Exception as e:
         logging.error(f'Error in GetVisitorCount: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to get visitor count", "details": str(e)}),
             status_code=500,
@@ -55,87 +142,66 @@ def GetVisitorCount(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+async def compute_github_stats(username: str, revalidate: bool = False) -> dict:
+    """
+    Run the full GitHub aggregation (profile, repos, languages) on the event
+    loop; with revalidate, cached responses are revalidated, not served
+    """
+    return await github_stats.build_stats_async(
+        github_stats.get_async_client(revalidate=revalidate), username,
+        index=github_stats.get_language_index(username)
+    )
+
+
+@app.timer_trigger(schedule="0 */15 * * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+async def PrecomputeGitHubStats(timer: func.TimerRequest) -> None:
+    """Precompute the GitHub stats snapshot every 15 minutes, off the request path"""
+    logging.info('PrecomputeGitHubStats function triggered')
+    
+    try:
+        username = os.environ.get("GITHUB_USERNAME", "SeanC28")
+        # The response cache TTL is shorter than this schedule, but a stale
+        # entry would still be served while refreshing; revalidate with
+        # conditional GETs so the snapshot is current
+        stats = await compute_github_stats(username, revalidate=True)
+        snapshot = await asyncio.to_thread(
+            lambda: github_stats.save_snapshot(get_container("ApiCache"), username, stats))
+        logging.info(f'GitHub stats snapshot v{snapshot["version"]} stored for {username}')
+        response_cache.invalidate("GetGitHubStats")
+    except Exception as e:
+        logging.error(f'Error in PrecomputeGitHubStats: {str(e)}')
+        async_pool.report_failure(e)
+
+
 @app.route(route="GetGitHubStats", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def GetGitHubStats(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+@cached_response(ttl=300, cache_control="public, max-age=300, stale-while-revalidate=3600", params=())
+async def GetGitHubStats(req: func.HttpRequest) -> func.HttpResponse:
     """Get GitHub profile statistics with weighted language analysis"""
     logging.info('GetGitHubStats function triggered')
     
     try:
         username = os.environ.get("GITHUB_USERNAME", "SeanC28")
-        github_token = os.environ.get("GITHUB_TOKEN")
-        
-        headers = {}
-        if github_token:
-            headers['Authorization'] = f'token {github_token}'
-        
-        # Get user profile
-        user_url = f"https://api.github.com/users/{username}"
-        user_response = requests.get(user_url, headers=headers)
-        user_data = user_response.json()
-        
-        # Get repositories
-        repos_url = f"https://api.github.com/users/{username}/repos?per_page=100"
-        repos_response = requests.get(repos_url, headers=headers)
-        repos_data = repos_response.json()
-        
-        # Calculate total stars and forks across all repos
-        total_stars = sum(repo.get('stargazers_count', 0) for repo in repos_data)
-        total_forks = sum(repo.get('forks_count', 0) for repo in repos_data)
-        
-        # Calculate weighted language statistics
-        language_bytes = {}
-        for repo in repos_data:
-            if not repo.get('fork', False):
-                lang_url = f"https://api.github.com/repos/{username}/{repo['name']}/languages"
-                try:
-                    lang_response = requests.get(lang_url, headers=headers)
-                    repo_languages = lang_response.json()
-                    for lang, bytes_count in repo_languages.items():
-                        language_bytes[lang] = language_bytes.get(lang, 0) + bytes_count
-                except:
-                    continue
-        
-        # Calculate percentages
-        total_bytes = sum(language_bytes.values())
-        language_stats = []
-        if total_bytes > 0:
-            language_stats = [
-                {
-                    'language': lang,
-                    'bytes': bytes_count,
-                    'percentage': round((bytes_count / total_bytes) * 100, 2)
-                }
-                for lang, bytes_count in language_bytes.items()
-            ]
-            language_stats.sort(key=lambda x: x['percentage'], reverse=True)
-        
-        # Get recent activity (last 5 repositories, sorted by last updated)
-        # Filter out forks and sort by recently updated
-        recent_repos = [repo for repo in repos_data if not repo.get('fork', False)]
-        recent_repos.sort(key=lambda x: x.get('updated_at', ''), reverse=True)
-        
-        recent_activity = []
-        for repo in recent_repos[:5]:
-            activity = {
-                'name': repo.get('name', 'Unknown'),
-                'url': repo.get('html_url', '#'),
-                'description': repo.get('description', 'No description available'),
-                'language': repo.get('language', None),
-                'stars': repo.get('stargazers_count', 0),
-                'updated': repo.get('updated_at', '')
-            }
-            recent_activity.append(activity)
-        
-        stats = {
-            'username': username,
-            'public_repos': user_data.get('public_repos', 0),
-            'followers': user_data.get('followers', 0),
-            'following': user_data.get('following', 0),
-            'total_stars': total_stars,
-            'total_forks': total_forks,
-            'languages': language_stats,
-            'recent_activity': recent_activity
-        }
+        max_age = float(os.environ.get("GITHUB_SNAPSHOT_MAX_AGE", "86400"))
+        
+        # Serve the precomputed snapshot; compute live only if it is missing or too old
+        snapshot = None
+        try:
+            snapshot = await github_stats.load_snapshot_async(
+                await async_pool.get_container("ApiCache"), username, max_age)
+        except Exception as snapshot_error:
+            logging.warning(f'Could not read GitHub stats snapshot: {str(snapshot_error)}')
+        if snapshot is None:
+            logging.info('No fresh GitHub stats snapshot, computing live')
+            stats = await compute_github_stats(username)
+            try:
+                snapshot = await asyncio.to_thread(
+                    lambda: github_stats.save_snapshot(get_container("ApiCache"), username, stats))
+            except Exception as save_error:
+                logging.warning(f'Could not store GitHub stats snapshot: {str(save_error)}')
+                snapshot = {'stats': stats, 'generated_at': datetime.utcnow().isoformat()}
+        
+        stats = dict(snapshot['stats'], generated_at=snapshot['generated_at'])
         
         return func.HttpResponse(
             json.dumps(stats),
@@ -147,6 +213,7 @@ def GetGitHubStats(req: func.HttpRequest) -> func.HttpResponse:
         )
     except Exception as e:
         logging.error(f'Error in GetGitHubStats: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to fetch GitHub stats", "details": str(e)}),
             status_code=500,
@@ -155,24 +222,29 @@ def GetGitHubStats(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="TrackResumeDownload", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def TrackResumeDownload(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+async def TrackResumeDownload(req: func.HttpRequest) -> func.HttpResponse:
     """Track resume download events"""
     logging.info('TrackResumeDownload function triggered')
     
     try:
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("ResumeDownloads")
-        
         download_id = str(uuid.uuid4())
         download_data = {
             'id': download_id,
             'timestamp': datetime.utcnow().isoformat(),
-            'user_agent': req.headers.get('User-Agent', 'Unknown')
+            'user_agent': req.headers.get('User-Agent', 'Unknown'),
+            # Counted by the increments below, so the rollup seed skips it
+            resume_stats.ROLLED_UP_FIELD: True
         }
         
-        container.create_item(body=download_data)
+        increments = resume_stats.rollup_increments(download_data['timestamp'], download_data['user_agent'])
+        if write_buffer is not None:
+            write_buffer.add_document("ResumeDownloads", download_data)
+            apply_increments("Counter", increments)
+        else:
+            downloads = await async_pool.get_container("ResumeDownloads")
+            await asyncio.gather(downloads.create_item(body=download_data),
+                                 apply_increments_async("Counter", increments))
         
         return func.HttpResponse(
             json.dumps({"success": True, "download_id": download_id}),
@@ -184,6 +256,7 @@ def TrackResumeDownload(req: func.HttpRequest) -> func.HttpResponse:
         )
     except Exception as e:
         logging.error(f'Error in TrackResumeDownload: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to track download", "details": str(e)}),
             status_code=500,
@@ -192,34 +265,20 @@ def TrackResumeDownload(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="GetResumeStats", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def GetResumeStats(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+@cached_response(ttl=60, cache_control="public, max-age=60", params=())
+async def GetResumeStats(req: func.HttpRequest) -> func.HttpResponse:
     """Get resume download statistics"""
     logging.info('GetResumeStats function triggered')
     
     try:
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("ResumeDownloads")
-        
-        query = "SELECT * FROM c ORDER BY c.timestamp DESC"
-        downloads = list(container.query_items(query=query, enable_cross_partition_query=True))
-        
-        total = len(downloads)
-        
+        # Container lookups may connect or health-check the pool: keep them off the event loop too
         now = datetime.utcnow()
-        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_ago = today - timedelta(days=7)
-        
-        today_count = sum(1 for d in downloads if datetime.fromisoformat(d['timestamp'].replace('Z', '+00:00')) >= today)
-        week_count = sum(1 for d in downloads if datetime.fromisoformat(d['timestamp'].replace('Z', '+00:00')) >= week_ago)
-        
-        stats = {
-            'total': total,
-            'today': today_count,
-            'this_week': week_count,
-            'recent_downloads': downloads[:10]
-        }
+        stats = await asyncio.to_thread(lambda: resume_stats.get_stats(
+            downloads=get_container("ResumeDownloads"),
+            counters=get_container("Counter"),
+            now=now
+        ))
         
         return func.HttpResponse(
             json.dumps(stats),
@@ -231,6 +290,7 @@ def GetResumeStats(req: func.HttpRequest) -> func.HttpResponse:
         )
     except Exception as e:
         logging.error(f'Error in GetResumeStats: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to get stats", "details": str(e)}),
             status_code=500,
@@ -238,46 +298,115 @@ def GetResumeStats(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+@app.timer_trigger(schedule="0 */15 * * * *", arg_name="timer", run_on_startup=False, use_monitor=True)
+def SeedDownloadRollups(timer: func.TimerRequest) -> None:
+    """Every 15 minutes until done: backfill the download rollups from downloads recorded before them"""
+    try:
+        resume_stats.seed_rollups(get_container("ResumeDownloads"), get_container("Counter"),
+                                  max_seconds=float(os.environ.get("ROLLUP_SEED_MAX_SECONDS", "240")))
+    except Exception as e:
+        logging.error(f'Error in SeedDownloadRollups: {str(e)}')
+        async_pool.report_failure(e)
+
+
+@app.route(route="GetAnalytics", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@traced_route
+async def GetAnalytics(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Query pre-aggregated hour/day rollups for an arbitrary time range
+    
+    Query Parameters:
+    - metric: downloads or visitors (default: downloads)
+    - start: ISO timestamp, inclusive (default: 7 days before end)
+    - end: ISO timestamp, exclusive (default: now)
+    - granularity: hour, day or auto (default: auto)
+    
+    Ranges over 62 days of hours or 732 days are rejected with 400.
+    Returns totals, counts by user-agent family and per-bucket counts
+    """
+    logging.info('GetAnalytics function triggered')
+    
+    try:
+        metric = req.params.get('metric', 'downloads')
+        granularity = req.params.get('granularity', 'auto')
+        try:
+            end = parse_utc(req.params['end']) if req.params.get('end') else datetime.utcnow()
+            start = parse_utc(req.params['start']) if req.params.get('start') else end - timedelta(days=7)
+            if metric not in ('downloads', 'visitors'):
+                raise ValueError(f'Unknown metric: {metric}')
+            result = await asyncio.to_thread(
+                lambda: RollupStore(get_container("Counter"), metric).query(start, end, granularity))
+        except ValueError as param_error:
+            return func.HttpResponse(
+                json.dumps({"error": str(param_error)}),
+                status_code=400,
+                headers={'Content-Type': 'application/json'}
+            )
+        
+        return func.HttpResponse(
+            json.dumps(result),
+            status_code=200,
+            headers={
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+        )
+    except Exception as e:
+        logging.error(f'Error in GetAnalytics: {str(e)}')
+        async_pool.report_failure(e)
+        return func.HttpResponse(
+            json.dumps({"error": "Failed to query analytics", "details": str(e)}),
+            status_code=500,
+            headers={'Content-Type': 'application/json'}
+        )
+
+
 # ============================================================================
 # UPDATED FUNCTION - Now with Auto-Analysis
 # ============================================================================
 
 @app.route(route="SubmitContactForm", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def SubmitContactForm(req: func.HttpRequest) -> func.HttpResponse:
-    """Submit contact form with automatic AI sentiment analysis"""
+@app.queue_output(arg_name="submissions", queue_name=contact_pipeline.QUEUE_NAME,
+                  connection=contact_pipeline.QUEUE_CONNECTION)
+@traced_route
+async def SubmitContactForm(req: func.HttpRequest, submissions: func.Out[str]) -> func.HttpResponse:
+    """
+    Submit contact form
+    
+    Admission control (admission.py) turns away floods, resends and blatant
+    spam first, with 429 and Retry-After when throttled. An admitted message
+    is analyzed under a time budget, stored with one write and enqueued;
+    ProcessContactSubmission completes a pending analysis and sends the
+    email notification after this returns
+    """
     logging.info('SubmitContactForm function triggered')
+    admission_control, decision, stored_id = None, None, None
     
     try:
         # Try to get JSON from request body
         try:
-            logging.info('Attempting to parse request body as JSON')
             req_body = req.get_json()
-            logging.info(f'Successfully parsed JSON: {type(req_body)}')
         except Exception as json_error:
-            logging.warning(f'get_json() failed: {str(json_error)}')
+            logging.warning('get_json() failed: %s', json_error)
             # If get_json() fails, try parsing body as string
             try:
-                body_str = req.get_body().decode('utf-8')
-                logging.info(f'Raw body string: {body_str}')
-                req_body = json.loads(body_str)
-                logging.info(f'Successfully parsed body string as JSON: {type(req_body)}')
+                req_body = json.loads(req.get_body().decode('utf-8'))
             except Exception as parse_error:
-                logging.error(f'Failed to parse body: {str(parse_error)}')
+                logging.error('Failed to parse body: %s', parse_error)
                 return func.HttpResponse(
                     json.dumps({"error": "Invalid JSON in request body"}),
                     status_code=400,
                     headers={'Content-Type': 'application/json'}
                 )
         
-        logging.info(f'Request body type: {type(req_body)}, content: {req_body}')
+        # Payloads are logged for a sample of requests only, formatted lazily
+        telemetry.log_sampled(logging.INFO, 'SubmitContactForm payload: %s', req_body)
         
         name = req_body.get('name')
         email = req_body.get('email')
         subject = req_body.get('subject')
         message = req_body.get('message')
         
-        logging.info(f'Extracted fields - name: {name}, email: {email}, subject: {subject}')
-        
         # Validation
         if not all([name, email, subject, message]):
             return func.HttpResponse(
@@ -286,99 +415,43 @@ def SubmitContactForm(req: func.HttpRequest) -> func.HttpResponse:
                 headers={'Content-Type': 'application/json'}
             )
         
-        # Connect to Cosmos DB
-        logging.info('Connecting to Cosmos DB')
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("ContactMessages")
-        logging.info('Successfully connected to Cosmos DB')
-        
+        # Floods, resends and blatant spam are answered here, before any
+        # Cosmos or NLP work
+        admission_control = admission.get_controller()
+        if admission_control is not None:
+            decision = admission_control.admit(admission.client_address(req), req.headers.get('User-Agent', ''),
+                                               email, subject, message)
+            if not decision.admitted:
+                logging.info('Contact submission not admitted: %s', decision.outcome)
+                return admission.rejection(decision)
+        
+        # Analyze first so the message is stored complete in one write;
+        # if the analyzer overruns its budget the document is stored as
+        # pending and finished later with a patch
+        analysis = await contact_pipeline.analyze_within_async(subject, message, CONTACT_ANALYSIS_BUDGET)
+        
+        container = await async_pool.get_container("ContactMessages")
         message_id = str(uuid.uuid4())
-        logging.info(f'Generated message ID: {message_id}')
-        
-        # Save message to database
-        message_data = {
-            'id': message_id,
-            'name': name,
-            'email': email,
-            'subject': subject,
-            'message': message,
-            'timestamp': datetime.utcnow().isoformat(),
-            'status': 'new'
-        }
-        logging.info(f'Creating item in Cosmos DB with data: {message_data}')
-        container.create_item(body=message_data)
-        logging.info('Successfully created item in Cosmos DB')
-        
-        # **NEW: Auto-analyze the message with AI**
-        logging.info('Starting AI sentiment analysis')
-        try:
-            analysis = SentimentAnalyzer.analyze(subject=subject, message=message)
-            logging.info(f'Analysis complete: {analysis}')
-            message_data['analysis'] = analysis
-            message_data['analyzed_at'] = datetime.utcnow().isoformat()
-            logging.info('Updating item in Cosmos DB with analysis')
-            container.replace_item(item=message_id, body=message_data)
-            logging.info(f'Message {message_id} auto-analyzed: sentiment={analysis["sentiment"]}, spam={analysis["is_spam"]}, priority={analysis["priority"]}')
-        except Exception as analysis_error:
-            logging.warning(f'Auto-analysis failed for message {message_id}: {str(analysis_error)}')
-            logging.exception('Full analysis error traceback:')
-            # Continue even if analysis fails - don't block message submission
-        
-        # Send email notification via Resend (only if not spam)
-        logging.info('Checking spam status for email notification')
-        is_spam = message_data.get('analysis', {}).get('is_spam', False)
-        logging.info(f'Spam status: {is_spam}')
-        
-        if not is_spam:
-            try:
-                resend_api_key = os.environ.get("RESEND_API_KEY")
-                contact_email = os.environ.get("CONTACT_EMAIL")
-                
-                email_data = {
-                    "from": "onboarding@resend.dev",
-                    "to": [contact_email],
-                    "subject": f"New Contact Form Submission: {subject}",
-                    "html": f"""
-                    <h2>New Contact Form Message</h2>
-                    <p><strong>From:</strong> {name} ({email})</p>
-                    <p><strong>Subject:</strong> {subject}</p>
-                    <p><strong>Message:</strong></p>
-                    <p>{message}</p>
-                    <hr>
-                    <p><strong>AI Analysis:</strong></p>
-                    <ul>
-                        <li>Sentiment: {analysis.get('sentiment', 'N/A')}</li>
-                        <li>Priority: {analysis.get('priority', 'N/A')} (Score: {analysis.get('priority_score', 'N/A')}/10)</li>
-                        <li>Spam Score: {analysis.get('spam_score', 'N/A')}</li>
-                    </ul>
-                    <p><em>Received at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC</em></p>
-                    """
-                }
-                
-                email_response = requests.post(
-                    "https://api.resend.com/emails",
-                    headers={
-                        "Authorization": f"Bearer {resend_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json=email_data
-                )
-                
-                if email_response.status_code == 200:
-                    logging.info(f'Email notification sent for message {message_id}')
-                else:
-                    logging.warning(f'Email notification failed: {email_response.text}')
-            except Exception as email_error:
-                logging.error(f'Error sending email notification: {str(email_error)}')
+        message_data = contact_pipeline.new_submission(message_id, name, email, subject, message, analysis)
+        await container.create_item(body=message_data)
+        stored_id = message_id
+        logging.info('Message %s stored (analysis %s)', message_id, 'complete' if analysis else 'pending')
+        await asyncio.to_thread(inbox.record, inbox.creation_delta(message_data['status'], analysis))
+        response_cache.invalidate("GetPrioritizedMessages")
+        
+        if CONTACT_QUEUE_ENABLED:
+            submissions.set(contact_pipeline.queue_message(message_id))
         else:
-            logging.info(f'Email notification skipped for message {message_id} - marked as spam')
+            # No queue storage configured: finish the submission inline
+            try:
+                await contact_pipeline.process_submission(container, message_id, doc=message_data)
+            except Exception as processing_error:
+                logging.warning(f'Processing failed for message {message_id}: {str(processing_error)}')
         
         return func.HttpResponse(
             json.dumps({
                 "success": True,
-                "message": "Message received and analyzed successfully",
+                "message": "Message received successfully",
                 "message_id": message_id
             }),
             status_code=200,
@@ -390,11 +463,61 @@ def SubmitContactForm(req: func.HttpRequest) -> func.HttpResponse:
         
     except Exception as e:
         logging.error(f'Error in SubmitContactForm: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to submit form", "details": str(e)}),
             status_code=500,
             headers={'Content-Type': 'application/json'}
         )
+    finally:
+        if decision is not None:
+            admission_control.complete(decision, stored_id)
+
+
+@app.queue_trigger(arg_name="msg", queue_name=contact_pipeline.QUEUE_NAME,
+                   connection=contact_pipeline.QUEUE_CONNECTION)
+async def ProcessContactSubmission(msg: func.QueueMessage) -> None:
+    """
+    Analyze a stored submission and send its email notification
+    
+    Raising lets the queue retry (host.json maxDequeueCount); after the last
+    attempt the message moves to the poison queue
+    """
+    message_id = contact_pipeline.parse_queue_message(msg.get_body().decode('utf-8'))
+    logging.info(f'ProcessContactSubmission triggered for {message_id} (attempt {msg.dequeue_count})')
+    
+    try:
+        await contact_pipeline.process_submission(await async_pool.get_container("ContactMessages"), message_id)
+    except Exception as e:
+        logging.error(f'Error processing message {message_id}: {str(e)}')
+        async_pool.report_failure(e)
+        raise
+
+
+@app.timer_trigger(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=False, use_monitor=True)
+async def FinishPendingAnalyses(timer: func.TimerRequest) -> None:
+    """Every 5 minutes: complete analyses left pending (inline mode, or a queue message that was lost) and notify"""
+    try:
+        completed = await contact_pipeline.finish_pending(await async_pool.get_container("ContactMessages"))
+        if completed:
+            logging.info(f'Completed {len(completed)} pending analyses')
+    except Exception as e:
+        logging.error(f'Error in FinishPendingAnalyses: {str(e)}')
+        async_pool.report_failure(e)
+
+
+@app.queue_trigger(arg_name="msg", queue_name=contact_pipeline.POISON_QUEUE_NAME,
+                   connection=contact_pipeline.QUEUE_CONNECTION)
+async def ProcessFailedContactSubmission(msg: func.QueueMessage) -> None:
+    """Dead-letter handler: flag submissions whose processing ran out of retries"""
+    message_id = contact_pipeline.parse_queue_message(msg.get_body().decode('utf-8'))
+    logging.error(f'Contact submission {message_id} failed after all retries')
+    
+    try:
+        await asyncio.to_thread(lambda: contact_pipeline.mark_failed(get_container("ContactMessages"), message_id))
+    except Exception as e:
+        logging.error(f'Could not flag failed message {message_id}: {str(e)}')
+        async_pool.report_failure(e)
 
 
 # ============================================================================
@@ -402,7 +525,8 @@ def SubmitContactForm(req: func.HttpRequest) -> func.HttpResponse:
 # ============================================================================
 
 @app.route(route="AnalyzeMessage", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+async def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
     """
     Manually analyze a specific contact message for spam, sentiment, and priority
     
@@ -428,14 +552,11 @@ def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         # Connect to Cosmos DB
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("ContactMessages")
+        container = await async_pool.get_container("ContactMessages")
         
         # Get the message
         try:
-            message = container.read_item(item=message_id, partition_key=message_id)
+            message = await container.read_item(item=message_id, partition_key=message_id)
         except Exception as read_error:
             return func.HttpResponse(
                 json.dumps({"error": "Message not found", "details": str(read_error)}),
@@ -443,16 +564,21 @@ def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
                 headers={'Content-Type': 'application/json'}
             )
         
-        # Analyze the message
-        analysis = SentimentAnalyzer.analyze(
+        # Analyze the message (CPU-bound, off the event loop)
+        analysis = await async_pool.offload(
+            SentimentAnalyzer.analyze,
             subject=message.get('subject', ''),
             message=message.get('message', '')
         )
         
         # Update message with analysis
+        previous_analysis = message.get('analysis')
         message['analysis'] = analysis
         message['analyzed_at'] = datetime.utcnow().isoformat()
-        container.replace_item(item=message_id, body=message)
+        message['analysis_status'] = 'complete'
+        await container.replace_item(item=message_id, body=message)
+        await asyncio.to_thread(inbox.record, inbox.analysis_delta(previous_analysis, analysis))
+        response_cache.invalidate("GetPrioritizedMessages")
         
         logging.info(f'Message {message_id} analyzed: sentiment={analysis["sentiment"]}, spam={analysis["is_spam"]}, priority={analysis["priority"]}')
         
@@ -471,6 +597,7 @@ def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
         
     except Exception as e:
         logging.error(f'Error analyzing message: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to analyze message", "details": str(e)}),
             status_code=500,
@@ -478,67 +605,223 @@ def AnalyzeMessage(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+# Ceilings on what one BatchAnalyzeMessages call may ask for
+BATCH_ANALYZE_MAX_SECONDS = 60
+BATCH_ANALYZE_MAX_PAGE_SIZE = 500
+
+
+@app.route(route="BatchAnalyzeMessages", auth_level=func.AuthLevel.FUNCTION, methods=["POST"])
+@traced_route
+async def BatchAnalyzeMessages(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Re-analyze stored contact messages in pages
+    
+    POST Body (all optional):
+    {
+        "page_size": 200,               - messages per page (max 500)
+        "continuation_token": "...",    - resume where a previous call stopped
+        "only_unanalyzed": false,       - skip messages that already have an analysis
+        "max_seconds": 60               - time budget for this call (max 60)
+    }
+    
+    Call again with the returned continuation_token until it is null
+    """
+    logging.info('BatchAnalyzeMessages function triggered')
+    
+    try:
+        try:
+            req_body = req.get_json()
+        except ValueError:
+            req_body = {}
+        
+        try:
+            page_size = min(max(1, int(req_body.get('page_size', 200))), BATCH_ANALYZE_MAX_PAGE_SIZE)
+            max_seconds = min(max(0.0, float(req_body.get('max_seconds', 60))), BATCH_ANALYZE_MAX_SECONDS)
+        except (TypeError, ValueError):
+            return func.HttpResponse(
+                json.dumps({"error": "page_size and max_seconds must be numbers"}),
+                status_code=400,
+                headers={'Content-Type': 'application/json'}
+            )
+        
+        # A long, mostly CPU-bound job: one thread for the whole batch
+        result = await asyncio.to_thread(lambda: message_analysis.analyze_batch(
+            get_container("ContactMessages"),
+            page_size=page_size,
+            continuation_token=req_body.get('continuation_token'),
+            only_unanalyzed=bool(req_body.get('only_unanalyzed', False)),
+            max_seconds=max_seconds
+        ))
+        
+        logging.info(f'Batch analysis processed {result["processed"]} messages in {result["pages"]} pages, {len(result["failed"])} failed')
+        
+        return func.HttpResponse(
+            json.dumps({"success": True, **result}),
+            status_code=200,
+            headers={
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+        )
+        
+    except Exception as e:
+        logging.error(f'Error in batch analysis: {str(e)}')
+        async_pool.report_failure(e)
+        return func.HttpResponse(
+            json.dumps({"error": "Failed to analyze messages", "details": str(e)}),
+            status_code=500,
+            headers={'Content-Type': 'application/json'}
+        )
+
+
+@app.timer_trigger(schedule="0 30 * * * *", arg_name="timer", run_on_startup=False, use_monitor=True)
+def ReanalyzeStaleMessages(timer: func.TimerRequest) -> None:
+    """Hourly: re-score messages analyzed by an older SentimentAnalyzer version, resuming from the checkpoint"""
+    logging.info('ReanalyzeStaleMessages function triggered')
+    
+    try:
+        progress = reanalysis_job().run(max_seconds=float(os.environ.get("REANALYSIS_MAX_SECONDS", "240")))
+        logging.info(f'Re-analysis to v{progress["version"]}: {progress["processed"]} processed, '
+                     f'{progress["failed"]} failed, {progress["remaining"]} remaining')
+    except Exception as e:
+        logging.error(f'Error in ReanalyzeStaleMessages: {str(e)}')
+        async_pool.report_failure(e)
+
+
+@app.route(route="GetReanalysisStatus", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@traced_route
+async def GetReanalysisStatus(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Progress of the re-analysis job for the current analyzer version
+    
+    Returns the checkpoint (pass, processed, failed, request_charge,
+    started_at, updated_at, completed_at) plus the remaining stale count
+    """
+    try:
+        return func.HttpResponse(
+            json.dumps({"success": True, **await asyncio.to_thread(lambda: reanalysis_job().progress())}),
+            status_code=200,
+            headers={
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+        )
+    except Exception as e:
+        logging.error(f'Error fetching re-analysis status: {str(e)}')
+        async_pool.report_failure(e)
+        return func.HttpResponse(
+            json.dumps({"error": "Failed to fetch re-analysis status", "details": str(e)}),
+            status_code=500,
+            headers={'Content-Type': 'application/json'}
+        )
+
+
+@app.route(route="GetInboxSummary", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@traced_route
+async def GetInboxSummary(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Inbox headline numbers in one point read
+    
+    Returns totals (total, analyzed, unanalyzed, spam) and breakdowns
+    by_status, by_priority and by_sentiment
+    """
+    try:
+        summary = await inbox.read_summary_async(await async_pool.get_container(inbox.SUMMARY_CONTAINER))
+        if summary is None:
+            summary = await asyncio.to_thread(reconcile_inbox)
+        # Drop the document id and Cosmos system properties
+        summary = {k: v for k, v in summary.items() if k != 'id' and not k.startswith('_')}
+        
+        return func.HttpResponse(
+            json.dumps({"success": True, **summary}),
+            status_code=200,
+            headers={
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            }
+        )
+    except Exception as e:
+        logging.error(f'Error fetching inbox summary: {str(e)}')
+        async_pool.report_failure(e)
+        return func.HttpResponse(
+            json.dumps({"error": "Failed to fetch inbox summary", "details": str(e)}),
+            status_code=500,
+            headers={'Content-Type': 'application/json'}
+        )
+
+
+@app.timer_trigger(schedule="0 15 3 * * *", arg_name="timer", run_on_startup=False, use_monitor=True)
+async def ReconcileInboxSummary(timer: func.TimerRequest) -> None:
+    """Daily: rebuild the inbox summary from the messages to correct any drift"""
+    try:
+        await asyncio.to_thread(reconcile_inbox)
+    except Exception as e:
+        logging.error(f'Error in ReconcileInboxSummary: {str(e)}')
+        async_pool.report_failure(e)
+
+
 @app.route(route="GetPrioritizedMessages", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def GetPrioritizedMessages(req: func.HttpRequest) -> func.HttpResponse:
+@traced_route
+# Browsers revalidate every time (a 304 when nothing changed); the edge never stores it
+@cached_response(ttl=10, cache_control="private, no-cache", params=("include_spam", "limit", "continuation_token"))
+async def GetPrioritizedMessages(req: func.HttpRequest) -> func.HttpResponse:
     """
-    Get all contact messages sorted by AI-assigned priority, with optional spam filtering
+    Get contact messages sorted by AI-assigned priority, with optional spam filtering
     
     Query Parameters:
     - include_spam: true/false (default: false) - Include spam messages in results
     - limit: number of messages to return (default: 50, max: 100)
+    - continuation_token: token from the previous page
     
-    Returns messages sorted by priority score (highest first)
+    Returns analyzed messages by priority score (highest first), then messages
+    still awaiting analysis. Bodies are trimmed to a 'preview'; use the
+    returned continuation_token (null on the last page) for the next page.
     """
     logging.info('GetPrioritizedMessages function triggered')
     
     try:
         # Get query parameters
         include_spam = req.params.get('include_spam', 'false').lower() == 'true'
-        limit = min(int(req.params.get('limit', '50')), 100)
+        limit = max(1, min(int(req.params.get('limit', '50')), 100))
+        continuation_token = req.params.get('continuation_token')
         
         # Connect to Cosmos DB
-        connection_string = os.environ.get("AzureCosmosDBConnectionString")
-        client = CosmosClient.from_connection_string(connection_string)
-        database = client.get_database_client("ProjectDB")
-        container = database.get_container_client("ContactMessages")
-        
-        # Query all messages
-        query = "SELECT * FROM c ORDER BY c.timestamp DESC"
-        messages = list(container.query_items(query=query, enable_cross_partition_query=True))
-        
-        # Filter spam if requested
-        if not include_spam:
-            messages = [m for m in messages if not m.get('analysis', {}).get('is_spam', False)]
-        
-        # Separate analyzed and non-analyzed messages
-        messages_analyzed = [m for m in messages if 'analysis' in m]
-        messages_not_analyzed = [m for m in messages if 'analysis' not in m]
-        
-        # Sort analyzed messages by priority score (descending)
-        messages_analyzed.sort(
-            key=lambda x: x.get('analysis', {}).get('priority_score', 0),
-            reverse=True
-        )
-        
-        # Combine: analyzed (sorted by priority) + not analyzed (at the end)
-        sorted_messages = messages_analyzed + messages_not_analyzed
+        counters = await async_pool.get_container(inbox.SUMMARY_CONTAINER)
+        
+        # The page and the headline summary (first page only) are independent reads
+        reads = [asyncio.to_thread(lambda: inbox.list_prioritized(
+            get_container("ContactMessages"), include_spam=include_spam, limit=limit,
+            continuation_token=continuation_token))]
+        if not continuation_token:
+            reads.append(inbox.read_summary_async(counters))
+        try:
+            results = await asyncio.gather(*reads)
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({"error": str(e)}),
+                status_code=400,
+                headers={'Content-Type': 'application/json'}
+            )
         
-        # Limit results
-        sorted_messages = sorted_messages[:limit]
+        messages, next_token = results[0]
+        body = {
+            "success": True,
+            "total": len(messages),
+            "messages": messages,
+            "continuation_token": next_token
+        }
         
-        # Calculate statistics
-        spam_count = sum(1 for m in messages if m.get('analysis', {}).get('is_spam', False))
-        high_priority_count = sum(1 for m in messages_analyzed if m.get('analysis', {}).get('priority') == 'high')
+        # Headline statistics from the materialized summary, first page only
+        if not continuation_token:
+            summary = results[1] or await asyncio.to_thread(reconcile_inbox)
+            body.update({
+                "total_all_messages": summary['total'],
+                "spam_filtered": summary['spam'] if not include_spam else 0,
+                "high_priority_count": summary['by_priority'].get('high', 0)
+            })
         
         return func.HttpResponse(
-            json.dumps({
-                "success": True,
-                "total": len(sorted_messages),
-                "total_all_messages": len(messages),
-                "spam_filtered": spam_count if not include_spam else 0,
-                "high_priority_count": high_priority_count,
-                "messages": sorted_messages
-            }),
+            json.dumps(body),
             status_code=200,
             headers={
                 'Content-Type': 'application/json',
@@ -548,8 +831,29 @@ def GetPrioritizedMessages(req: func.HttpRequest) -> func.HttpResponse:
         
     except Exception as e:
         logging.error(f'Error fetching prioritized messages: {str(e)}')
+        async_pool.report_failure(e)
         return func.HttpResponse(
             json.dumps({"error": "Failed to fetch messages", "details": str(e)}),
             status_code=500,
             headers={'Content-Type': 'application/json'}
-        )
\ No newline at end of file
+        )
+
+
+@app.route(route="GetTelemetry", auth_level=func.AuthLevel.FUNCTION, methods=["GET"])
+async def GetTelemetry(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    This worker's in-memory latency and RU histograms (see telemetry.py)
+    
+    Returns one entry per metric and attribute set (route and status code,
+    Cosmos operation and container, outbound peer) with count, sum, min,
+    max, p50/p95 bucket bounds and the bucket counts; empty when another
+    exporter is configured, plus the contact admission counters (outcome
+    counts, submissions in flight). Requires a function key.
+    """
+    admission_control = admission.get_controller()
+    return func.HttpResponse(
+        json.dumps({"success": True, "metrics": telemetry.get_exporter().snapshot(),
+                    "admission": admission_control.stats() if admission_control is not None else None}),
+        status_code=200,
+        headers={'Content-Type': 'application/json'}
+    )
@@ -0,0 +1,147 @@
+"""
+GitHub Response Cache
+Two-tier (in-process LRU + shared Cosmos container) cache of GitHub API
+responses with ETag/Last-Modified revalidation and stale-while-revalidate
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+
+@dataclass
+class CachedResponse:
+    """A GitHub response body, its pagination link and the validators needed to revalidate it"""
+    url: str
+    body: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    next_url: Optional[str] = None
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class GitHubResponseCache:
+    """
+    URL-keyed cache consulted by AsyncGitHubClient.get_json.
+
+    Entries younger than `ttl` are served without touching GitHub. Older
+    entries (up to `stale_ttl`) are served immediately while a background
+    conditional request refreshes them; a 304 counts as a hit and only
+    bumps fetched_at. The shared tier lets every worker (and cold starts)
+    reuse what any other worker fetched.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, stale_ttl: float = 86400,
+                 shared_container: Optional[Callable[[], ContainerProxy]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared_container = shared_container
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Look up the memory tier, then the shared tier"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+
+        entry = self._read_shared(url)
+        if entry is not None:
+            self._remember(entry)
+        return entry
+
+    def put(self, entry: CachedResponse) -> None:
+        """Store in both tiers"""
+        self._remember(entry)
+        self._write_shared(entry)
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return entry.age() < self.ttl
+
+    def is_usable_stale(self, entry: CachedResponse) -> bool:
+        return entry.age() < self.stale_ttl
+
+    def begin_refresh(self, url: str) -> bool:
+        """Claim the background refresh for url; False if one is already running"""
+        with self._lock:
+            if url in self._refreshing:
+                return False
+            self._refreshing.add(url)
+            return True
+
+    def end_refresh(self, url: str) -> None:
+        with self._lock:
+            self._refreshing.discard(url)
+
+    def record(self, outcome: str) -> None:
+        """Count a 'hits', 'misses' or 'revalidations' outcome"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'revalidations': self.revalidations}
+
+    def _remember(self, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[entry.url] = entry
+            self._entries.move_to_end(entry.url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _document_id(url: str) -> str:
+        # Cosmos ids cannot contain '/', '?' or '#'
+        return 'github-' + hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _read_shared(self, url: str) -> Optional[CachedResponse]:
+        if self.shared_container is None:
+            return None
+        doc_id = self._document_id(url)
+        try:
+            doc = self.shared_container().read_item(item=doc_id, partition_key=doc_id)
+        except CosmosResourceNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f'GitHub cache shared read failed: {str(e)}')
+            return None
+        return CachedResponse(url=doc['url'], body=doc['body'], etag=doc.get('etag'),
+                              last_modified=doc.get('last_modified'), fetched_at=doc.get('fetched_at', 0.0),
+                              next_url=doc.get('next_url'))
+
+    def _write_shared(self, entry: CachedResponse) -> None:
+        if self.shared_container is None:
+            return
+        doc = asdict(entry)
+        doc['id'] = self._document_id(entry.url)
+        # Let Cosmos expire entries that are too old to serve even as stale
+        doc['ttl'] = int(self.stale_ttl)
+        try:
+            self.shared_container().upsert_item(body=doc)
+        except Exception as e:
+            logging.warning(f'GitHub cache shared write failed: {str(e)}')
@@ -0,0 +1,443 @@
+"""
+GitHub Stats Pipeline
+Async client on the pooled HTTP session, conditional-request caching,
+pagination, an incremental per-repo language index and versioned stats
+snapshots behind GetGitHubStats
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+import async_pool
+from cosmos_pool import get_container
+from github_cache import CachedResponse, GitHubResponseCache
+from telemetry import http_span
+
+GITHUB_API_URL = "https://api.github.com"
+
+
+class AsyncGitHubClient:
+    """
+    Thin GitHub REST client on the worker's shared keep-alive aiohttp
+    session (async_pool.get_http_session).
+
+    With a cache, responses are revalidated with
+    If-None-Match/If-Modified-Since and stale entries are served while a
+    background refresh runs as a task on the event loop. With `revalidate`,
+    every cached entry is revalidated before it is returned (a 304 still
+    costs no rate limit), for callers that need current data. The cache's
+    shared Cosmos tier is synchronous and is read and written on a thread.
+    """
+
+    def __init__(self, token: Optional[str] = None, base_url: str = GITHUB_API_URL,
+                 timeout: float = 10.0, max_workers: int = 16,
+                 cache: Optional[GitHubResponseCache] = None, revalidate: bool = False):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.revalidate = revalidate
+        self.max_workers = max_workers
+        self.cache = cache
+        self.headers = {'Accept': 'application/vnd.github+json'}
+        if token:
+            self.headers['Authorization'] = f'token {token}'
+        self._refreshes = set()
+
+    async def get_json(self, path: str, params: Optional[Dict] = None):
+        """GET a path relative to the API root, raising on HTTP errors"""
+        url = f'{self.base_url}{path}'
+        if params:
+            url = f'{url}?{urlencode(sorted(params.items()))}'
+        return (await self._get(url)).body
+
+    async def iter_pages(self, path: str, params: Optional[Dict] = None) -> AsyncIterator:
+        """Yield every item of a paginated list endpoint, following Link rel="next" """
+        url = f'{self.base_url}{path}'
+        if params:
+            url = f'{url}?{urlencode(sorted(params.items()))}'
+        while url:
+            page = await self._get(url)
+            for item in page.body:
+                yield item
+            url = page.next_url
+
+    async def _get(self, url: str) -> CachedResponse:
+        if self.cache is None:
+            return await self._revalidate(url, None)
+
+        entry = await asyncio.to_thread(self.cache.get, url)
+        if entry is not None and self.revalidate:
+            return await self._revalidate(url, entry)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.record('hits')
+            return entry
+        if entry is not None and self.cache.is_usable_stale(entry):
+            self.cache.record('hits')
+            if self.cache.begin_refresh(url):
+                # Keep a reference so the task is not collected mid-flight
+                task = asyncio.create_task(self._background_refresh(url, entry))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+            return entry
+
+        self.cache.record('misses')
+        return await self._revalidate(url, entry)
+
+    async def _revalidate(self, url: str, entry: Optional[CachedResponse]) -> CachedResponse:
+        """Conditional GET; a 304 keeps the cached body and refreshes its timestamp"""
+        headers = dict(self.headers, **(entry.conditional_headers() if entry is not None else {}))
+        with http_span('api.github.com', 'GET') as span:
+            async with async_pool.get_http_session().get(url, headers=headers, timeout=self.timeout) as response:
+                span.set('status_code', response.status)
+                if response.status == 304 and entry is not None:
+                    fresh = _revalidated(entry, response.headers)
+                else:
+                    response.raise_for_status()
+                    next_link = response.links.get('next')
+                    fresh = _fetched(url, await response.json(content_type=None), response.headers,
+                                     str(next_link['url']) if next_link else None)
+
+        if self.cache is not None:
+            if response.status == 304 and entry is not None:
+                self.cache.record('revalidations')
+            await asyncio.to_thread(self.cache.put, fresh)
+        return fresh
+
+    async def _background_refresh(self, url: str, entry: CachedResponse) -> None:
+        try:
+            await self._revalidate(url, entry)
+        except Exception as e:
+            logging.warning(f'Background GitHub refresh failed for {url}: {str(e)}')
+        finally:
+            self.cache.end_refresh(url)
+
+
+def _fetched(url: str, body, headers, next_url: Optional[str]) -> CachedResponse:
+    """Cache entry for a 200 response"""
+    return CachedResponse(
+        url=url,
+        body=body,
+        etag=headers.get('ETag'),
+        last_modified=headers.get('Last-Modified'),
+        fetched_at=time.time(),
+        next_url=next_url
+    )
+
+
+def _revalidated(entry: CachedResponse, headers) -> CachedResponse:
+    """entry after a 304: same body, refreshed validators and timestamp"""
+    return CachedResponse(
+        url=entry.url,
+        body=entry.body,
+        etag=headers.get('ETag', entry.etag),
+        last_modified=headers.get('Last-Modified', entry.last_modified),
+        fetched_at=time.time(),
+        next_url=entry.next_url
+    )
+
+
+class LanguageIndex:
+    """
+    Per-repository language byte counts keyed by the repo's pushed_at.
+
+    Only repos pushed since the last snapshot need a /languages call, so a
+    refresh costs one request per changed repo rather than one per repo.
+    The index is persisted as one document in the ApiCache container.
+    """
+
+    def __init__(self, username: str, container: Optional[Callable[[], ContainerProxy]] = None):
+        self.username = username
+        self.container = container
+        self.repos: Dict[str, Dict] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def document_id(self) -> str:
+        return f'github-language-index-{self.username}'
+
+    async def refresh_async(self, client: AsyncGitHubClient, repos: List[Dict]) -> Dict[str, int]:
+        """
+        Bring the index up to date with the given repos: the /languages
+        calls run concurrently on the event loop, at most
+        client.max_workers at a time
+
+        The lock is only held while the index is read or updated, never
+        across an await, so it cannot stall the loop; two overlapping
+        refreshes at worst fetch the same repo twice.
+        """
+        await asyncio.to_thread(self._load_locked)
+        with self._lock:
+            changed = self._changed(repos)
+
+        semaphore = asyncio.Semaphore(client.max_workers)
+
+        async def fetch(repo: Dict) -> Optional[Dict[str, int]]:
+            async with semaphore:
+                return await _fetch_languages_async(client, self.username, repo['name'])
+
+        results = await asyncio.gather(*(fetch(repo) for repo in changed))
+        with self._lock:
+            language_bytes, dirty = self._apply(repos, changed, results)
+        if dirty:
+            await asyncio.to_thread(self._save)
+        return language_bytes
+
+    def _changed(self, repos: List[Dict]) -> List[Dict]:
+        """Repos whose languages must be fetched: new, or pushed since they were indexed"""
+        return [repo for repo in repos
+                if self.repos.get(repo['name'], {}).get('pushed_at') != repo.get('pushed_at')]
+
+    def _apply(self, repos: List[Dict], changed: List[Dict], results: List[Optional[Dict[str, int]]]):
+        """
+        Store fetched languages and drop repos that no longer exist
+
+        Returns:
+            (total bytes per language across repos, whether the index changed)
+        """
+        dirty = False
+        for repo, languages in zip(changed, results):
+            if languages is not None:
+                self.repos[repo['name']] = {'pushed_at': repo.get('pushed_at'), 'languages': languages}
+                dirty = True
+
+        current = {repo['name'] for repo in repos}
+        for name in [name for name in self.repos if name not in current]:
+            del self.repos[name]
+            dirty = True
+
+        if changed:
+            logging.info(f'Language index: refetched {len(changed)} of {len(repos)} repos')
+
+        language_bytes: Dict[str, int] = {}
+        for name in current:
+            for lang, bytes_count in self.repos.get(name, {}).get('languages', {}).items():
+                language_bytes[lang] = language_bytes.get(lang, 0) + bytes_count
+        return language_bytes, dirty
+
+    def _load_locked(self) -> None:
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        if self._loaded or self.container is None:
+            self._loaded = True
+            return
+        try:
+            doc = self.container().read_item(item=self.document_id, partition_key=self.document_id)
+            self.repos = doc.get('repos', {})
+        except CosmosResourceNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f'Could not load language index: {str(e)}')
+        self._loaded = True
+
+    def _save(self) -> None:
+        if self.container is None:
+            return
+        try:
+            self.container().upsert_item(body={'id': self.document_id, 'username': self.username,
+                                               'repos': self.repos, 'updated_at': time.time()})
+        except Exception as e:
+            logging.warning(f'Could not save language index: {str(e)}')
+
+
+async def build_stats_async(client: AsyncGitHubClient, username: str, index: Optional[LanguageIndex] = None) -> Dict:
+    """
+    Fetch the profile, every page of repositories and per-repo languages
+    and aggregate them
+
+    The profile request, the repo pages and the /languages fan-out (for
+    each non-fork repo the language index has not seen at its current
+    pushed_at) are all in flight on the event loop without a thread each.
+    """
+    index = index or LanguageIndex(username)
+    user_task = asyncio.ensure_future(client.get_json(f'/users/{username}'))
+    try:
+        repos_data = [repo async for repo in client.iter_pages(f'/users/{username}/repos', params={'per_page': 100})]
+        own_repos = [repo for repo in repos_data if not repo.get('fork', False)]
+        language_bytes = await index.refresh_async(client, own_repos)
+        user_data = await user_task
+    finally:
+        user_task.cancel()
+    return _aggregate(username, user_data, repos_data, own_repos, language_bytes)
+
+
+def _aggregate(username: str, user_data: Dict, repos_data: List[Dict], own_repos: List[Dict],
+               language_bytes: Dict[str, int]) -> Dict:
+    # Calculate total stars and forks across all repos
+    total_stars = sum(repo.get('stargazers_count', 0) for repo in repos_data)
+    total_forks = sum(repo.get('forks_count', 0) for repo in repos_data)
+
+    return {
+        'username': username,
+        'public_repos': user_data.get('public_repos', 0),
+        'followers': user_data.get('followers', 0),
+        'following': user_data.get('following', 0),
+        'total_stars': total_stars,
+        'total_forks': total_forks,
+        'languages': language_percentages(language_bytes),
+        'recent_activity': recent_activity(own_repos)
+    }
+
+
+def language_percentages(language_bytes: Dict[str, int]) -> List[Dict]:
+    """Byte totals per language as [{'language', 'bytes', 'percentage'}], largest first"""
+    total_bytes = sum(language_bytes.values())
+    if total_bytes == 0:
+        return []
+    language_stats = [
+        {
+            'language': lang,
+            'bytes': bytes_count,
+            'percentage': round((bytes_count / total_bytes) * 100, 2)
+        }
+        for lang, bytes_count in language_bytes.items()
+    ]
+    language_stats.sort(key=lambda x: x['percentage'], reverse=True)
+    return language_stats
+
+
+def recent_activity(repos: List[Dict], count: int = 5) -> List[Dict]:
+    """The most recently updated repositories"""
+    recent_repos = sorted(repos, key=lambda x: x.get('updated_at', ''), reverse=True)
+    return [
+        {
+            'name': repo.get('name', 'Unknown'),
+            'url': repo.get('html_url', '#'),
+            'description': repo.get('description', 'No description available'),
+            'language': repo.get('language', None),
+            'stars': repo.get('stargazers_count', 0),
+            'updated': repo.get('updated_at', '')
+        }
+        for repo in recent_repos[:count]
+    ]
+
+
+async def _fetch_languages_async(client: AsyncGitHubClient, username: str,
+                                 repo_name: str) -> Optional[Dict[str, int]]:
+    try:
+        return await client.get_json(f'/repos/{username}/{repo_name}/languages')
+    except Exception as e:
+        logging.warning(f'Skipping languages for {repo_name}: {str(e)}')
+        return None
+
+
+# Previous snapshot versions are kept for a week
+SNAPSHOT_HISTORY_TTL = 7 * 24 * 3600
+
+
+def snapshot_id(username: str) -> str:
+    return f'github-stats-snapshot-{username}'
+
+
+def save_snapshot(container: ContainerProxy, username: str, stats: Dict) -> Dict:
+    """
+    Store stats as the latest snapshot, bumping its version
+
+    The latest snapshot keeps a stable id so readers need one point read;
+    each version is also written under its own id with a TTL for history.
+    """
+    doc_id = snapshot_id(username)
+    try:
+        previous = container.read_item(item=doc_id, partition_key=doc_id)
+        version = previous.get('version', 0) + 1
+    except CosmosResourceNotFoundError:
+        version = 1
+
+    snapshot = {
+        'id': doc_id,
+        'username': username,
+        'version': version,
+        'generated_at': datetime.utcnow().isoformat(),
+        'stats': stats
+    }
+    container.upsert_item(body=snapshot)
+    container.upsert_item(body=dict(snapshot, id=f'{doc_id}-v{version}', ttl=SNAPSHOT_HISTORY_TTL))
+    return snapshot
+
+
+async def load_snapshot_async(container, username: str, max_age: float) -> Optional[Dict]:
+    """Latest snapshot, or None if there is none or it is older than max_age seconds"""
+    doc_id = snapshot_id(username)
+    try:
+        snapshot = await container.read_item(item=doc_id, partition_key=doc_id)
+    except CosmosResourceNotFoundError:
+        return None
+    return snapshot if _snapshot_age(snapshot) <= max_age else None
+
+
+def _snapshot_age(snapshot: Dict) -> float:
+    return (datetime.utcnow() - datetime.fromisoformat(snapshot['generated_at'])).total_seconds()
+
+
+# Keyed by revalidate
+_async_clients: Dict[bool, AsyncGitHubClient] = {}
+_cache: Optional[GitHubResponseCache] = None
+_client_lock = threading.Lock()
+_indexes: Dict[str, LanguageIndex] = {}
+
+
+def get_async_client(revalidate: bool = False) -> AsyncGitHubClient:
+    """
+    Process-wide client configured from app settings; with revalidate, the
+    client that revalidates every cached response instead of serving it
+    (for the precompute timer). Both share one response cache.
+
+    Settings:
+        GITHUB_TOKEN: optional API token (raises the rate limit)
+        GITHUB_API_URL: API root (default https://api.github.com)
+        GITHUB_TIMEOUT: seconds per request (default 10)
+        GITHUB_MAX_WORKERS: concurrent /languages requests (default 16)
+        GITHUB_CACHE_TTL: seconds a response is served without revalidating (default 300)
+        GITHUB_CACHE_STALE_TTL: seconds a response may be served stale while refreshing (default 86400)
+        GITHUB_CACHE_SIZE: in-process cache entries (default 1024)
+        GITHUB_CACHE_SHARED: also cache in the ApiCache Cosmos container (default true)
+    """
+    client = _async_clients.get(revalidate)
+    if client is None:
+        with _client_lock:
+            client = _async_clients.get(revalidate)
+            if client is None:
+                client = _async_clients[revalidate] = AsyncGitHubClient(
+                    cache=_get_cache(), revalidate=revalidate, **_client_settings())
+    return client
+
+
+def _client_settings() -> Dict:
+    return {
+        'token': os.environ.get("GITHUB_TOKEN"),
+        'base_url': os.environ.get("GITHUB_API_URL", GITHUB_API_URL),
+        'timeout': float(os.environ.get("GITHUB_TIMEOUT", "10")),
+        'max_workers': int(os.environ.get("GITHUB_MAX_WORKERS", "16")),
+    }
+
+
+def _get_cache() -> GitHubResponseCache:
+    """The response cache shared by every client (call with _client_lock held)"""
+    global _cache
+    if _cache is None:
+        shared = os.environ.get("GITHUB_CACHE_SHARED", "true").lower() == "true"
+        _cache = GitHubResponseCache(
+            max_entries=int(os.environ.get("GITHUB_CACHE_SIZE", "1024")),
+            ttl=float(os.environ.get("GITHUB_CACHE_TTL", "300")),
+            stale_ttl=float(os.environ.get("GITHUB_CACHE_STALE_TTL", "86400")),
+            shared_container=(lambda: get_container("ApiCache")) if shared else None
+        )
+    return _cache
+
+
+def get_language_index(username: str) -> LanguageIndex:
+    """Process-wide language index for a user, persisted in the ApiCache container"""
+    with _client_lock:
+        if username not in _indexes:
+            _indexes[username] = LanguageIndex(username, container=lambda: get_container("ApiCache"))
+        return _indexes[username]
@@ -0,0 +1,260 @@
+"""
+Contact Inbox
+Server-side ordered, paginated listing of contact messages for
+GetPrioritizedMessages, served by the ContactMessages composite indexes,
+and the materialized inbox summary behind its headline numbers
+"""
+import base64
+import binascii
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from partitioning import get_container
+from visitor_counter import increment_fields
+
+PREVIEW_LENGTH = 200
+
+# The list view never shows whole bodies; a preview is enough
+LIST_FIELDS = ("c.id, c.name, c.email, c.subject, c.timestamp, c.status, c.analysis, "
+               f"c.analyzed_at, c.analysis_status, LEFT(c.message, {PREVIEW_LENGTH}) AS preview")
+
+# Analyzed messages by priority. The spam filter is an equality on the
+# first key of the composite index (is_spam, priority_score, timestamp, id),
+# so it is repeated in ORDER BY for the index to serve both. id breaks ties
+# so every row has a unique sort key to page after.
+ANALYZED_QUERY = (f"SELECT TOP @limit {LIST_FIELDS} FROM c WHERE c.analysis.is_spam = false{{after}} "
+                  "ORDER BY c.analysis.is_spam ASC, c.analysis.priority_score DESC, c.timestamp DESC, c.id DESC")
+ANALYZED_WITH_SPAM_QUERY = (f"SELECT TOP @limit {LIST_FIELDS} FROM c "
+                            "WHERE IS_DEFINED(c.analysis.priority_score){after} "
+                            "ORDER BY c.analysis.priority_score DESC, c.timestamp DESC, c.id DESC")
+# Not yet analyzed (pending) messages follow, newest first
+UNANALYZED_QUERY = (f"SELECT TOP @limit {LIST_FIELDS} FROM c WHERE NOT IS_DEFINED(c.analysis){{after}} "
+                    "ORDER BY c.timestamp DESC, c.id DESC")
+
+# Keyset predicates: rows sorting after the last one of the previous page
+AFTER_ANALYZED = (" AND (c.analysis.priority_score < @score OR (c.analysis.priority_score = @score AND "
+                  "(c.timestamp < @timestamp OR (c.timestamp = @timestamp AND c.id < @id))))")
+AFTER_UNANALYZED = " AND (c.timestamp < @timestamp OR (c.timestamp = @timestamp AND c.id < @id))"
+
+PHASES = ('analyzed', 'unanalyzed')
+# Sort key parameters of each phase, in ORDER BY order
+PHASE_KEYS = {'analyzed': ('@score', '@timestamp', '@id'), 'unanalyzed': ('@timestamp', '@id')}
+
+SUMMARY_ID = "inbox-summary"
+SUMMARY_CONTAINER = "Counter"
+
+RECONCILE_QUERY = ("SELECT c.status, IS_DEFINED(c.analysis) AS analyzed, c.analysis.is_spam AS is_spam, "
+                   "c.analysis.priority AS priority, c.analysis.sentiment AS sentiment FROM c")
+
+_summary_lock = threading.Lock()
+_summary_checked = False
+
+
+def encode_token(state: Optional[Dict]) -> Optional[str]:
+    if state is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(state).encode('utf-8')).decode('ascii')
+
+
+def decode_token(token: Optional[str]) -> Dict:
+    """Inverse of encode_token; raises ValueError for a malformed token"""
+    if not token:
+        return {'phase': PHASES[0], 'after': None}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'Invalid continuation_token: {str(e)}')
+    if not isinstance(state, dict) or state.get('phase') not in PHASES:
+        raise ValueError('Invalid continuation_token')
+    after = state.get('after')
+    if after is not None and (not isinstance(after, list) or len(after) != len(PHASE_KEYS[state['phase']])):
+        raise ValueError('Invalid continuation_token')
+    return state
+
+
+def _sort_key(message: Dict, phase: str) -> List:
+    if phase == 'analyzed':
+        return [message['analysis']['priority_score'], message['timestamp'], message['id']]
+    return [message['timestamp'], message['id']]
+
+
+def list_prioritized(container: ContainerProxy, include_spam: bool = False, limit: int = 50,
+                     continuation_token: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of the inbox: analyzed messages by priority score, then unanalyzed ones
+
+    Pages by keyset rather than Cosmos continuation tokens, which cannot
+    resume a cross-partition ORDER BY query: the returned token encodes
+    which of the two queries to continue and the sort key (priority score,
+    timestamp, id) of the last message returned; None means the end.
+
+    Returns:
+        (messages, continuation_token)
+    """
+    state = decode_token(continuation_token)
+    messages: List[Dict] = []
+
+    while state is not None and len(messages) < limit:
+        phase = state['phase']
+        if phase == 'analyzed':
+            query = ANALYZED_WITH_SPAM_QUERY if include_spam else ANALYZED_QUERY
+            after = AFTER_ANALYZED
+        else:
+            query, after = UNANALYZED_QUERY, AFTER_UNANALYZED
+
+        wanted = limit - len(messages)
+        parameters = [{'name': '@limit', 'value': wanted}]
+        if state.get('after') is not None:
+            parameters += [{'name': name, 'value': value}
+                           for name, value in zip(PHASE_KEYS[phase], state['after'])]
+        else:
+            after = ''
+        page = list(container.query_items(
+            query=query.format(after=after),
+            parameters=parameters,
+            enable_cross_partition_query=True
+        ))
+        messages.extend(page)
+
+        if len(page) == wanted:
+            state = {'phase': phase, 'after': _sort_key(page[-1], phase)}
+        elif phase == PHASES[0]:
+            state = {'phase': PHASES[1], 'after': None}
+        else:
+            state = None
+
+    return messages, encode_token(state)
+
+
+# ============================================================================
+# Materialized summary
+# ============================================================================
+
+def _summary_skeleton() -> Dict:
+    # Every parent object exists up front; patch 'incr' cannot create them
+    return {
+        'id': SUMMARY_ID,
+        'total': 0,
+        'analyzed': 0,
+        'unanalyzed': 0,
+        'spam': 0,
+        'by_status': {'new': 0},
+        'by_priority': {'high': 0, 'medium': 0, 'low': 0},
+        'by_sentiment': {'positive': 0, 'neutral': 0, 'negative': 0}
+    }
+
+
+def _analysis_fields(analysis: Optional[Dict]) -> Dict[str, int]:
+    if not analysis:
+        return {'/unanalyzed': 1}
+    fields = {
+        '/analyzed': 1,
+        f'/by_priority/{analysis.get("priority", "unknown")}': 1,
+        f'/by_sentiment/{analysis.get("sentiment", "unknown")}': 1
+    }
+    if analysis.get('is_spam'):
+        fields['/spam'] = 1
+    return fields
+
+
+def _difference(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    delta = dict(after)
+    for path, amount in before.items():
+        delta[path] = delta.get(path, 0) - amount
+    return {path: amount for path, amount in delta.items() if amount}
+
+
+def creation_delta(status: str, analysis: Optional[Dict]) -> Dict[str, int]:
+    """Summary increments for a newly stored message"""
+    return {'/total': 1, f'/by_status/{status}': 1, **_analysis_fields(analysis)}
+
+
+def analysis_delta(before: Optional[Dict], after: Optional[Dict]) -> Dict[str, int]:
+    """Summary increments for a message whose analysis changed from before to after"""
+    return _difference(_analysis_fields(after), _analysis_fields(before))
+
+
+def status_delta(before: str, after: str) -> Dict[str, int]:
+    return _difference({f'/by_status/{after}': 1}, {f'/by_status/{before}': 1})
+
+
+def merge_deltas(deltas: List[Dict[str, int]]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for delta in deltas:
+        for path, amount in delta.items():
+            merged[path] = merged.get(path, 0) + amount
+    return {path: amount for path, amount in merged.items() if amount}
+
+
+def record(delta: Dict[str, int]) -> None:
+    """
+    Apply a delta to the summary document.
+
+    The first call in a worker seeds the summary with reconcile() if it
+    does not exist yet (that count already includes this change, so the
+    delta is then skipped). Failures are logged, not raised: the summary is
+    derived data and the reconciliation timer corrects any drift.
+    """
+    global _summary_checked
+    delta = {path: amount for path, amount in delta.items() if amount}
+    if not delta:
+        return
+    try:
+        counters = get_container(SUMMARY_CONTAINER)
+        if not _summary_checked:
+            with _summary_lock:
+                if not _summary_checked:
+                    missing = read_summary(counters) is None
+                    if missing:
+                        reconcile(get_container("ContactMessages"), counters)
+                    _summary_checked = True
+                    if missing:
+                        return
+        increment_fields(counters, SUMMARY_ID, delta)
+    except Exception as e:
+        logging.warning(f'Inbox summary update failed: {str(e)}')
+
+
+def read_summary(counters: ContainerProxy) -> Optional[Dict]:
+    """The summary document (one point read), or None if it was never built"""
+    try:
+        return counters.read_item(item=SUMMARY_ID, partition_key=SUMMARY_ID)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+async def read_summary_async(counters) -> Optional[Dict]:
+    """read_summary() with an async container client"""
+    try:
+        return await counters.read_item(item=SUMMARY_ID, partition_key=SUMMARY_ID)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def reconcile(messages: ContainerProxy, counters: ContainerProxy) -> Dict:
+    """
+    Rebuild the summary from the messages themselves and overwrite it.
+
+    Streams a few projected fields per message. Increments recorded while
+    the scan runs can be lost; the next reconciliation picks them up.
+    """
+    summary = _summary_skeleton()
+    for row in messages.query_items(query=RECONCILE_QUERY, enable_cross_partition_query=True):
+        analysis = ({'is_spam': row.get('is_spam'), 'priority': row.get('priority'),
+                     'sentiment': row.get('sentiment')} if row.get('analyzed') else None)
+        for path, amount in creation_delta(row.get('status', 'new'), analysis).items():
+            parts = [p for p in path.split('/') if p]
+            parent = summary
+            for part in parts[:-1]:
+                parent = parent.setdefault(part, {})
+            parent[parts[-1]] = parent.get(parts[-1], 0) + amount
+    summary['reconciled_at'] = datetime.utcnow().isoformat()
+    counters.upsert_item(body=summary)
+    logging.info(f'Inbox summary reconciled: {summary["total"]} messages')
+    return summary
@@ -0,0 +1,131 @@
+"""
+Batch Message Analysis
+Pages through ContactMessages, scores each page with
+SentimentAnalyzer.analyze_many and patches the results back in parallel
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from azure.cosmos import ContainerProxy
+
+import inbox
+from sentiment_analyzer import SentimentAnalyzer
+
+# Only the fields the analyzer (and the inbox summary) reads; full
+# documents are never loaded
+PAGE_QUERY = "SELECT c.id, c.subject, c.message, c.analysis FROM c"
+UNANALYZED_PAGE_QUERY = "SELECT c.id, c.subject, c.message FROM c WHERE NOT IS_DEFINED(c.analysis)"
+
+MAX_PAGE_SIZE = 1000
+WRITE_CONCURRENCY = 16
+
+
+def write_analyses(container: ContainerProxy, analyses: List[Tuple[str, Dict]],
+                   previous: Optional[Dict[str, Optional[Dict]]] = None,
+                   analyzed_at: Optional[str] = None, max_workers: int = WRITE_CONCURRENCY,
+                   **request_options) -> List[str]:
+    """
+    Patch /analysis, /analyzed_at and /analysis_status onto each message.
+
+    Every container is partitioned on /id, so there is no multi-document
+    batch to use; the point patches run concurrently instead. Extra keyword
+    arguments (e.g. response_hook) are passed to every patch_item call.
+
+    Args:
+        previous: {message id: analysis it had before (None if none)}; when
+                  given, the inbox summary is updated once for the batch
+
+    Returns:
+        Ids whose patch failed
+    """
+    analyzed_at = analyzed_at or datetime.utcnow().isoformat()
+
+    def patch(item: Tuple[str, Dict]) -> Optional[str]:
+        message_id, analysis = item
+        try:
+            container.patch_item(item=message_id, partition_key=message_id, patch_operations=[
+                {'op': 'set', 'path': '/analysis', 'value': analysis},
+                {'op': 'set', 'path': '/analyzed_at', 'value': analyzed_at},
+                {'op': 'set', 'path': '/analysis_status', 'value': 'complete'},
+            ], **request_options)
+            return None
+        except Exception as e:
+            logging.warning(f'Failed to write analysis for {message_id}: {str(e)}')
+            return message_id
+
+    if not analyses:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(analyses)))) as pool:
+        failed = [message_id for message_id in pool.map(patch, analyses) if message_id]
+
+    if previous is not None:
+        inbox.record(inbox.merge_deltas([
+            inbox.analysis_delta(previous.get(message_id), analysis)
+            for message_id, analysis in analyses if message_id not in failed
+        ]))
+    return failed
+
+
+def analyze_batch(container: ContainerProxy, page_size: int = 200,
+                  continuation_token: Optional[str] = None, only_unanalyzed: bool = False,
+                  max_seconds: float = 60.0) -> Dict:
+    """
+    Re-analyze stored messages page by page until they run out or the time budget is spent
+
+    Args:
+        page_size: messages per query page (capped at MAX_PAGE_SIZE)
+        continuation_token: token returned by a previous call, to resume
+        only_unanalyzed: skip messages that already carry an analysis
+        max_seconds: stop after the page that crosses this budget
+
+    Returns:
+        {
+            'processed': int,
+            'failed': [message ids],
+            'pages': int,
+            'continuation_token': str or None (None once every page is done),
+            'elapsed_seconds': float
+        }
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    started = time.monotonic()
+    processed = 0
+    pages = 0
+    failed: List[str] = []
+
+    # With only_unanalyzed the result set shrinks as pages are written, so
+    # a saved token could skip messages. Every call restarts from the top
+    # and the returned token only signals that more work remains.
+    if only_unanalyzed:
+        continuation_token = None
+
+    pager = container.query_items(
+        query=UNANALYZED_PAGE_QUERY if only_unanalyzed else PAGE_QUERY,
+        enable_cross_partition_query=True,
+        max_item_count=page_size
+    ).by_page(continuation_token)
+
+    next_token = None
+    for page in pager:
+        messages = list(page)
+        analyses = SentimentAnalyzer.analyze_many(
+            [(m.get('subject', ''), m.get('message', '')) for m in messages]
+        )
+        failed.extend(write_analyses(container, [(m['id'], a) for m, a in zip(messages, analyses)],
+                                     previous={m['id']: m.get('analysis') for m in messages}))
+        processed += len(messages)
+        pages += 1
+        next_token = pager.continuation_token
+        if time.monotonic() - started >= max_seconds:
+            break
+
+    return {
+        'processed': processed,
+        'failed': failed,
+        'pages': pages,
+        'continuation_token': next_token,
+        'elapsed_seconds': round(time.monotonic() - started, 3)
+    }
@@ -0,0 +1,271 @@
+"""
+Partition Migration
+Copies ResumeDownloads and ContactMessages into their /bucket-partitioned
+*ByMonth containers (see partitioning.py) with streaming reads, per-bucket
+transactional batches and a resumable checkpoint
+
+Cutover:
+    1. Create the *ByMonth containers (terraform) and set
+       PARTITION_MIGRATION_MODE=dual, so new writes reach both layouts.
+    2. python partition_migration.py copy --container ContactMessages
+       (repeat until it reports completed; each run resumes the checkpoint)
+    3. python partition_migration.py verify --container ContactMessages
+    4. Set PARTITION_MIGRATION_MODE=migrated; reads now use the new layout
+       and the legacy container stays in sync for rollback.
+    5. Once satisfied, set PARTITION_MIGRATION_MODE=bucketed.
+
+Usage:
+    python partition_migration.py {copy,verify,status} --container NAME
+        [--max-seconds 600] [--page-size 1000] [--restart]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from cosmos_pool import get_container
+from partitioning import BUCKETED_CONTAINERS, to_bucketed, to_legacy
+
+# Cosmos caps a transactional batch at 100 operations
+MAX_BATCH_OPERATIONS = 100
+
+SOURCE_QUERY = "SELECT * FROM c"
+SOURCE_VERSIONS_QUERY = "SELECT c.id, c._ts FROM c"
+TARGET_VERSIONS_QUERY = "SELECT c.id, c.bucket, c.source_ts FROM c"
+
+
+class PartitionMigration:
+    """
+    Streams `source` page by page and upserts each page into `target`.
+
+    A page is grouped by bucket and written as transactional batches of up
+    to 100 upserts, one partition per batch, with bounded concurrency. The
+    checkpoint document (in `checkpoints`, partitioned on /id) stores the
+    source query's continuation token after every page, so an interrupted
+    copy resumes where it stopped. Upserts make repeating a page harmless.
+
+    Writes that land on the source while the copy runs are mirrored by the
+    dual-write layer; verify() repairs any copy that is missing or whose
+    content differs from its source document.
+    """
+
+    def __init__(self, source: ContainerProxy, target: ContainerProxy, checkpoints: ContainerProxy,
+                 page_size: int = 1000, max_workers: int = 8):
+        self.source = source
+        self.target = target
+        self.checkpoints = checkpoints
+        self.page_size = page_size
+        self.max_workers = max_workers
+
+    @property
+    def checkpoint_id(self) -> str:
+        return f'partition-migration-{self.source.id}'
+
+    def load_checkpoint(self) -> Dict:
+        try:
+            return self.checkpoints.read_item(item=self.checkpoint_id, partition_key=self.checkpoint_id)
+        except CosmosResourceNotFoundError:
+            return self._new_checkpoint()
+
+    def _new_checkpoint(self) -> Dict:
+        return {
+            'id': self.checkpoint_id,
+            'source': self.source.id,
+            'target': self.target.id,
+            'continuation_token': None,
+            'copied': 0,
+            'failed': 0,
+            'pages': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'updated_at': None,
+            'completed_at': None
+        }
+
+    def copy(self, max_seconds: float = 600.0, restart: bool = False) -> Dict:
+        """
+        Copy pages until the source is exhausted or the time budget is spent
+
+        Returns:
+            The checkpoint after the run
+        """
+        started = time.monotonic()
+        checkpoint = self._new_checkpoint() if restart else self.load_checkpoint()
+        if checkpoint['completed_at']:
+            return checkpoint
+
+        pager = self.source.query_items(
+            query=SOURCE_QUERY,
+            enable_cross_partition_query=True,
+            max_item_count=self.page_size
+        ).by_page(checkpoint['continuation_token'])
+
+        for page in pager:
+            docs = list(page)
+            failed = self.write(docs)
+            checkpoint['continuation_token'] = pager.continuation_token
+            checkpoint['copied'] += len(docs) - len(failed)
+            checkpoint['failed'] += len(failed)
+            checkpoint['pages'] += 1
+            if not checkpoint['continuation_token']:
+                checkpoint['completed_at'] = datetime.utcnow().isoformat()
+            self._save(checkpoint)
+            logging.info(f'Migrated {checkpoint["copied"]} documents from {self.source.id} '
+                         f'({checkpoint["failed"]} failed)')
+            if time.monotonic() - started >= max_seconds:
+                break
+        else:
+            if not checkpoint['completed_at']:
+                checkpoint['completed_at'] = datetime.utcnow().isoformat()
+                self._save(checkpoint)
+
+        return checkpoint
+
+    def write(self, docs: List[Dict]) -> List[str]:
+        """
+        Upsert source documents into the target, batched per bucket
+
+        Returns:
+            Ids that could not be written
+        """
+        batches: List[List[Dict]] = []
+        by_bucket: Dict[str, List[Dict]] = {}
+        for doc in docs:
+            body = to_bucketed(doc)
+            by_bucket.setdefault(body['bucket'], []).append(body)
+        for bodies in by_bucket.values():
+            batches.extend(bodies[i:i + MAX_BATCH_OPERATIONS] for i in range(0, len(bodies), MAX_BATCH_OPERATIONS))
+        if not batches:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(batches)))) as pool:
+            return [item_id for failed in pool.map(self._write_batch, batches) for item_id in failed]
+
+    def verify(self, repair: bool = True) -> Dict:
+        """
+        Compare source and target versions and, with repair, recopy the
+        documents that are missing from the target or differ from the source
+
+        A copy whose source_ts does not match the source _ts (copies written
+        by the dual-write layer in migrated mode carry none) is compared by
+        content. When the content matches, repair stamps the copy's
+        source_ts, so later runs skip it without reading it again.
+
+        Returns:
+            {'checked': int, 'missing': [ids], 'stale': [ids], 'repaired': int, 'stamped': int}
+        """
+        copied = {row['id']: row for row in self.target.query_items(
+            query=TARGET_VERSIONS_QUERY, enable_cross_partition_query=True)}
+        missing: List[str] = []
+        unmatched: Dict[str, int] = {}
+        checked = 0
+        for row in self.source.query_items(query=SOURCE_VERSIONS_QUERY, enable_cross_partition_query=True):
+            checked += 1
+            if row['id'] not in copied:
+                missing.append(row['id'])
+            elif copied[row['id']].get('source_ts') != row['_ts']:
+                unmatched[row['id']] = row['_ts']
+
+        sources = {item_id: self._read_source(item_id) for item_id in missing + list(unmatched)}
+        stale: List[str] = []
+        same: List[str] = []
+        for item_id in unmatched:
+            source = sources[item_id]
+            if source is None:
+                continue
+            target = self._read_target(item_id, copied[item_id]['bucket'])
+            (same if target is not None and to_legacy(target) == to_legacy(source) else stale).append(item_id)
+
+        repaired = 0
+        stamped = 0
+        if repair:
+            docs = [sources[item_id] for item_id in missing + stale if sources[item_id] is not None]
+            if docs:
+                repaired = len(docs) - len(self.write(docs))
+            stamped = sum(self._stamp(item_id, copied[item_id]['bucket'], sources[item_id]['_ts'])
+                          for item_id in same)
+
+        return {'checked': checked, 'missing': missing, 'stale': stale, 'repaired': repaired, 'stamped': stamped}
+
+    def _write_batch(self, bodies: List[Dict]) -> List[str]:
+        try:
+            self.target.execute_item_batch(batch_operations=[('upsert', (body,)) for body in bodies],
+                                           partition_key=bodies[0]['bucket'])
+            return []
+        except Exception as e:
+            # One bad document fails the whole batch; retry them one by one
+            logging.warning(f'Batch of {len(bodies)} in {bodies[0]["bucket"]} failed, writing individually: {str(e)}')
+        failed = []
+        for body in bodies:
+            try:
+                self.target.upsert_item(body=body)
+            except Exception as e:
+                logging.error(f'Could not migrate {body["id"]}: {str(e)}')
+                failed.append(body['id'])
+        return failed
+
+    def _read_source(self, item_id: str) -> Optional[Dict]:
+        try:
+            return self.source.read_item(item=item_id, partition_key=item_id)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def _read_target(self, item_id: str, bucket: str) -> Optional[Dict]:
+        try:
+            return self.target.read_item(item=item_id, partition_key=bucket)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def _stamp(self, item_id: str, bucket: str, source_ts: int) -> bool:
+        try:
+            self.target.patch_item(item=item_id, partition_key=bucket, patch_operations=[
+                {'op': 'set', 'path': '/source_ts', 'value': source_ts},
+            ])
+            return True
+        except Exception as e:
+            logging.warning(f'Could not stamp source_ts on {item_id}: {str(e)}')
+            return False
+
+    def _save(self, checkpoint: Dict) -> None:
+        checkpoint['updated_at'] = datetime.utcnow().isoformat()
+        self.checkpoints.upsert_item(body=checkpoint)
+
+
+def for_container(name: str, **kwargs) -> PartitionMigration:
+    """Migration of a legacy container into its bucketed counterpart, checkpointed in Counter"""
+    if name not in BUCKETED_CONTAINERS:
+        raise ValueError(f'{name} has no bucketed counterpart; expected one of {", ".join(BUCKETED_CONTAINERS)}')
+    return PartitionMigration(get_container(name), get_container(BUCKETED_CONTAINERS[name]),
+                              get_container("Counter"), **kwargs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('copy', 'verify', 'status'))
+    parser.add_argument('--container', required=True, choices=sorted(BUCKETED_CONTAINERS))
+    parser.add_argument('--max-seconds', type=float, default=600, help='copy: stop after the page crossing this budget')
+    parser.add_argument('--page-size', type=int, default=1000, help='source documents per page')
+    parser.add_argument('--restart', action='store_true', help='copy: discard the checkpoint and start over')
+    parser.add_argument('--no-repair', action='store_true', help='verify: report differences only')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    migration = for_container(args.container, page_size=args.page_size)
+    if args.command == 'copy':
+        result = migration.copy(max_seconds=args.max_seconds, restart=args.restart)
+    elif args.command == 'verify':
+        result = migration.verify(repair=not args.no_repair)
+    else:
+        result = migration.load_checkpoint()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Time-Bucketed Partitioning
+ResumeDownloads and ContactMessages are partitioned on /id, so every
+time-range query fans out to all partitions. Their *ByMonth counterparts are
+partitioned on /bucket (the document's month); this module routes reads and
+writes between the two layouts while partition_migration.py copies the data
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Dict, Iterable, List, Union
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+import cosmos_pool
+
+BUCKET_FORMAT = '%Y-%m'
+
+# Containers that have a time-bucketed counterpart
+BUCKETED_CONTAINERS = {
+    "ResumeDownloads": "ResumeDownloadsByMonth",
+    "ContactMessages": "ContactMessagesByMonth",
+}
+
+# legacy:   /id containers only (the default until the new ones exist)
+# dual:     write both, read the legacy containers (run the migration now)
+# migrated: write both, read the bucketed containers, legacy kept for rollback
+# bucketed: bucketed containers only
+MODES = ('legacy', 'dual', 'migrated', 'bucketed')
+
+# Cosmos system properties that must not be copied between containers
+SYSTEM_PROPERTIES = ('_rid', '_self', '_etag', '_attachments', '_ts')
+
+BUCKET_LOOKUP_QUERY = "SELECT VALUE c.bucket FROM c WHERE c.id = @id"
+
+_containers: Dict[str, 'BucketedContainer'] = {}
+_containers_lock = threading.Lock()
+
+
+def bucket_for(timestamp: Union[str, datetime]) -> str:
+    """The partition bucket ('yyyy-MM') of an ISO timestamp or datetime"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return timestamp.strftime(BUCKET_FORMAT)
+
+
+def buckets_between(start: datetime, end: datetime) -> List[str]:
+    """Every bucket from start's month to end's month, newest first"""
+    buckets = []
+    month = end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month >= start.replace(day=1, hour=0, minute=0, second=0, microsecond=0):
+        buckets.append(month.strftime(BUCKET_FORMAT))
+        month = (month - timedelta(days=1)).replace(day=1)
+    return buckets
+
+
+def to_bucketed(doc: Dict) -> Dict:
+    """
+    Copy of a legacy document for the bucketed container
+
+    `source_ts` keeps the legacy _ts so the migration's verify pass can spot
+    copies that an update overtook. Documents without a timestamp are
+    bucketed by their last write.
+    """
+    body = {key: value for key, value in doc.items() if key not in SYSTEM_PROPERTIES}
+    body['bucket'] = bucket_for(doc.get('timestamp') or datetime.utcfromtimestamp(doc['_ts']))
+    if '_ts' in doc:
+        body['source_ts'] = doc['_ts']
+    return body
+
+
+def to_legacy(doc: Dict) -> Dict:
+    return {key: value for key, value in doc.items()
+            if key not in SYSTEM_PROPERTIES and key not in ('bucket', 'source_ts')}
+
+
+def get_mode() -> str:
+    mode = os.environ.get("PARTITION_MIGRATION_MODE", "legacy").lower()
+    if mode not in MODES:
+        raise RuntimeError(f'PARTITION_MIGRATION_MODE must be one of {", ".join(MODES)}')
+    return mode
+
+
+class BucketedContainer:
+    """
+    ContainerProxy stand-in that serves one logical container from its
+    /id-partitioned (legacy) and /bucket-partitioned versions.
+
+    Callers keep using the legacy calling convention: point operations pass
+    partition_key=id, which is ignored here and replaced by the document's
+    bucket when the bucketed container is addressed. Buckets are learned
+    from writes and reads; an unknown one costs a single-id lookup query.
+
+    Writes go to the primary container (legacy in dual mode, bucketed after
+    that) and are then mirrored to the other one. A failed mirror write is
+    logged, not raised: in dual mode the migration's verify pass repairs it.
+    Point reads in migrated mode fall back to legacy for documents the
+    migration has not copied yet.
+    """
+
+    # Remembered id -> bucket pairs
+    BUCKET_CACHE_SIZE = 10000
+
+    def __init__(self, legacy: ContainerProxy, bucketed: ContainerProxy, mode: str):
+        if mode not in MODES:
+            raise ValueError(f'Unknown partition migration mode: {mode}')
+        self.legacy = legacy
+        self.bucketed = bucketed
+        self.mode = mode
+        self._buckets: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def reads_bucketed(self) -> bool:
+        return self.mode in ('migrated', 'bucketed')
+
+    @property
+    def writes_legacy(self) -> bool:
+        return self.mode in ('legacy', 'dual', 'migrated')
+
+    @property
+    def writes_bucketed(self) -> bool:
+        return self.mode != 'legacy'
+
+    @property
+    def reader(self) -> ContainerProxy:
+        return self.bucketed if self.reads_bucketed else self.legacy
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def create_item(self, body: Dict, **kwargs) -> Dict:
+        return self._write('create_item', body, kwargs)
+
+    def upsert_item(self, body: Dict, **kwargs) -> Dict:
+        return self._write('upsert_item', body, kwargs)
+
+    def patch_item(self, item: Union[str, Dict], partition_key=None, patch_operations=None, **kwargs) -> Dict:
+        item_id = item['id'] if isinstance(item, dict) else item
+        if self.reads_bucketed:
+            try:
+                patched = self.bucketed.patch_item(item=item_id, partition_key=self._bucket_of(item_id),
+                                                   patch_operations=patch_operations, **kwargs)
+                if self.writes_legacy:
+                    self._mirror(self.legacy, to_legacy(patched))
+                return patched
+            except CosmosResourceNotFoundError:
+                if self.mode == 'bucketed':
+                    raise
+        patched = self.legacy.patch_item(item=item_id, partition_key=item_id,
+                                         patch_operations=patch_operations, **kwargs)
+        if self.writes_bucketed:
+            self._mirror(self.bucketed, to_bucketed(patched))
+        return patched
+
+    def _write(self, method: str, body: Dict, kwargs: Dict) -> Dict:
+        if self.reads_bucketed:
+            stored = getattr(self.bucketed, method)(body=to_bucketed(body), **kwargs)
+            self._remember(stored['id'], stored['bucket'])
+            if self.writes_legacy:
+                self._mirror(self.legacy, to_legacy(stored))
+            return stored
+
+        stored = getattr(self.legacy, method)(body=body, **kwargs)
+        if self.writes_bucketed:
+            self._mirror(self.bucketed, to_bucketed(stored))
+        return stored
+
+    def _mirror(self, container: ContainerProxy, body: Dict) -> None:
+        try:
+            stored = container.upsert_item(body=body)
+            if 'bucket' in stored:
+                self._remember(stored['id'], stored['bucket'])
+        except Exception as e:
+            logging.warning(f'Mirrored write of {body["id"]} to {container.id} failed: {str(e)}')
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def read_item(self, item: Union[str, Dict], partition_key=None, **kwargs) -> Dict:
+        item_id = item['id'] if isinstance(item, dict) else item
+        if self.reads_bucketed:
+            try:
+                doc = self.bucketed.read_item(item=item_id, partition_key=self._bucket_of(item_id), **kwargs)
+                return {key: value for key, value in doc.items() if key not in ('bucket', 'source_ts')}
+            except CosmosResourceNotFoundError:
+                if self.mode == 'bucketed':
+                    raise
+        return self.legacy.read_item(item=item_id, partition_key=item_id, **kwargs)
+
+    def query_items(self, query: str, **kwargs):
+        """Runs against the container currently serving reads"""
+        return self.reader.query_items(query=query, **kwargs)
+
+    def query_buckets(self, query: str, buckets: Iterable[str], **kwargs) -> Iterable:
+        """
+        Run query in each bucket in turn (single-partition queries), or once
+        across partitions while reads are still served by legacy
+        """
+        kwargs.pop('enable_cross_partition_query', None)
+        if not self.reads_bucketed:
+            return self.legacy.query_items(query=query, enable_cross_partition_query=True, **kwargs)
+        return chain.from_iterable(self.bucketed.query_items(query=query, partition_key=bucket, **kwargs)
+                                   for bucket in buckets)
+
+    def _bucket_of(self, item_id: str) -> str:
+        with self._lock:
+            bucket = self._buckets.get(item_id)
+            if bucket is not None:
+                self._buckets.move_to_end(item_id)
+                return bucket
+        results = list(self.bucketed.query_items(
+            query=BUCKET_LOOKUP_QUERY,
+            parameters=[{'name': '@id', 'value': item_id}],
+            enable_cross_partition_query=True
+        ))
+        if not results:
+            raise CosmosResourceNotFoundError(status_code=404, message=f'{item_id} not found in {self.bucketed.id}')
+        self._remember(item_id, results[0])
+        return results[0]
+
+    def _remember(self, item_id: str, bucket: str) -> None:
+        with self._lock:
+            self._buckets[item_id] = bucket
+            self._buckets.move_to_end(item_id)
+            while len(self._buckets) > self.BUCKET_CACHE_SIZE:
+                self._buckets.popitem(last=False)
+
+    @property
+    def id(self) -> str:
+        return self.legacy.id
+
+
+def reads_bucketed(container) -> bool:
+    """Whether queries on container are served by the /bucket-partitioned layout"""
+    return isinstance(container, BucketedContainer) and container.reads_bucketed
+
+
+def query_buckets(container, query: str, buckets: Iterable[str], **kwargs) -> Iterable:
+    """query_buckets for any container; a plain ContainerProxy runs a cross-partition query"""
+    if isinstance(container, BucketedContainer):
+        return container.query_buckets(query, buckets, **kwargs)
+    kwargs.pop('enable_cross_partition_query', None)
+    return container.query_items(query=query, enable_cross_partition_query=True, **kwargs)
+
+
+def get_container(name: str):
+    """
+    Container client for name, routed through a BucketedContainer when the
+    container has a bucketed counterpart and the migration mode is not legacy
+
+    Setting:
+        PARTITION_MIGRATION_MODE: legacy (default), dual, migrated or bucketed
+    """
+    bucketed_name = BUCKETED_CONTAINERS.get(name)
+    mode = get_mode() if bucketed_name else 'legacy'
+    if mode == 'legacy':
+        return cosmos_pool.get_container(name)
+
+    # Rebuilt when the pool reconnects, so the proxies are never stale
+    legacy, bucketed = cosmos_pool.get_container(name), cosmos_pool.get_container(bucketed_name)
+    container = _containers.get(name)
+    if container is None or container.mode != mode or container.legacy is not legacy or container.bucketed is not bucketed:
+        with _containers_lock:
+            container = _containers.get(name)
+            if (container is None or container.mode != mode or container.legacy is not legacy
+                    or container.bucketed is not bucketed):
+                previous = container
+                container = BucketedContainer(legacy, bucketed, mode)
+                if previous is not None:
+                    container._buckets = previous._buckets
+                _containers[name] = container
+    return container
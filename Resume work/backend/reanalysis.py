@@ -0,0 +1,190 @@
+"""
+Versioned Re-analysis
+Background job that re-scores contact messages whose analysis_version is
+not SentimentAnalyzer.version(), in checkpointed, RU-paced batches
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from message_analysis import write_analyses
+from sentiment_analyzer import SentimentAnalyzer
+
+# Missing analyses count as stale too. Versions are compared for equality,
+# not order, so '1.10' vs '1.9' string ordering never matters.
+STALE_FILTER = ("(NOT IS_DEFINED(c.analysis.analysis_version) "
+                "OR c.analysis.analysis_version != @version)")
+
+STALE_BATCH_QUERY = (f"SELECT TOP @limit c.id, c.subject, c.message, c.analysis FROM c "
+                     f"WHERE c.id > @after AND {STALE_FILTER} ORDER BY c.id")
+
+STALE_COUNT_QUERY = f"SELECT VALUE COUNT(1) FROM c WHERE {STALE_FILTER}"
+
+
+class RequestChargeMeter:
+    """response_hook that totals the RU charge reported by each Cosmos call"""
+
+    def __init__(self):
+        self.total = 0.0
+        self._taken = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, headers: Dict[str, str], result=None) -> None:
+        try:
+            charge = float(headers.get('x-ms-request-charge', 0))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self.total += charge
+
+    def take(self) -> float:
+        """Charge recorded since the previous take()"""
+        with self._lock:
+            charge, self._taken = self.total - self._taken, self.total
+            return charge
+
+
+class ReanalysisJob:
+    """
+    Walks the stale messages in id order, one batch at a time.
+
+    After every batch the checkpoint document (in `checkpoints`, partitioned
+    on /id) records the last id written, so a crashed or timed-out run
+    resumes from there. Writes run with bounded concurrency, and when
+    `ru_per_second` is set the job sleeps between batches to keep its
+    average consumption under that rate.
+
+    When a pass reaches the end while stale messages remain (failed writes,
+    or messages that arrived behind the cursor), the next run starts a new
+    pass from the beginning; the stale filter keeps it cheap.
+    """
+
+    def __init__(self, messages: ContainerProxy, checkpoints: ContainerProxy,
+                 version: Optional[str] = None, batch_size: int = 100,
+                 max_workers: int = 8, ru_per_second: Optional[float] = None):
+        self.messages = messages
+        self.checkpoints = checkpoints
+        self.version = version or SentimentAnalyzer.version()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.ru_per_second = ru_per_second
+
+    @property
+    def checkpoint_id(self) -> str:
+        return f'reanalysis-checkpoint-{self.version}'
+
+    def load_checkpoint(self) -> Dict:
+        try:
+            return self.checkpoints.read_item(item=self.checkpoint_id, partition_key=self.checkpoint_id)
+        except CosmosResourceNotFoundError:
+            return {
+                'id': self.checkpoint_id,
+                'version': self.version,
+                'pass': 1,
+                'after': '',
+                'processed': 0,
+                'failed': 0,
+                'request_charge': 0.0,
+                'started_at': datetime.utcnow().isoformat(),
+                'updated_at': None,
+                'completed_at': None
+            }
+
+    def remaining(self) -> int:
+        """Number of messages still scored with another version (or not at all)"""
+        results = list(self.messages.query_items(
+            query=STALE_COUNT_QUERY,
+            parameters=[{'name': '@version', 'value': self.version}],
+            enable_cross_partition_query=True
+        ))
+        return results[0] if results else 0
+
+    def progress(self) -> Dict:
+        """The checkpoint plus the current stale count"""
+        checkpoint = self.load_checkpoint()
+        return {
+            'version': self.version,
+            'pass': checkpoint['pass'],
+            'processed': checkpoint['processed'],
+            'failed': checkpoint['failed'],
+            'request_charge': round(checkpoint['request_charge'], 2),
+            'started_at': checkpoint['started_at'],
+            'updated_at': checkpoint['updated_at'],
+            'completed_at': checkpoint['completed_at'],
+            'remaining': self.remaining()
+        }
+
+    def run(self, max_seconds: float = 240.0) -> Dict:
+        """
+        Process batches until nothing stale is left or the time budget is spent
+
+        Returns:
+            progress() after the run
+        """
+        started = time.monotonic()
+        meter = RequestChargeMeter()
+        checkpoint = self.load_checkpoint()
+
+        if checkpoint['completed_at']:
+            if self.remaining() == 0:
+                return self.progress()
+            checkpoint.update({'pass': checkpoint['pass'] + 1, 'after': '', 'completed_at': None})
+
+        while time.monotonic() - started < max_seconds:
+            charge_before = meter.total
+            batch_started = time.monotonic()
+
+            batch = self._next_batch(checkpoint['after'], meter)
+            if not batch:
+                checkpoint['completed_at'] = datetime.utcnow().isoformat()
+                self._save(checkpoint, meter)
+                break
+
+            analyses = SentimentAnalyzer.analyze_many(
+                [(m.get('subject', ''), m.get('message', '')) for m in batch]
+            )
+            failed = write_analyses(self.messages, [(m['id'], a) for m, a in zip(batch, analyses)],
+                                    previous={m['id']: m.get('analysis') for m in batch},
+                                    max_workers=self.max_workers, response_hook=meter)
+
+            checkpoint['after'] = batch[-1]['id']
+            checkpoint['processed'] += len(batch) - len(failed)
+            checkpoint['failed'] += len(failed)
+            self._save(checkpoint, meter)
+            logging.info(f'Re-analysis pass {checkpoint["pass"]} reached {checkpoint["after"]}: '
+                         f'{checkpoint["processed"]} processed, {checkpoint["failed"]} failed')
+
+            self._pace(meter.total - charge_before, time.monotonic() - batch_started,
+                       max_seconds - (time.monotonic() - started))
+
+        return self.progress()
+
+    def _next_batch(self, after: str, meter: RequestChargeMeter) -> List[Dict]:
+        return list(self.messages.query_items(
+            query=STALE_BATCH_QUERY,
+            parameters=[
+                {'name': '@limit', 'value': self.batch_size},
+                {'name': '@after', 'value': after},
+                {'name': '@version', 'value': self.version},
+            ],
+            enable_cross_partition_query=True,
+            response_hook=meter
+        ))
+
+    def _save(self, checkpoint: Dict, meter: RequestChargeMeter) -> None:
+        checkpoint['request_charge'] += meter.take()
+        checkpoint['updated_at'] = datetime.utcnow().isoformat()
+        self.checkpoints.upsert_item(body=checkpoint)
+
+    def _pace(self, charge: float, elapsed: float, time_left: float) -> None:
+        """Sleep long enough that this batch averages at most ru_per_second"""
+        if not self.ru_per_second or charge <= 0:
+            return
+        delay = charge / self.ru_per_second - elapsed
+        if delay > 0:
+            time.sleep(min(delay, max(time_left, 0)))
@@ -0,0 +1,272 @@
+"""
+Response Cache
+In-process TTL cache of serialized HTTP responses for the read-only
+endpoints, with content-derived ETags, If-None-Match -> 304 and per-route
+Cache-Control, applied with the cached_response decorator
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import azure.functions as func
+
+# Headers never copied into a cached entry; they are set per response
+PER_RESPONSE_HEADERS = ('etag', 'cache-control', 'x-cache')
+
+_cache: Optional['ResponseCache'] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class CachedBody:
+    """A serialized 200 response and its strong validator"""
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    stored_at: float = 0.0
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag: a quoted hash of the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match evaluation (weak comparison, as RFC 9110 requires for it):
+    '*' or any listed tag equal to etag once a W/ prefix is dropped
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    LRU of CachedBody keyed by route and query parameters.
+
+    Concurrent misses on the same key are collapsed: one request builds the
+    response and the others wait for it instead of repeating the work.
+    Each route has a generation that invalidate() bumps; a response built
+    while its route was invalidated is returned but not stored, since it
+    may predate the write that invalidated it.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: "OrderedDict[Tuple, CachedBody]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._async_key_locks: Dict[Tuple, asyncio.Lock] = {}
+
+    def get(self, key: Tuple, ttl: float) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.age() >= ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, route: str) -> int:
+        """Current generation of route; pass it to put() for a response built from now on"""
+        with self._lock:
+            return self._generations.get(route, 0)
+
+    def put(self, key: Tuple, entry: CachedBody, generation: Optional[int] = None) -> None:
+        """Store entry, unless its route was invalidated since `generation` was read"""
+        with self._lock:
+            if generation is not None and self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def key_lock(self, key: Tuple) -> threading.Lock:
+        with self._lock:
+            return self._lock_for(self._key_locks, key, threading.Lock)
+
+    def async_key_lock(self, key: Tuple) -> asyncio.Lock:
+        """key_lock for async handlers, which must not block the event loop while waiting"""
+        with self._lock:
+            return self._lock_for(self._async_key_locks, key, asyncio.Lock)
+
+    def _lock_for(self, locks: Dict, key: Tuple, factory: Callable):
+        lock = locks.get(key)
+        if lock is None:
+            if len(locks) > self.max_entries * 4:
+                for stale in [k for k, v in locks.items() if not v.locked()]:
+                    del locks[stale]
+            lock = locks[key] = factory()
+        return lock
+
+    def invalidate(self, route: str) -> None:
+        """Drop every cached response of route (this worker only), including ones being built"""
+        with self._lock:
+            self._generations[route] = self._generations.get(route, 0) + 1
+            for key in [key for key in self._entries if key[0] == route]:
+                del self._entries[key]
+
+    def record(self, outcome: str) -> None:
+        """Count a 'hits', 'misses' or 'not_modified' outcome"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'not_modified': self.not_modified}
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """
+    Process-wide response cache configured from app settings, or None when disabled
+
+    Settings:
+        RESPONSE_CACHE_ENABLED: cache responses in process (default true); ETags
+            and Cache-Control are sent either way
+        RESPONSE_CACHE_SIZE: cached responses across all routes (default 256)
+    """
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                if os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true":
+                    _cache = ResponseCache(max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "256")))
+                _cache_configured = True
+    return _cache
+
+
+def invalidate(route: str) -> None:
+    """Forget route's cached responses after a write that changes them"""
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(route)
+
+
+def cached_response(ttl: float, cache_control: str, params: Optional[Iterable[str]] = None):
+    """
+    Cache a GET route's successful responses for ttl seconds.
+
+    Place it between @app.route and the function (sync or async). Responses
+    are keyed by the function name and the query parameters (only `params`,
+    when given, so cache-busting parameters do not multiply entries). Every
+    200 carries a strong ETag over its body and the route's Cache-Control; a
+    request whose If-None-Match matches gets an empty 304. Other statuses
+    are passed through with Cache-Control: no-store and are never cached.
+    """
+    key_params = tuple(sorted(params)) if params is not None else None
+
+    def decorator(handler: Callable[[func.HttpRequest], func.HttpResponse]):
+        route = handler.__name__
+
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(req: func.HttpRequest) -> func.HttpResponse:
+                cache = get_cache()
+                if cache is None:
+                    response = await handler(req)
+                    if response.status_code != 200:
+                        return _uncacheable(response)
+                    return _respond(req, _entry_from(response), cache_control)
+
+                key = _cache_key(route, req, key_params)
+                entry = cache.get(key, ttl)
+                outcome = 'HIT'
+                if entry is None:
+                    async with cache.async_key_lock(key):
+                        entry = cache.get(key, ttl)
+                        if entry is None:
+                            outcome = 'MISS'
+                            generation = cache.generation(route)
+                            response = await handler(req)
+                            if response.status_code != 200:
+                                return _uncacheable(response)
+                            entry = _entry_from(response)
+                            cache.put(key, entry, generation)
+                cache.record('hits' if outcome == 'HIT' else 'misses')
+                return _respond(req, entry, cache_control, outcome, cache)
+
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(req: func.HttpRequest) -> func.HttpResponse:
+            cache = get_cache()
+            if cache is None:
+                response = handler(req)
+                if response.status_code != 200:
+                    return _uncacheable(response)
+                return _respond(req, _entry_from(response), cache_control)
+
+            key = _cache_key(route, req, key_params)
+            entry = cache.get(key, ttl)
+            outcome = 'HIT'
+            if entry is None:
+                with cache.key_lock(key):
+                    entry = cache.get(key, ttl)
+                    if entry is None:
+                        outcome = 'MISS'
+                        generation = cache.generation(route)
+                        response = handler(req)
+                        if response.status_code != 200:
+                            return _uncacheable(response)
+                        entry = _entry_from(response)
+                        cache.put(key, entry, generation)
+            cache.record('hits' if outcome == 'HIT' else 'misses')
+            return _respond(req, entry, cache_control, outcome, cache)
+
+        return wrapper
+
+    return decorator
+
+
+def _cache_key(route: str, req: func.HttpRequest, key_params: Optional[Tuple[str, ...]]) -> Tuple:
+    return (route, tuple(sorted(
+        (name, value) for name, value in req.params.items()
+        if key_params is None or name in key_params
+    )))
+
+
+def _entry_from(response: func.HttpResponse) -> CachedBody:
+    body = response.get_body()
+    headers = {name: value for name, value in response.headers.items()
+               if name.lower() not in PER_RESPONSE_HEADERS}
+    return CachedBody(body=body, etag=make_etag(body), headers=headers, stored_at=time.monotonic())
+
+
+def _respond(req: func.HttpRequest, entry: CachedBody, cache_control: str, outcome: str = 'MISS',
+             cache: Optional[ResponseCache] = None) -> func.HttpResponse:
+    headers = dict(entry.headers, **{'ETag': entry.etag, 'Cache-Control': cache_control, 'X-Cache': outcome})
+    if etag_matches(req.headers.get('If-None-Match'), entry.etag):
+        if cache is not None:
+            cache.record('not_modified')
+        headers.pop('Content-Type', None)
+        return func.HttpResponse(status_code=304, headers=headers)
+    return func.HttpResponse(body=entry.body, status_code=200, headers=headers)
+
+
+def _uncacheable(response: func.HttpResponse) -> func.HttpResponse:
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,229 @@
+"""
+Resume Download Statistics
+Served from the 'downloads' rollups (see rollups.py) with aggregate-query
+fallbacks, so GetResumeStats never loads every download document
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, List, Optional
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import (CosmosAccessConditionFailedError, CosmosResourceExistsError,
+                                     CosmosResourceNotFoundError)
+
+from partitioning import buckets_between, query_buckets, reads_bucketed
+from rollups import RollupStore, user_agent_family
+from visitor_counter import increment_fields
+
+METRIC = "downloads"
+
+RECENT_DOWNLOADS = 10
+RECENT_DOWNLOADS_QUERY = (f"SELECT TOP {RECENT_DOWNLOADS} c.id, c.timestamp, c.user_agent FROM c "
+                          "ORDER BY c.timestamp DESC")
+
+# Download documents whose rollup increments were applied (by the write
+# path, or by the seed once it counted them) carry rolled_up: true; the seed
+# counts only the others
+ROLLED_UP_FIELD = 'rolled_up'
+UNCOUNTED_DOWNLOADS_QUERY = (f"SELECT TOP @limit c.id, c.timestamp, c.user_agent FROM c "
+                             f"WHERE NOT IS_DEFINED(c.{ROLLED_UP_FIELD})")
+
+SEED_BATCH_SIZE = 100
+# Seconds a seed run's claim outlives its time budget (covering the batch in
+# progress); a run that dies is resumed by the first run after that
+SEED_LEASE_SLACK = 300
+
+
+def rollup_increments(timestamp: str, user_agent: Optional[str]) -> Dict[str, Dict[str, int]]:
+    """Patch increments, per rollup document, that record one download"""
+    store = RollupStore(None, METRIC)
+    return store.increments(datetime.fromisoformat(timestamp), user_agent, lifetime=True)
+
+
+def get_stats(downloads: ContainerProxy, counters: ContainerProxy, now: datetime) -> Dict:
+    """
+    Build the GetResumeStats payload
+
+    Returns:
+        {
+            'total': int,
+            'today': int,
+            'this_week': int (today plus the previous 7 days),
+            'recent_downloads': [{'id', 'timestamp', 'user_agent'}] (newest 10)
+        }
+    """
+    store = RollupStore(counters, METRIC)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = today - timedelta(days=7)
+    day_ids = [store.bucket_id('day', week_ago + timedelta(days=i)) for i in range(8)]
+
+    docs = store.read([store.lifetime_id] + day_ids)
+    lifetime = docs.get(store.lifetime_id)
+
+    # The rollups miss older downloads until seed_rollups() has backfilled them
+    if lifetime and lifetime.get('seeded'):
+        total = lifetime.get('count', 0)
+        today_count = docs.get(day_ids[-1], {}).get('count', 0)
+        week_count = sum(docs.get(day_id, {}).get('count', 0) for day_id in day_ids)
+    else:
+        total = _count(downloads)
+        today_count = _count(downloads, since=today, now=now)
+        week_count = _count(downloads, since=week_ago, now=now)
+
+    recent = _recent(downloads, now)
+
+    return {
+        'total': total,
+        'today': today_count,
+        'this_week': week_count,
+        'recent_downloads': recent
+    }
+
+
+def seed_rollups(downloads: ContainerProxy, counters: ContainerProxy, max_seconds: float = 240.0) -> bool:
+    """
+    Backfill the download rollups from downloads the write path did not
+    count (no rolled_up stamp), in batches, until none are left or the time
+    budget is spent. Run from the SeedDownloadRollups timer, never from a
+    request.
+
+    Each batch is added with incr patches, so increments the write path
+    applies meanwhile are neither overwritten nor counted twice, and its
+    downloads are then stamped rolled_up; a later run resumes with the
+    rest. A run that dies between the two counts at most that one batch
+    (SEED_BATCH_SIZE downloads) twice. A claim document leased for
+    max_seconds + SEED_LEASE_SLACK keeps runs from overlapping and expires
+    if one dies.
+
+    Returns:
+        True once the lifetime document is marked seeded
+    """
+    store = RollupStore(counters, METRIC)
+    lifetime = store.read([store.lifetime_id]).get(store.lifetime_id)
+    if lifetime and lifetime.get('seeded'):
+        return True
+
+    holder = _claim_seed(store, max_seconds + SEED_LEASE_SLACK)
+    if holder is None:
+        logging.info('Download rollups are being seeded by another run')
+        return False
+
+    started = time.monotonic()
+    seeded = 0
+    try:
+        while time.monotonic() - started < max_seconds:
+            batch = list(downloads.query_items(
+                query=UNCOUNTED_DOWNLOADS_QUERY,
+                parameters=[{'name': '@limit', 'value': SEED_BATCH_SIZE}],
+                enable_cross_partition_query=True
+            ))
+            if batch:
+                _seed_batch(downloads, store, batch)
+                seeded += len(batch)
+            if len(batch) < SEED_BATCH_SIZE:
+                _mark_seeded(store)
+                logging.info(f'Download rollups seeded ({seeded} downloads in this run)')
+                return True
+        logging.info(f'Download rollup seed paused after {seeded} downloads; the next run resumes it')
+        return False
+    finally:
+        _release_seed(store, holder)
+
+
+def _seed_batch(downloads: ContainerProxy, store: RollupStore, batch: List[Dict]) -> None:
+    """Add one batch of downloads to the rollups, then stamp them as counted"""
+    buckets: Dict[str, Dict[str, int]] = {}
+    for download in batch:
+        moment = datetime.fromisoformat(download['timestamp'])
+        for doc_id, fields in store.increments(moment, download.get('user_agent'), lifetime=True).items():
+            merged = buckets.setdefault(doc_id, {})
+            for path, amount in fields.items():
+                merged[path] = merged.get(path, 0) + amount
+
+    stamp = [{'op': 'set', 'path': f'/{ROLLED_UP_FIELD}', 'value': True}]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda item: increment_fields(store.container, *item), buckets.items()))
+        list(pool.map(lambda download: downloads.patch_item(item=download['id'], partition_key=download['id'],
+                                                            patch_operations=stamp), batch))
+
+
+def _seed_claim_id(store: RollupStore) -> str:
+    return f'{store.lifetime_id}-seed'
+
+
+def _claim_seed(store: RollupStore, lease_seconds: float) -> Optional[str]:
+    """Take the seed claim if it is free or its lease has expired; returns the holder token"""
+    holder = str(uuid.uuid4())
+    now = datetime.utcnow()
+    claim_id = _seed_claim_id(store)
+    lease = {'holder': holder, 'lease_until': (now + timedelta(seconds=lease_seconds)).isoformat()}
+    try:
+        store.container.create_item(body=dict(lease, id=claim_id, started_at=now.isoformat()))
+        return holder
+    except CosmosResourceExistsError:
+        pass
+    try:
+        store.container.patch_item(item=claim_id, partition_key=claim_id,
+                                   patch_operations=[{'op': 'set', 'path': f'/{field}', 'value': value}
+                                                     for field, value in lease.items()],
+                                   filter_predicate=f"FROM c WHERE c.lease_until < '{now.isoformat()}'")
+        return holder
+    except CosmosAccessConditionFailedError:
+        return None
+
+
+def _release_seed(store: RollupStore, holder: str) -> None:
+    """End the lease early so the next run can resume at once"""
+    claim_id = _seed_claim_id(store)
+    try:
+        store.container.patch_item(item=claim_id, partition_key=claim_id,
+                                   patch_operations=[{'op': 'set', 'path': '/lease_until',
+                                                      'value': datetime.utcnow().isoformat()}],
+                                   filter_predicate=f"FROM c WHERE c.holder = '{holder}'")
+    except Exception as e:
+        logging.warning(f'Could not release the download rollup seed claim; it expires by itself: {str(e)}')
+
+
+def _mark_seeded(store: RollupStore) -> None:
+    """Flag the lifetime document seeded, creating it if there are no downloads at all"""
+    operations = [{'op': 'set', 'path': '/seeded', 'value': True}]
+    try:
+        store.container.patch_item(item=store.lifetime_id, partition_key=store.lifetime_id,
+                                   patch_operations=operations)
+    except CosmosResourceNotFoundError:
+        try:
+            store.container.create_item(body={'id': store.lifetime_id, 'count': 0, 'seeded': True})
+        except CosmosResourceExistsError:
+            store.container.patch_item(item=store.lifetime_id, partition_key=store.lifetime_id,
+                                       patch_operations=operations)
+
+
+def _recent(downloads: ContainerProxy, now: datetime) -> List[Dict]:
+    """
+    Newest downloads. On a bucketed container this month and last month are
+    queried newest first, each within its own partition; older history is
+    only scanned if those two hold fewer than RECENT_DOWNLOADS.
+    """
+    buckets = buckets_between(now - timedelta(days=31), now)[:2]
+    recent = list(islice(query_buckets(downloads, RECENT_DOWNLOADS_QUERY, buckets), RECENT_DOWNLOADS))
+    if len(recent) < RECENT_DOWNLOADS and reads_bucketed(downloads):
+        recent = list(downloads.query_items(query=RECENT_DOWNLOADS_QUERY, enable_cross_partition_query=True))
+    return recent
+
+
+def _count(downloads: ContainerProxy, since: datetime = None, now: datetime = None) -> int:
+    if since is None:
+        results: List[int] = list(downloads.query_items(query="SELECT VALUE COUNT(1) FROM c",
+                                                        enable_cross_partition_query=True))
+        return results[0] if results else 0
+    # Summed per month partition when the container is bucketed
+    results = list(query_buckets(
+        downloads, "SELECT VALUE COUNT(1) FROM c WHERE c.timestamp >= @since",
+        buckets_between(since, now or datetime.utcnow()),
+        parameters=[{'name': '@since', 'value': since.isoformat()}]
+    ))
+    return sum(results)
@@ -0,0 +1,203 @@
+"""
+Analytics Rollups
+Hour and day bucket documents maintained incrementally on the write path,
+so analytics reads cost a few point-sized lookups regardless of history
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from azure.cosmos import ContainerProxy
+
+# Checked in order; the first match wins (Edge and Opera also claim to be Chrome)
+USER_AGENT_FAMILIES = [
+    ('Bot', re.compile(r'bot|crawl|spider|slurp|headless', re.IGNORECASE)),
+    ('Edge', re.compile(r'Edg(e|A|iOS)?/')),
+    ('Opera', re.compile(r'OPR/|Opera')),
+    ('Chrome', re.compile(r'Chrome/|CriOS/')),
+    ('Firefox', re.compile(r'Firefox/|FxiOS/')),
+    ('Safari', re.compile(r'Safari/')),
+    ('Script', re.compile(r'curl|wget|python|httpie|postman', re.IGNORECASE)),
+]
+
+HOUR_FORMAT = '%Y-%m-%dT%H'
+DAY_FORMAT = '%Y-%m-%d'
+
+# Caps on buckets a single query may touch (about two months of hours,
+# two years of days), checked before the bucket list is built
+MAX_HOUR_BUCKETS = 24 * 62
+MAX_DAY_BUCKETS = 2 * 366
+
+
+def user_agent_family(user_agent: Optional[str]) -> str:
+    """Coarse browser family used as the rollup breakdown key"""
+    if not user_agent or user_agent == 'Unknown':
+        return 'Unknown'
+    for family, pattern in USER_AGENT_FAMILIES:
+        if pattern.search(user_agent):
+            return family
+    return 'Other'
+
+
+class RollupStore:
+    """
+    Per-metric hour/day bucket documents in a container partitioned on /id.
+
+    Bucket documents look like:
+        {'id': 'rollup-downloads-day-2026-10-18', 'count': 12,
+         'user_agents': {'Chrome': 9, 'Safari': 3}}
+
+    A metric can also keep a lifetime document ('rollup-<metric>-lifetime')
+    with the all-time count, so totals never need a scan either.
+    """
+
+    def __init__(self, container: ContainerProxy, metric: str):
+        self.container = container
+        self.metric = metric
+
+    @property
+    def lifetime_id(self) -> str:
+        return f'rollup-{self.metric}-lifetime'
+
+    def bucket_id(self, granularity: str, moment: datetime) -> str:
+        fmt = HOUR_FORMAT if granularity == 'hour' else DAY_FORMAT
+        return f'rollup-{self.metric}-{granularity}-{moment.strftime(fmt)}'
+
+    def increments(self, timestamp: datetime, user_agent: Optional[str] = None,
+                   lifetime: bool = False) -> Dict[str, Dict[str, int]]:
+        """
+        Patch increments recording one event
+
+        Returns:
+            {document id: {json path: amount}}
+        """
+        family = user_agent_family(user_agent)
+        fields = {'/count': 1, f'/user_agents/{family}': 1}
+        increments = {
+            self.bucket_id('hour', timestamp): dict(fields),
+            self.bucket_id('day', timestamp): dict(fields),
+        }
+        if lifetime:
+            increments[self.lifetime_id] = {'/count': 1}
+        return increments
+
+    def read(self, ids: List[str]) -> Dict[str, Dict]:
+        """Fetch rollup documents by id in one query; missing buckets are omitted"""
+        if not ids:
+            return {}
+        docs = self.container.query_items(
+            query="SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.id)",
+            parameters=[{'name': '@ids', 'value': ids}],
+            enable_cross_partition_query=True
+        )
+        return {doc['id']: doc for doc in docs}
+
+    def lifetime_count(self) -> Optional[int]:
+        """All-time count, or None if the lifetime document does not exist"""
+        doc = self.read([self.lifetime_id]).get(self.lifetime_id)
+        return doc.get('count', 0) if doc else None
+
+    def query(self, start: datetime, end: datetime, granularity: str = 'auto') -> Dict:
+        """
+        Aggregate the rollups covering [start, end), rounded out to whole hours
+
+        Args:
+            granularity: 'hour', 'day', or 'auto' (days where whole days fit,
+                         hours for partial days at either edge)
+
+        Returns:
+            {
+                'metric', 'start', 'end', 'granularity',
+                'total': int,
+                'user_agents': {family: count},
+                'buckets': [{'bucket', 'granularity', 'count', 'user_agents'}]
+            }
+        """
+        if end <= start:
+            raise ValueError('end must be after start')
+        if granularity not in ('hour', 'day', 'auto'):
+            raise ValueError(f'Unsupported granularity: {granularity}')
+
+        hours, days = self._bucket_counts(start, end, granularity)
+        if hours > MAX_HOUR_BUCKETS:
+            raise ValueError('Range too large for hourly buckets; use granularity=day')
+        if days > MAX_DAY_BUCKETS:
+            raise ValueError(f'Range too large; at most {MAX_DAY_BUCKETS} days per query')
+
+        plan = self._plan(start, end, granularity)
+
+        docs = self.read([self.bucket_id(g, moment) for g, moment in plan])
+
+        buckets = []
+        total = 0
+        user_agents: Dict[str, int] = {}
+        for bucket_granularity, moment in plan:
+            doc = docs.get(self.bucket_id(bucket_granularity, moment), {})
+            count = doc.get('count', 0)
+            families = doc.get('user_agents', {})
+            total += count
+            for family, family_count in families.items():
+                user_agents[family] = user_agents.get(family, 0) + family_count
+            buckets.append({
+                'bucket': moment.strftime(HOUR_FORMAT if bucket_granularity == 'hour' else DAY_FORMAT),
+                'granularity': bucket_granularity,
+                'count': count,
+                'user_agents': families
+            })
+
+        return {
+            'metric': self.metric,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'granularity': granularity,
+            'total': total,
+            'user_agents': user_agents,
+            'buckets': buckets
+        }
+
+    @staticmethod
+    def _bucket_counts(start: datetime, end: datetime, granularity: str) -> Tuple[int, int]:
+        """(hour buckets, day buckets) that _plan would return, computed without building it"""
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if granularity == 'day':
+            return 0, -(-(end - day) // timedelta(days=1))
+        if granularity == 'hour':
+            return -(-(end - hour) // timedelta(hours=1)), 0
+        # auto: at most a partial day of hours at either edge
+        first_whole_day = day if hour == day else day + timedelta(days=1)
+        return 48, max(0, (end - first_whole_day) // timedelta(days=1))
+
+    @staticmethod
+    def _plan(start: datetime, end: datetime, granularity: str) -> List[tuple]:
+        """Ordered (granularity, bucket start) pairs covering the range"""
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        plan = []
+
+        if granularity == 'day':
+            while day < end:
+                plan.append(('day', day))
+                day += timedelta(days=1)
+            return plan
+
+        if granularity == 'hour':
+            while hour < end:
+                plan.append(('hour', hour))
+                hour += timedelta(hours=1)
+            return plan
+
+        # auto: leading partial day in hours, whole days, trailing partial day in hours
+        first_whole_day = day if hour == day else day + timedelta(days=1)
+        while hour < min(first_whole_day, end):
+            plan.append(('hour', hour))
+            hour += timedelta(hours=1)
+        day = first_whole_day
+        while day + timedelta(days=1) <= end:
+            plan.append(('day', day))
+            day += timedelta(days=1)
+        hour = max(hour, day)
+        while hour < end:
+            plan.append(('hour', hour))
+            hour += timedelta(hours=1)
+        return plan
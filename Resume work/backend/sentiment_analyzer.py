@@ -1,10 +1,109 @@
 """
 AI Sentiment Analysis Module
-Uses TextBlob for sentiment analysis and spam detection
+Uses TextBlob for sentiment analysis and a precompiled keyword matcher
+for spam detection and priority scoring, or the hashed-feature classifier
+(classifier.py) for spam and sentiment when its weights are deployed.
+TextBlob (and NLTK with it) is imported on first use, so endpoints that
+never analyze do not pay for it
 """
-from textblob import TextBlob
+import logging
 import re
-from typing import Dict, Tuple
+import string
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from analysis_cache import get_cache
+from classifier import get_classifier
+
+_textblob_lock = threading.Lock()
+_TextBlob = None
+
+
+def _get_textblob():
+    """The TextBlob class, imported on first call"""
+    global _TextBlob
+    if _TextBlob is None:
+        with _textblob_lock:
+            if _TextBlob is None:
+                from textblob import TextBlob
+                _TextBlob = TextBlob
+    return _TextBlob
+
+
+def warm_up() -> None:
+    """Load the configured classifier, or TextBlob and its sentiment lexicon, ahead of the first analysis"""
+    if get_classifier() is None:
+        _get_textblob()('warm up').sentiment
+
+
+def start_warm_up() -> threading.Thread:
+    """Run warm_up() on a background daemon thread"""
+    def run():
+        try:
+            warm_up()
+            logging.info('NLP warm-up complete')
+        except Exception as e:
+            logging.warning(f'NLP warm-up failed, analysis will use the keyword fallback: {str(e)}')
+
+    thread = threading.Thread(target=run, name='nlp-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+class KeywordMatcher:
+    """
+    Whole-word matcher for several keyword lists at once.
+
+    The text is normalized and split into words once. Single-word keywords
+    are found with one set intersection, and a phrase is only searched for
+    when its first word occurs, so the cost does not grow with the number
+    of keywords and "good" no longer matches inside "goodbye".
+    """
+
+    # ASCII punctuation plus common typographic marks become word separators
+    _SEPARATORS = str.maketrans({c: ' ' for c in string.punctuation.replace('_', '') + '\u2018\u2019\u201c\u201d\u2013\u2014\u2026'})
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        self._categories_by_keyword: Dict[str, List[str]] = {}
+        self._words: Set[str] = set()
+        self._phrases_by_first_word: Dict[str, List[str]] = {}
+
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                keyword = ' '.join(keyword.lower().split())
+                self._categories_by_keyword.setdefault(keyword, []).append(category)
+                if ' ' in keyword:
+                    first_word = keyword.split(' ', 1)[0]
+                    phrases = self._phrases_by_first_word.setdefault(first_word, [])
+                    if keyword not in phrases:
+                        phrases.append(keyword)
+                else:
+                    self._words.add(keyword)
+
+    def find(self, text: str) -> Set[str]:
+        """Distinct keywords present in text as whole words"""
+        words = text.lower().translate(self._SEPARATORS).split()
+        present = set(words)
+        found = present & self._words
+
+        candidates = present & self._phrases_by_first_word.keys()
+        if candidates:
+            normalized = f" {' '.join(words)} "
+            for first_word in candidates:
+                for phrase in self._phrases_by_first_word[first_word]:
+                    if f' {phrase} ' in normalized:
+                        found.add(phrase)
+        return found
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Number of distinct keywords found per category"""
+        counts = dict.fromkeys(self.categories, 0)
+        for keyword in self.find(text):
+            for category in self._categories_by_keyword[keyword]:
+                counts[category] += 1
+        return counts
+
 
 class SentimentAnalyzer:
     
@@ -36,7 +135,34 @@ class SentimentAnalyzer:
         'error', 'fail', 'failed', 'problem', 'issue', 'bug', 'wrong',
         'disappointed', 'frustrating', 'angry', 'annoyed', 'useless'
     ]
+
+    # Stamped on every result (with the classifier's version appended when
+    # one is loaded, see version()); bump it whenever scoring changes so the
+    # re-analysis job (reanalysis.py) picks up documents scored earlier.
+    # 1.1: whole-word keyword matching
+    ANALYSIS_VERSION = '1.1'
+
+    # Built once at import; analyze() scans each message a single time
+    MATCHER = KeywordMatcher({
+        'spam': SPAM_KEYWORDS,
+        'urgent': URGENT_KEYWORDS,
+        'positive': POSITIVE_WORDS,
+        'negative': NEGATIVE_WORDS
+    })
+
+    # Suspicious spam patterns
+    MULTIPLE_URLS = re.compile(r'http[s]?://.*http[s]?://')
+    REPEATED_CHARS = re.compile(r'(.)\1{4,}')
+    DOLLAR_SIGNS = re.compile(r'\$\$+')
     
+    @staticmethod
+    def version() -> str:
+        """Version stamped on results: ANALYSIS_VERSION, plus the classifier's when one is loaded"""
+        classifier = get_classifier()
+        if classifier is None:
+            return SentimentAnalyzer.ANALYSIS_VERSION
+        return f'{SentimentAnalyzer.ANALYSIS_VERSION}+nb.{classifier.version}'
+
     @staticmethod
     def analyze(subject: str, message: str) -> Dict:
         """
@@ -56,52 +182,98 @@ class SentimentAnalyzer:
                 'priority_score': int (1-10)
             }
         """
-        combined_text = f"{subject} {message}".lower()
-        
-        # 1. Spam Detection
-        spam_score, is_spam = SentimentAnalyzer._detect_spam(combined_text)
-        
-        # 2. Sentiment Analysis
-        sentiment, sentiment_score = SentimentAnalyzer._analyze_sentiment(combined_text)
-        
-        # 3. Priority Scoring
-        priority, priority_score = SentimentAnalyzer._calculate_priority(
-            combined_text, sentiment_score, is_spam
-        )
-        
-        return {
-            'is_spam': is_spam,
-            'spam_score': round(spam_score, 3),
-            'sentiment': sentiment,
-            'sentiment_score': round(sentiment_score, 3),
-            'priority': priority,
-            'priority_score': priority_score,
-            'analysis_version': '1.0'
-        }
+        return SentimentAnalyzer.analyze_many([(subject, message)])[0]
+
+    @staticmethod
+    def analyze_many(messages: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Analyze a batch of (subject, message) pairs.
+
+        Each stage runs over the whole batch before the next one starts,
+        and identical texts (resent forms, spam bursts) are scored once.
+        Results already in the analysis cache (see analysis_cache.py) are
+        reused without scoring. With a classifier loaded, spam and
+        sentiment for the whole batch come from one call to it; if it
+        fails, the batch falls back to the heuristics and is stamped (and
+        cached) with the plain ANALYSIS_VERSION, so re-analysis re-scores it.
+
+        Returns:
+            One analyze() result per input pair, in the same order
+        """
+        texts = [f"{subject} {message}".lower() for subject, message in messages]
+        version = SentimentAnalyzer.version()
+
+        results = {}
+        cache = get_cache()
+        if cache is not None:
+            for text in dict.fromkeys(texts):
+                cached = cache.get(text, version)
+                if cached is not None:
+                    results[text] = cached
+        unique = [text for text in dict.fromkeys(texts) if text not in results]
+
+        hits = [SentimentAnalyzer.MATCHER.count(text) for text in unique]
+        spam, sentiments, scored_version = SentimentAnalyzer._classify(unique, hits, version)
+        priorities = [
+            SentimentAnalyzer._calculate_priority(text, sentiment_score, is_spam, h)
+            for text, h, (_, is_spam), (_, sentiment_score) in zip(unique, hits, spam, sentiments)
+        ]
+
+        for text, (spam_score, is_spam), (sentiment, sentiment_score), (priority, priority_score) \
+                in zip(unique, spam, sentiments, priorities):
+            results[text] = {
+                'is_spam': is_spam,
+                'spam_score': round(spam_score, 3),
+                'sentiment': sentiment,
+                'sentiment_score': round(sentiment_score, 3),
+                'priority': priority,
+                'priority_score': priority_score,
+                'analysis_version': scored_version
+            }
+            if cache is not None:
+                cache.put(text, scored_version, results[text])
+        return [dict(results[text]) for text in texts]
     
     @staticmethod
-    def _detect_spam(text: str) -> Tuple[float, bool]:
+    def _classify(texts: List[str], hits: List[Dict[str, int]], version: str) \
+            -> Tuple[List[Tuple[float, bool]], List[Tuple[str, float]], str]:
+        """
+        Spam and sentiment results for texts, and the version they were
+        scored under: the classifier's (`version`), or the heuristics'
+        (ANALYSIS_VERSION) when there is no classifier or it failed
+        """
+        classifier = get_classifier()
+        if classifier is not None:
+            try:
+                spam, sentiments = classifier.score_many(texts)
+                return spam, sentiments, version
+            except Exception as e:
+                logging.warning(f'Classifier failed, using the keyword heuristics: {str(e)}')
+        return ([SentimentAnalyzer._detect_spam(text, h) for text, h in zip(texts, hits)],
+                [SentimentAnalyzer._analyze_sentiment(text, h) for text, h in zip(texts, hits)],
+                SentimentAnalyzer.ANALYSIS_VERSION)
+
+    @staticmethod
+    def _detect_spam(text: str, hits: Optional[Dict[str, int]] = None) -> Tuple[float, bool]:
         """
         Detect spam based on keywords and patterns
         
         Returns:
             (spam_score, is_spam) - score from 0-1, boolean classification
         """
-        spam_count = 0
+        hits = hits or SentimentAnalyzer.MATCHER.count(text)
         
         # Check for spam keywords
-        for keyword in SentimentAnalyzer.SPAM_KEYWORDS:
-            if keyword in text:
-                spam_count += 1
+        spam_count = hits['spam']
         
         # Check for suspicious patterns
-        if re.search(r'http[s]?://.*http[s]?://', text):  # Multiple URLs
+        if SentimentAnalyzer.MULTIPLE_URLS.search(text):  # Multiple URLs
             spam_count += 2
-        if re.search(r'(.)\1{4,}', text):  # Repeated characters (!!!!!!)
+        if SentimentAnalyzer.REPEATED_CHARS.search(text):  # Repeated characters (!!!!!!)
             spam_count += 1
         if len(text) > 50 and text.isupper():  # ALL CAPS long message
             spam_count += 1
-        if re.search(r'\$\$+', text):  # Multiple dollar signs
+        if SentimentAnalyzer.DOLLAR_SIGNS.search(text):  # Multiple dollar signs
             spam_count += 1
         
         # Calculate spam score (0-1)
@@ -111,7 +283,7 @@ class SentimentAnalyzer:
         return spam_score, is_spam
     
     @staticmethod
-    def _analyze_sentiment(text: str) -> Tuple[str, float]:
+    def _analyze_sentiment(text: str, hits: Optional[Dict[str, int]] = None) -> Tuple[str, float]:
         """
         Analyze sentiment using TextBlob NLP with keyword fallback.
         TextBlob polarity works without corpora for basic detection,
@@ -121,11 +293,11 @@ class SentimentAnalyzer:
             (sentiment_label, polarity_score)
         """
         try:
-            blob = TextBlob(text)
+            blob = _get_textblob()(text)
             polarity = blob.sentiment.polarity  # -1 (negative) to 1 (positive)
         except Exception:
             # Fallback: keyword-based sentiment scoring
-            polarity = SentimentAnalyzer._keyword_sentiment(text)
+            polarity = SentimentAnalyzer._keyword_sentiment(text, hits)
 
         # Classify sentiment
         if polarity > 0.1:
@@ -138,20 +310,22 @@ class SentimentAnalyzer:
         return sentiment, polarity
 
     @staticmethod
-    def _keyword_sentiment(text: str) -> float:
+    def _keyword_sentiment(text: str, hits: Optional[Dict[str, int]] = None) -> float:
         """
         Fallback sentiment scoring using keyword matching.
         Returns polarity from -1 to 1.
         """
-        pos_count = sum(1 for w in SentimentAnalyzer.POSITIVE_WORDS if w in text)
-        neg_count = sum(1 for w in SentimentAnalyzer.NEGATIVE_WORDS if w in text)
+        hits = hits or SentimentAnalyzer.MATCHER.count(text)
+        pos_count = hits['positive']
+        neg_count = hits['negative']
         total = pos_count + neg_count
         if total == 0:
             return 0.0
         return round((pos_count - neg_count) / total, 3)
     
     @staticmethod
-    def _calculate_priority(text: str, sentiment_score: float, is_spam: bool) -> Tuple[str, int]:
+    def _calculate_priority(text: str, sentiment_score: float, is_spam: bool,
+                            hits: Optional[Dict[str, int]] = None) -> Tuple[str, int]:
         """
         Calculate message priority on 1-10 scale
         
@@ -164,7 +338,8 @@ class SentimentAnalyzer:
         priority_score = 5  # Default: medium
         
         # Boost for urgent keywords
-        urgency_count = sum(1 for keyword in SentimentAnalyzer.URGENT_KEYWORDS if keyword in text)
+        hits = hits or SentimentAnalyzer.MATCHER.count(text)
+        urgency_count = hits['urgent']
         priority_score += min(urgency_count * 2, 3)
         
         # Boost for negative sentiment (might be complaint/issue)
@@ -0,0 +1,559 @@
+"""
+Telemetry
+Timed spans around HTTP routes and outbound Cosmos, GitHub and Resend calls,
+exported as per-endpoint histograms (in memory by default, or through
+OpenTelemetry), plus sampled, lazily formatted payload logging
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional: pip install azure-monitor-opentelemetry
+    otel_metrics = None
+    otel_trace = None
+
+# Explicit bucket boundaries, as OpenTelemetry histograms use
+DURATION_BOUNDARIES_MS = (1, 2.5, 5, 10, 25, 50, 75, 100, 250, 500, 750, 1000, 2500, 5000, 10000)
+CHARGE_BOUNDARIES_RU = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Metric names follow the OpenTelemetry semantic conventions where one exists
+METRICS = {
+    'http.server.duration': ('ms', DURATION_BOUNDARIES_MS),
+    'http.server.request_charge': ('RU', CHARGE_BOUNDARIES_RU),
+    'db.client.operation.duration': ('ms', DURATION_BOUNDARIES_MS),
+    'db.cosmosdb.request_charge': ('RU', CHARGE_BOUNDARIES_RU),
+    'db.cosmosdb.retries': ('{retry}', (0, 1, 2, 5, 10)),
+    'http.client.duration': ('ms', DURATION_BOUNDARIES_MS),
+}
+
+REQUEST_CHARGE_HEADER = 'x-ms-request-charge'
+RETRY_COUNT_HEADER = 'x-ms-throttle-retry-count'
+
+# The route span of the request being handled, so outbound spans can add
+# their RU and retries to it. Worker threads (ThreadPoolExecutor) start
+# without it; their calls are still measured, just not rolled up.
+_current_route: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('telemetry_route', default=None)
+
+_exporter: Optional['Exporter'] = None
+_exporter_lock = threading.Lock()
+
+
+class Histogram:
+    """Count, sum, min, max and explicit-bucket counts of recorded values"""
+
+    def __init__(self, boundaries: Sequence[float]):
+        self.boundaries = tuple(boundaries)
+        self.bucket_counts = [0] * (len(self.boundaries) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.boundaries, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of values"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.boundaries[index] if index < len(self.boundaries) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'boundaries': list(self.boundaries),
+            'bucket_counts': list(self.bucket_counts)
+        }
+
+
+class Exporter:
+    """Receives every measurement; the base class discards them (no-op exporter)"""
+
+    def record(self, metric: str, value: float, attributes: Dict[str, Any]) -> None:
+        pass
+
+    @contextmanager
+    def trace(self, name: str, attributes: Dict[str, Any]) -> Iterator[None]:
+        yield
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryExporter(Exporter):
+    """Keeps one Histogram per metric and attribute set, for GetTelemetry and tests"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, value: float, attributes: Dict[str, Any]) -> None:
+        key = (metric, tuple(sorted(attributes.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS[metric][1])
+            histogram.record(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{metric: [{'attributes': {...}, 'unit': str, **histogram}]}"""
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for (metric, attributes), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                result.setdefault(metric, []).append(
+                    {'attributes': dict(attributes), 'unit': METRICS[metric][0], **histogram.to_dict()})
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+
+
+class OpenTelemetryExporter(Exporter):
+    """Records into OpenTelemetry histograms and spans from the global providers"""
+
+    def __init__(self):
+        self._meter = otel_metrics.get_meter(__name__)
+        self._tracer = otel_trace.get_tracer(__name__)
+        self._instruments = {
+            metric: self._meter.create_histogram(metric, unit=unit)
+            for metric, (unit, _) in METRICS.items()
+        }
+
+    def record(self, metric: str, value: float, attributes: Dict[str, Any]) -> None:
+        self._instruments[metric].record(value, attributes=attributes)
+
+    @contextmanager
+    def trace(self, name: str, attributes: Dict[str, Any]) -> Iterator[None]:
+        with self._tracer.start_as_current_span(name, attributes=attributes):
+            yield
+
+
+class Span:
+    """One timed operation; outbound spans also add their RU and retries to the route span"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.request_charge = 0.0
+        self.retries = 0
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_charge(self, charge: float, retries: int = 0) -> None:
+        self.request_charge += charge
+        self.retries += retries
+        route = _current_route.get()
+        if route is not None and route is not self:
+            route.request_charge += charge
+            route.retries += retries
+
+    def cosmos_hook(self, chained: Optional[Callable] = None) -> Callable:
+        """Cosmos response_hook that adds each response's charge and retries, then calls chained"""
+        def hook(headers, result=None):
+            try:
+                self.add_charge(float(headers.get(REQUEST_CHARGE_HEADER, 0) or 0),
+                                int(headers.get(RETRY_COUNT_HEADER, 0) or 0))
+            except (TypeError, ValueError):
+                pass
+            if chained is not None:
+                chained(headers, result)
+        return hook
+
+
+def get_exporter() -> Exporter:
+    """
+    Process-wide exporter configured from app settings
+
+    Settings:
+        TELEMETRY_EXPORTER: memory (default), otel or none. otel needs the
+            opentelemetry packages and sends to Azure Monitor when
+            APPLICATIONINSIGHTS_CONNECTION_STRING is set
+    """
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _create_exporter(os.environ.get("TELEMETRY_EXPORTER", "memory").lower())
+    return _exporter
+
+
+def set_exporter(exporter: Exporter) -> None:
+    """Replace the exporter (benchmarks and scripted runs)"""
+    global _exporter
+    with _exporter_lock:
+        _exporter = exporter
+
+
+def _create_exporter(kind: str) -> Exporter:
+    if kind == 'none':
+        return Exporter()
+    if kind == 'otel':
+        if otel_metrics is None:
+            logging.warning('TELEMETRY_EXPORTER=otel but opentelemetry is not installed; keeping metrics in memory')
+            return InMemoryExporter()
+        if os.environ.get("APPLICATIONINSIGHTS_CONNECTION_STRING"):
+            try:
+                from azure.monitor.opentelemetry import configure_azure_monitor
+                configure_azure_monitor()
+            except ImportError:
+                logging.warning('azure-monitor-opentelemetry is not installed; using the global OpenTelemetry providers')
+        return OpenTelemetryExporter()
+    return InMemoryExporter()
+
+
+@contextmanager
+def span(name: str, metric: str, **attributes) -> Iterator[Span]:
+    """
+    Time the enclosed block and record its duration in `metric`
+
+    The span's 'status' attribute is 'error' when the block raises (the
+    exception propagates) and 'ok' otherwise, unless the block set it.
+    """
+    exporter = get_exporter()
+    current = Span(name, dict(attributes))
+    try:
+        with exporter.trace(name, current.attributes):
+            yield current
+        current.attributes.setdefault('status', 'ok')
+    except BaseException as e:
+        current.attributes['status'] = 'error'
+        if getattr(e, 'status_code', None) is not None:
+            current.attributes['status_code'] = e.status_code
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - current.started) * 1000
+        exporter.record(metric, current.duration_ms, current.attributes)
+
+
+# ============================================================================
+# Routes
+# ============================================================================
+
+def traced_route(handler: Callable):
+    """
+    Record the route's latency, status code and total Cosmos RU per request
+
+    Place it directly under @app.route (outside cached_response, so cache
+    hits are measured too). Extra binding arguments pass through unchanged;
+    async handlers get an async wrapper. Calls awaited or offloaded with
+    asyncio.to_thread from the handler still roll up into its span.
+    """
+    route = handler.__name__
+
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            exporter = get_exporter()
+            with span(route, 'http.server.duration', route=route) as current:
+                token = _current_route.set(current)
+                try:
+                    response = await handler(*args, **kwargs)
+                    current.set('status_code', response.status_code)
+                    return response
+                finally:
+                    _current_route.reset(token)
+                    exporter.record('http.server.request_charge', current.request_charge, {'route': route})
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        exporter = get_exporter()
+        with span(route, 'http.server.duration', route=route) as current:
+            token = _current_route.set(current)
+            try:
+                response = handler(*args, **kwargs)
+                current.set('status_code', response.status_code)
+                return response
+            finally:
+                _current_route.reset(token)
+                exporter.record('http.server.request_charge', current.request_charge, {'route': route})
+    return wrapper
+
+
+# ============================================================================
+# Cosmos
+# ============================================================================
+
+class InstrumentedContainer:
+    """
+    ContainerProxy wrapper that times every data-plane call and reads its
+    request charge and throttle-retry count through a response_hook
+    (chained with any hook the caller passed). Queries are timed while they
+    are iterated, since that is when pages are fetched.
+    """
+
+    OPERATIONS = ('read_item', 'create_item', 'upsert_item', 'replace_item', 'patch_item',
+                  'delete_item', 'execute_item_batch')
+
+    def __init__(self, container):
+        self._container = container
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._container, name)
+        if name in self.OPERATIONS:
+            return functools.partial(self._call, name, attribute)
+        return attribute
+
+    def _call(self, operation: str, method: Callable, *args, **kwargs):
+        with span(operation, 'db.client.operation.duration', **{
+                'db.operation': operation, 'db.cosmosdb.container': self._container.id}) as current:
+            kwargs['response_hook'] = current.cosmos_hook(kwargs.get('response_hook'))
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _record_charge(operation, self._container.id, current)
+
+    def query_items(self, *args, **kwargs):
+        measurement = _QueryMeasurement(self._container.id)
+        kwargs['response_hook'] = measurement.hook(kwargs.get('response_hook'))
+        return _TimedQuery(self._container.query_items(*args, **kwargs), measurement)
+
+
+def _record_charge(operation: str, container_id: str, current: Span) -> None:
+    attributes = {'db.operation': operation, 'db.cosmosdb.container': container_id}
+    exporter = get_exporter()
+    exporter.record('db.cosmosdb.request_charge', current.request_charge, attributes)
+    exporter.record('db.cosmosdb.retries', current.retries, attributes)
+
+
+class _QueryMeasurement:
+    """
+    The span of a query's fetches. The response_hook is fixed when the query
+    is created, so it adds to whichever span is current; paged reads start
+    a new span per page.
+    """
+
+    def __init__(self, container_id: str):
+        self.container_id = container_id
+        self.span = self._new_span()
+        self.fetching = False
+        self.finished = False
+
+    def _new_span(self) -> Span:
+        return Span('query_items', {'db.operation': 'query_items', 'db.cosmosdb.container': self.container_id})
+
+    def hook(self, chained: Optional[Callable]) -> Callable:
+        def hook(headers, result=None):
+            self.span.cosmos_hook(chained)(headers, result)
+        return hook
+
+    def timed(self, fetch: Callable):
+        started = time.perf_counter()
+        self.fetching = True
+        try:
+            return fetch()
+        except StopIteration:
+            raise
+        except Exception:
+            self.span.set('status', 'error')
+            self.finish()
+            raise
+        finally:
+            self.span.duration_ms += (time.perf_counter() - started) * 1000
+
+    async def timed_async(self, fetch: Callable):
+        started = time.perf_counter()
+        self.fetching = True
+        try:
+            return await fetch()
+        except StopAsyncIteration:
+            raise
+        except Exception:
+            self.span.set('status', 'error')
+            self.finish()
+            raise
+        finally:
+            self.span.duration_ms += (time.perf_counter() - started) * 1000
+
+    def finish(self) -> None:
+        if self.finished or not self.fetching:
+            return
+        self.finished = True
+        self.span.attributes.setdefault('status', 'ok')
+        get_exporter().record('db.client.operation.duration', self.span.duration_ms, self.span.attributes)
+        _record_charge('query_items', self.container_id, self.span)
+
+    def next_page(self) -> None:
+        self.finish()
+        self.span = self._new_span()
+        self.fetching = False
+        self.finished = False
+
+
+class _TimedQuery:
+    """
+    Query result proxy: iteration is timed as one operation, recorded when
+    the results run out (or when an abandoned iterator is collected);
+    by_page() records one operation per page fetched
+    """
+
+    def __init__(self, inner, measurement: _QueryMeasurement):
+        self._inner = inner
+        self._iterator = None
+        self._measurement = measurement
+
+    def __getattr__(self, name: str):
+        return getattr(self._inner, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._inner)
+        try:
+            return self._measurement.timed(lambda: next(self._iterator))
+        except StopIteration:
+            self._measurement.finish()
+            raise
+
+    def __del__(self):
+        try:
+            self._measurement.finish()
+        except Exception:
+            pass
+
+    def by_page(self, continuation_token: Optional[str] = None):
+        return _TimedPager(self._inner.by_page(continuation_token), self._measurement)
+
+
+class _TimedPager:
+    def __init__(self, inner, measurement: _QueryMeasurement):
+        self._inner = inner
+        self._measurement = measurement
+
+    def __getattr__(self, name: str):
+        # continuation_token and the rest of the page iterator
+        return getattr(self._inner, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._measurement.next_page()
+        page = self._measurement.timed(lambda: next(self._inner))
+        self._measurement.finish()
+        return page
+
+
+class InstrumentedAsyncContainer(InstrumentedContainer):
+    """InstrumentedContainer for an azure.cosmos.aio ContainerProxy; calls are timed until awaited"""
+
+    async def _call(self, operation: str, method: Callable, *args, **kwargs):
+        with span(operation, 'db.client.operation.duration', **{
+                'db.operation': operation, 'db.cosmosdb.container': self._container.id}) as current:
+            kwargs['response_hook'] = current.cosmos_hook(kwargs.get('response_hook'))
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _record_charge(operation, self._container.id, current)
+
+    def query_items(self, *args, **kwargs):
+        measurement = _QueryMeasurement(self._container.id)
+        kwargs['response_hook'] = measurement.hook(kwargs.get('response_hook'))
+        return _TimedAsyncQuery(self._container.query_items(*args, **kwargs), measurement)
+
+
+class _TimedAsyncQuery:
+    """_TimedQuery for `async for` over an aio query"""
+
+    def __init__(self, inner, measurement: _QueryMeasurement):
+        self._inner = inner
+        self._iterator = None
+        self._measurement = measurement
+
+    def __getattr__(self, name: str):
+        return getattr(self._inner, name)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._inner.__aiter__()
+        try:
+            return await self._measurement.timed_async(self._iterator.__anext__)
+        except StopAsyncIteration:
+            self._measurement.finish()
+            raise
+
+    def __del__(self):
+        try:
+            self._measurement.finish()
+        except Exception:
+            pass
+
+
+def instrument_container(container):
+    return InstrumentedContainer(container)
+
+
+def instrument_async_container(container):
+    return InstrumentedAsyncContainer(container)
+
+
+# ============================================================================
+# Outbound HTTP
+# ============================================================================
+
+@contextmanager
+def http_span(peer: str, method: str) -> Iterator[Span]:
+    """Time an outbound HTTP call; set 'status_code' on the span once the response arrives"""
+    with span(f'{method} {peer}', 'http.client.duration', peer=peer, method=method) as current:
+        yield current
+
+
+# ============================================================================
+# Logging
+# ============================================================================
+
+def payload_sample_rate() -> float:
+    return float(os.environ.get("PAYLOAD_LOG_SAMPLE_RATE", "0.01"))
+
+
+def log_sampled(level: int, message: str, *args, rate: Optional[float] = None) -> None:
+    """
+    logging.log for payload-sized messages, emitted for a sample of calls
+
+    Arguments are formatted by logging itself, and only for the sampled
+    calls at an enabled level, so skipped calls cost a random() and a
+    level check rather than building the string.
+
+    Setting:
+        PAYLOAD_LOG_SAMPLE_RATE: fraction of payload log calls emitted (default 0.01)
+    """
+    if random.random() >= (payload_sample_rate() if rate is None else rate):
+        return
+    logger = logging.getLogger()
+    if logger.isEnabledFor(level):
+        logger.log(level, message, *args)
@@ -0,0 +1,230 @@
+"""
+Visitor Counter Engine
+Atomic server-side increments with optional N-way sharding so concurrent
+visitors never race on a read-modify-write of one hot document
+"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
+
+
+SHARD_TOTAL_QUERY = "SELECT VALUE SUM(c['count']) FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+SHARD_COUNTS_QUERY = "SELECT c.id, c['count'] FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+
+# Seconds the other shards' counts are reused by increment() before re-querying
+SHARD_TOTAL_TTL = 1.0
+
+# (container id, counter id, shard count) -> (fetched at, {shard id: count})
+_shard_counts: Dict[Tuple[str, str, int], Tuple[float, Dict[str, int]]] = {}
+_shard_counts_lock = threading.Lock()
+
+
+class ShardedCounter:
+    """
+    Counter stored as one or more documents that are incremented with
+    Cosmos patch 'incr' operations and summed on read.
+
+    Shard 0 is the original counter document (same id), so switching from
+    one shard to many keeps the existing count without a migration.
+
+    With several shards, increment() adds the patched shard's new value to
+    the other shards' counts cached (per process) for `total_ttl` seconds,
+    so a hit costs one patch rather than a patch and a cross-partition
+    query; read() always sums every shard.
+    """
+
+    def __init__(self, container: ContainerProxy, counter_id: str, shard_count: int = 1,
+                 total_ttl: float = SHARD_TOTAL_TTL):
+        self.container = container
+        self.counter_id = counter_id
+        self.shard_count = max(1, shard_count)
+        self.total_ttl = total_ttl
+
+    def shard_ids(self) -> List[str]:
+        """Document ids of every shard, shard 0 first"""
+        return [self.counter_id] + [
+            f'{self.counter_id}-shard-{i}' for i in range(1, self.shard_count)
+        ]
+
+    def pick_shard_id(self) -> str:
+        """Random shard id, spreading writes evenly across shards"""
+        return random.choice(self.shard_ids())
+
+    def increment(self, amount: int = 1) -> int:
+        """
+        Atomically add amount to a random shard
+
+        Returns:
+            The counter total after the increment (other shards up to total_ttl seconds old)
+        """
+        shard_id = self.pick_shard_id()
+        item = increment_fields(self.container, shard_id, {'/count': amount})
+        if self.shard_count == 1:
+            return item['count']
+        counts = self._cached_counts()
+        if counts is None:
+            counts = self._cache_counts(self.container.query_items(
+                query=SHARD_COUNTS_QUERY,
+                parameters=[{'name': '@ids', 'value': self.shard_ids()}],
+                enable_cross_partition_query=True
+            ))
+        return self._total_with(counts, shard_id, item['count'])
+
+    async def increment_async(self, amount: int = 1) -> int:
+        """increment() when container is an async client"""
+        shard_id = self.pick_shard_id()
+        item = await increment_fields_async(self.container, shard_id, {'/count': amount})
+        if self.shard_count == 1:
+            return item['count']
+        counts = self._cached_counts()
+        if counts is None:
+            counts = self._cache_counts([row async for row in self.container.query_items(
+                query=SHARD_COUNTS_QUERY, parameters=[{'name': '@ids', 'value': self.shard_ids()}])])
+        return self._total_with(counts, shard_id, item['count'])
+
+    def read(self) -> int:
+        """Sum of every shard (0 if the counter has never been incremented)"""
+        if self.shard_count == 1:
+            try:
+                item = self.container.read_item(item=self.counter_id, partition_key=self.counter_id)
+                return item.get('count', 0)
+            except CosmosResourceNotFoundError:
+                return 0
+
+        totals = list(self.container.query_items(
+            query=SHARD_TOTAL_QUERY,
+            parameters=[{'name': '@ids', 'value': self.shard_ids()}],
+            enable_cross_partition_query=True
+        ))
+        return sum(t for t in totals if t)
+
+    @property
+    def _cache_key(self) -> Tuple[str, str, int]:
+        return getattr(self.container, 'id', str(id(self.container))), self.counter_id, self.shard_count
+
+    def _cached_counts(self) -> Optional[Dict[str, int]]:
+        """Cached per-shard counts, or None when this caller should re-query them"""
+        now = time.monotonic()
+        with _shard_counts_lock:
+            entry = _shard_counts.get(self._cache_key)
+            if entry is None:
+                return None
+            fetched_at, counts = entry
+            if now - fetched_at >= self.total_ttl:
+                # This caller refreshes; concurrent callers keep the stale counts meanwhile
+                _shard_counts[self._cache_key] = (now, counts)
+                return None
+            return counts
+
+    def _cache_counts(self, rows: Iterable[Dict]) -> Dict[str, int]:
+        counts = {row['id']: row.get('count') or 0 for row in rows}
+        with _shard_counts_lock:
+            _shard_counts[self._cache_key] = (time.monotonic(), counts)
+        return counts
+
+    def _total_with(self, counts: Dict[str, int], shard_id: str, value: int) -> int:
+        with _shard_counts_lock:
+            counts[shard_id] = max(counts.get(shard_id, 0), value)
+            return sum(counts.values())
+
+
+# Cosmos allows at most 10 operations in one patch request
+MAX_PATCH_OPERATIONS = 10
+
+
+class PartialIncrementError(Exception):
+    """
+    A multi-chunk increment failed after earlier chunks were committed.
+    `remaining` holds only the increments that were not applied, so a retry
+    of it does not count the committed ones twice.
+    """
+
+    def __init__(self, item_id: str, remaining: Dict[str, int], cause: Exception):
+        super().__init__(f'{len(remaining)} increments to {item_id} not applied: {cause}')
+        self.item_id = item_id
+        self.remaining = remaining
+
+
+def increment_fields(container: ContainerProxy, item_id: str, increments: Dict[str, int]) -> Dict:
+    """
+    Atomically add to numeric fields of a document, creating it on first use
+
+    Args:
+        container: Container whose partition key is /id
+        item_id: Document id
+        increments: {'/json/path': amount}, missing fields start at 0
+
+    Returns:
+        The document after the last patch
+
+    Raises:
+        PartialIncrementError: a chunk after the first failed; earlier chunks are committed
+    """
+    item = None
+    chunks = _increment_chunks(increments)
+    for index, chunk in enumerate(chunks):
+        try:
+            item = container.patch_item(item=item_id, partition_key=item_id, patch_operations=chunk)
+        except CosmosResourceNotFoundError as e:
+            if index > 0:
+                raise PartialIncrementError(item_id, _unapplied(chunks[index:]), e) from e
+            # First write to this document: create it, or patch if another request won the race
+            try:
+                item = container.create_item(body=_document_from_paths(item_id, increments))
+                logging.info(f'Created counter document {item_id}')
+                return item
+            except CosmosResourceExistsError:
+                item = container.patch_item(item=item_id, partition_key=item_id, patch_operations=chunk)
+        except Exception as e:
+            if index > 0:
+                raise PartialIncrementError(item_id, _unapplied(chunks[index:]), e) from e
+            raise
+    return item
+
+
+async def increment_fields_async(container, item_id: str, increments: Dict[str, int]) -> Dict:
+    """increment_fields() with an async container client"""
+    item = None
+    chunks = _increment_chunks(increments)
+    for index, chunk in enumerate(chunks):
+        try:
+            item = await container.patch_item(item=item_id, partition_key=item_id, patch_operations=chunk)
+        except CosmosResourceNotFoundError as e:
+            if index > 0:
+                raise PartialIncrementError(item_id, _unapplied(chunks[index:]), e) from e
+            try:
+                item = await container.create_item(body=_document_from_paths(item_id, increments))
+                logging.info(f'Created counter document {item_id}')
+                return item
+            except CosmosResourceExistsError:
+                item = await container.patch_item(item=item_id, partition_key=item_id, patch_operations=chunk)
+        except Exception as e:
+            if index > 0:
+                raise PartialIncrementError(item_id, _unapplied(chunks[index:]), e) from e
+            raise
+    return item
+
+
+def _increment_chunks(increments: Dict[str, int]) -> List[List[Dict]]:
+    operations = [{'op': 'incr', 'path': path, 'value': amount} for path, amount in increments.items()]
+    return [operations[i:i + MAX_PATCH_OPERATIONS] for i in range(0, len(operations), MAX_PATCH_OPERATIONS)]
+
+
+def _unapplied(chunks: List[List[Dict]]) -> Dict[str, int]:
+    return {operation['path']: operation['value'] for chunk in chunks for operation in chunk}
+
+
+def _document_from_paths(item_id: str, values: Dict[str, int]) -> Dict:
+    document = {'id': item_id}
+    for path, value in values.items():
+        parts = [p for p in path.split('/') if p]
+        parent = document
+        for part in parts[:-1]:
+            parent = parent.setdefault(part, {})
+        parent[parts[-1]] = value
+    return document
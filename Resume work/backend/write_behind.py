@@ -0,0 +1,447 @@
+"""
+Write-Behind Buffer
+Coalesces counter increments and event documents in memory and flushes
+them to Cosmos DB in bulk, so tracking endpoints return without waiting
+on a database write
+
+Buffered writes are lost if the worker dies without a clean shutdown
+(crash, SIGKILL, the host's stop timeout): up to WRITE_BEHIND_FLUSH_INTERVAL
+seconds or WRITE_BEHIND_FLUSH_SIZE events per worker. That is why the
+feature is off unless WRITE_BEHIND_ENABLED is set.
+"""
+import atexit
+import json
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from azure.cosmos import ContainerProxy
+
+from visitor_counter import PartialIncrementError, ShardedCounter, increment_fields
+
+# (container name, document id) -> {json path: amount}
+IncrementKey = Tuple[str, str]
+
+
+class WriteBehindBuffer:
+    """
+    In-process buffer flushed on a size or time threshold.
+
+    Increments to the same document are merged into one patch per flush and
+    documents are upserted concurrently, so a burst of N requests costs a
+    handful of writes instead of N. Anything still buffered when the worker
+    shuts down is flushed, or spilled and replayed by the next buffer that
+    starts. With `spill_container` the spill goes to documents in that
+    container, which any instance claims (by deleting them) and replays;
+    the local JSON-lines file is the fallback when that write fails too,
+    and is lost with the instance on the Consumption plan.
+    """
+
+    # Parallel writes per flush
+    FLUSH_CONCURRENCY = 8
+    # Longest the flusher sleeps before checking for a stop requested from a signal handler
+    STOP_POLL_INTERVAL = 0.25
+    # Spill documents: id prefix and records per document (well under the 2 MB item limit)
+    SPILL_ID_PREFIX = 'write-behind-spill-'
+    SPILL_RECORDS_PER_DOCUMENT = 500
+
+    def __init__(self, container_factory: Callable[[str], ContainerProxy],
+                 flush_size: int = 50, flush_interval: float = 5.0,
+                 spill_path: Optional[str] = None, spill_container: Optional[str] = None):
+        self.container_factory = container_factory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path or os.path.join(tempfile.gettempdir(), 'write_behind_spill.jsonl')
+        self.spill_container = spill_container
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._stop_requested = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Set by the flusher once a requested stop has flushed and spilled; on_stop runs after it
+        self.stop_complete = False
+        self.on_stop: Optional[Callable[[], None]] = None
+
+        self._increments: Dict[IncrementKey, Dict[str, int]] = {}
+        self._documents: Dict[str, List[Dict]] = {}
+        self._in_flight: Dict[IncrementKey, Dict[str, int]] = {}
+        self._pending_events = 0
+
+        # Bumped after every flush that wrote something, so readers know cached totals are stale
+        self.flush_generation = 0
+
+        self._replay_spill()
+        if spill_container:
+            # The flusher claims spill documents left by other instances before its first wait
+            self._ensure_thread()
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+
+    def add_increment(self, container_name: str, item_id: str, path: str = '/count', amount: int = 1) -> None:
+        """Buffer an atomic increment of one numeric field"""
+        with self._lock:
+            fields = self._increments.setdefault((container_name, item_id), {})
+            fields[path] = fields.get(path, 0) + amount
+            self._pending_events += 1
+        self._after_add()
+
+    def add_document(self, container_name: str, body: Dict) -> None:
+        """Buffer a document to be upserted (must carry its own id)"""
+        with self._lock:
+            self._documents.setdefault(container_name, []).append(body)
+            self._pending_events += 1
+        self._after_add()
+
+    def pending_amount(self, container_name: str, item_ids: Iterable[str], path: str = '/count') -> int:
+        """Sum of buffered and in-flight increments not yet visible in Cosmos"""
+        total = 0
+        with self._lock:
+            for item_id in item_ids:
+                key = (container_name, item_id)
+                total += self._increments.get(key, {}).get(path, 0)
+                total += self._in_flight.get(key, {}).get(path, 0)
+        return total
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def flush(self) -> None:
+        """Write everything buffered so far; failed writes (only their unapplied fields) are re-queued"""
+        with self._flush_lock:
+            with self._lock:
+                increments, self._increments = self._increments, {}
+                documents, self._documents = self._documents, {}
+                self._in_flight = increments
+                self._pending_events = 0
+
+            if not increments and not documents:
+                return
+
+            failed_increments: Dict[IncrementKey, Dict[str, int]] = {}
+            failed_documents: Dict[str, List[Dict]] = {}
+
+            jobs = [('increment', key, fields) for key, fields in increments.items()]
+            jobs += [('document', name, body) for name, bodies in documents.items() for body in bodies]
+
+            with ThreadPoolExecutor(max_workers=self.FLUSH_CONCURRENCY) as pool:
+                results = list(pool.map(self._write, jobs))
+
+            for (kind, key, payload), error in zip(jobs, results):
+                if error is None:
+                    continue
+                if kind == 'increment':
+                    # Chunks committed before a failure must not be re-applied
+                    failed_increments[key] = error.remaining if isinstance(error, PartialIncrementError) else payload
+                else:
+                    failed_documents.setdefault(key, []).append(payload)
+
+            with self._lock:
+                self._in_flight = {}
+                for key, fields in failed_increments.items():
+                    merged = self._increments.setdefault(key, {})
+                    for path, amount in fields.items():
+                        merged[path] = merged.get(path, 0) + amount
+                for name, bodies in failed_documents.items():
+                    self._documents.setdefault(name, []).extend(bodies)
+                self._pending_events += len(failed_increments) + sum(len(b) for b in failed_documents.values())
+                self.flush_generation += 1
+
+            written = len(jobs) - len(failed_increments) - sum(len(b) for b in failed_documents.values())
+            logging.info(f'Write-behind flush: {written} writes applied, {len(jobs) - written} re-queued')
+
+    @contextmanager
+    def between_flushes(self, wait: bool = True) -> Iterator[bool]:
+        """
+        Keep flushes out for the duration of the block, so a read inside it
+        sees none or all of a flush's writes. Yields whether it got in: with
+        wait=False it yields False at once while a flush is running.
+        """
+        if not self._flush_lock.acquire(blocking=wait):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self._flush_lock.release()
+
+    def shutdown(self) -> None:
+        """Final flush on worker shutdown; anything that still fails is spilled to disk"""
+        self._stopped = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f'Write-behind final flush failed: {str(e)}')
+        self._spill()
+
+    def request_stop(self) -> None:
+        """
+        Ask the flusher thread to run shutdown() and then on_stop. Only
+        assigns a flag (no locks, no I/O), so it is safe in a signal handler.
+        """
+        self._stop_requested = True
+
+    @property
+    def flusher_alive(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def _write(self, job) -> Optional[Exception]:
+        kind, key, payload = job
+        try:
+            if kind == 'increment':
+                container_name, item_id = key
+                increment_fields(self.container_factory(container_name), item_id, payload)
+            else:
+                self.container_factory(key).upsert_item(body=payload)
+            return None
+        except Exception as e:
+            logging.warning(f'Write-behind {kind} write to {key} failed: {str(e)}')
+            return e
+
+    def _after_add(self) -> None:
+        self._ensure_thread()
+        if self._pending_events >= self.flush_size:
+            self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        if self.spill_container:
+            self._replay_spill_documents()
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stopped:
+            # Wait in short slices: request_stop() cannot set the Event from a signal handler
+            woken = self._wake.wait(min(self.STOP_POLL_INTERVAL, self.flush_interval))
+            if self._stop_requested:
+                self._stop()
+                return
+            if not woken and time.monotonic() < next_flush:
+                continue
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f'Write-behind flush failed: {str(e)}')
+            next_flush = time.monotonic() + self.flush_interval
+
+    def _stop(self) -> None:
+        self.shutdown()
+        self.stop_complete = True
+        if self.on_stop is not None:
+            self.on_stop()
+
+    # ------------------------------------------------------------------
+    # Durable fallback
+    # ------------------------------------------------------------------
+
+    def _spill(self) -> None:
+        with self._lock:
+            increments, self._increments = self._increments, {}
+            documents, self._documents = self._documents, {}
+        records = [{'kind': 'increment', 'container': container_name, 'id': item_id, 'fields': fields}
+                   for (container_name, item_id), fields in increments.items()]
+        records += [{'kind': 'document', 'container': container_name, 'body': body}
+                    for container_name, bodies in documents.items() for body in bodies]
+        if not records:
+            return
+
+        if self.spill_container:
+            records = self._spill_documents(records)
+            if not records:
+                return
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as spill:
+                for record in records:
+                    spill.write(json.dumps(record) + '\n')
+            logging.warning(f'Write-behind spilled {len(records)} unflushed writes to {self.spill_path}')
+        except OSError as e:
+            logging.error(f'Write-behind spill failed, buffered writes lost: {str(e)}')
+
+    def _spill_documents(self, records: List[Dict]) -> List[Dict]:
+        """Write records to spill documents; returns the records that could not be written"""
+        size = self.SPILL_RECORDS_PER_DOCUMENT
+        for start in range(0, len(records), size):
+            try:
+                self.container_factory(self.spill_container).create_item(body={
+                    'id': f'{self.SPILL_ID_PREFIX}{uuid.uuid4().hex}',
+                    'records': records[start:start + size]
+                })
+            except Exception as e:
+                logging.error(f'Write-behind spill to {self.spill_container} failed: {str(e)}')
+                return records[start:]
+        logging.warning(f'Write-behind spilled {len(records)} unflushed writes to {self.spill_container}')
+        return []
+
+    def _replay_spill(self) -> None:
+        """Load writes spilled by a previous worker back into the buffer"""
+        if not os.path.exists(self.spill_path):
+            return
+        replay_path = f'{self.spill_path}.replay'
+        try:
+            os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding='utf-8') as spill:
+                records = [json.loads(line) for line in spill if line.strip()]
+            os.remove(replay_path)
+        except (OSError, ValueError) as e:
+            logging.error(f'Could not replay write-behind spill file: {str(e)}')
+            return
+
+        self._load_records(records)
+        logging.info(f'Replayed {len(records)} spilled write-behind records')
+        self._ensure_thread()
+
+    def _replay_spill_documents(self) -> None:
+        """Claim spill documents written by any instance and load them into the buffer"""
+        try:
+            container = self.container_factory(self.spill_container)
+            ids = list(container.query_items(
+                query="SELECT VALUE c.id FROM c WHERE STARTSWITH(c.id, @prefix)",
+                parameters=[{'name': '@prefix', 'value': self.SPILL_ID_PREFIX}],
+                enable_cross_partition_query=True
+            ))
+        except Exception as e:
+            logging.error(f'Could not list write-behind spill documents: {str(e)}')
+            return
+
+        replayed = 0
+        for spill_id in ids:
+            try:
+                records = container.read_item(item=spill_id, partition_key=spill_id)['records']
+                # Deleting is the claim: only the instance whose delete succeeds replays the document
+                container.delete_item(item=spill_id, partition_key=spill_id)
+            except Exception as e:
+                logging.info(f'Write-behind spill document {spill_id} not claimed: {str(e)}')
+                continue
+            self._load_records(records)
+            replayed += len(records)
+        if replayed:
+            logging.info(f'Replayed {replayed} write-behind records from {self.spill_container}')
+            self._wake.set()
+
+    def _load_records(self, records: List[Dict]) -> None:
+        with self._lock:
+            for record in records:
+                if record['kind'] == 'increment':
+                    merged = self._increments.setdefault((record['container'], record['id']), {})
+                    for path, amount in record['fields'].items():
+                        merged[path] = merged.get(path, 0) + amount
+                else:
+                    self._documents.setdefault(record['container'], []).append(record['body'])
+                self._pending_events += 1
+
+
+class BufferedCounter:
+    """
+    ShardedCounter whose increments go through a WriteBehindBuffer.
+
+    The returned total is the last count read from Cosmos plus whatever this
+    worker has buffered; the base is re-read only after a flush lands.
+    """
+
+    def __init__(self, buffer: WriteBehindBuffer, container_name: str, counter_id: str, shard_count: int = 1):
+        self.buffer = buffer
+        self.container_name = container_name
+        self.counter_id = counter_id
+        self.shard_count = shard_count
+        self._lock = threading.Lock()
+        self._base: Optional[int] = None
+        self._base_generation = -1
+
+    def increment(self, amount: int = 1) -> int:
+        """Buffer an increment and return the estimated new total"""
+        counter = ShardedCounter(self.buffer.container_factory(self.container_name),
+                                 self.counter_id, shard_count=self.shard_count)
+        self.buffer.add_increment(self.container_name, counter.pick_shard_id(), '/count', amount)
+        return self._read_base(counter) + self.buffer.pending_amount(self.container_name, counter.shard_ids())
+
+    def _read_base(self, counter: ShardedCounter) -> int:
+        with self._lock:
+            if self._base is not None and self._base_generation == self.buffer.flush_generation:
+                return self._base
+
+            # Reading mid-flush would count in-flight increments twice; keep the old base until it lands
+            with self.buffer.between_flushes(wait=self._base is None) as idle:
+                if idle:
+                    self._base_generation = self.buffer.flush_generation
+                    self._base = counter.read()
+            return self._base
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer(container_factory: Callable[[str], ContainerProxy]) -> WriteBehindBuffer:
+    """
+    Process-wide buffer configured from app settings, flushed on shutdown
+
+    Settings:
+        WRITE_BEHIND_FLUSH_SIZE: buffered events that trigger a flush (default 50)
+        WRITE_BEHIND_FLUSH_INTERVAL: seconds between flushes (default 5)
+        WRITE_BEHIND_SPILL_CONTAINER: container for spill documents (default Counter,
+            empty spills to the local file only)
+        WRITE_BEHIND_SPILL_PATH: local JSON-lines fallback for writes left at shutdown
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    container_factory,
+                    flush_size=int(os.environ.get("WRITE_BEHIND_FLUSH_SIZE", "50")),
+                    flush_interval=float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "5")),
+                    spill_path=os.environ.get("WRITE_BEHIND_SPILL_PATH"),
+                    spill_container=os.environ.get("WRITE_BEHIND_SPILL_CONTAINER", "Counter") or None
+                )
+                _register_shutdown(_buffer)
+    return _buffer
+
+
+def _register_shutdown(buffer: WriteBehindBuffer) -> None:
+    atexit.register(buffer.shutdown)
+
+    # The host stops workers with SIGTERM, which skips atexit by default.
+    # Flushing inside the handler could deadlock on a lock the interrupted
+    # thread holds, so the handler only asks the flusher thread to stop; the
+    # flusher flushes, spills and re-sends SIGTERM, which then takes the
+    # previous action.
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            if not buffer.stop_complete and buffer.flusher_alive:
+                buffer.request_stop()
+                return
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        buffer.on_stop = lambda: os.kill(os.getpid(), signal.SIGTERM)
+    except ValueError:
+        # Not on the main thread; atexit is the best we can do
+        pass
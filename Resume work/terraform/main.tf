@@ -78,6 +78,9 @@ resource "azurerm_cosmosdb_sql_container" "resume_downloads" {
   database_name         = azurerm_cosmosdb_sql_database.portfolio.name
   partition_key_paths   = ["/id"]
   
+  # Totals and analytics are served from rollups, so raw events can expire
+  default_ttl           = var.resume_downloads_ttl_seconds
+  
   lifecycle {
     prevent_destroy = true
     ignore_changes = [
@@ -94,17 +97,182 @@ resource "azurerm_cosmosdb_sql_container" "contact_messages" {
   account_name          = azurerm_cosmosdb_account.portfolio.name
   database_name         = azurerm_cosmosdb_sql_database.portfolio.name
   partition_key_paths   = ["/id"]
+
+  # Serves GetPrioritizedMessages (see backend/inbox.py); message bodies are
+  # never filtered or sorted on, so they are left out of the index
+  indexing_policy {
+    indexing_mode = "consistent"
+
+    included_path {
+      path = "/*"
+    }
+
+    excluded_path {
+      path = "/message/?"
+    }
+
+    excluded_path {
+      path = "/\"_etag\"/?"
+    }
+
+    composite_index {
+      index {
+        path  = "/analysis/is_spam"
+        order = "Ascending"
+      }
+      index {
+        path  = "/analysis/priority_score"
+        order = "Descending"
+      }
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+
+    composite_index {
+      index {
+        path  = "/analysis/priority_score"
+        order = "Descending"
+      }
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+
+    composite_index {
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+  }
   
   lifecycle {
     prevent_destroy = true
     ignore_changes = [
       partition_key_version,
-      indexing_policy,
       conflict_resolution_policy
     ]
   }
 }
 
+# Time-bucketed copies of the two event containers, partitioned by month
+# ("yyyy-MM") so time-range queries touch one or two partitions. Filled by
+# backend/partition_migration.py; PARTITION_MIGRATION_MODE selects which
+# layout the functions read (see backend/partitioning.py).
+resource "azurerm_cosmosdb_sql_container" "resume_downloads_by_month" {
+  name                  = "ResumeDownloadsByMonth"
+  resource_group_name   = azurerm_cosmosdb_account.portfolio.resource_group_name
+  account_name          = azurerm_cosmosdb_account.portfolio.name
+  database_name         = azurerm_cosmosdb_sql_database.portfolio.name
+  partition_key_paths   = ["/bucket"]
+  
+  default_ttl           = var.resume_downloads_ttl_seconds
+  
+  lifecycle {
+    prevent_destroy = true
+  }
+}
+
+resource "azurerm_cosmosdb_sql_container" "contact_messages_by_month" {
+  name                  = "ContactMessagesByMonth"
+  resource_group_name   = azurerm_cosmosdb_account.portfolio.resource_group_name
+  account_name          = azurerm_cosmosdb_account.portfolio.name
+  database_name         = azurerm_cosmosdb_sql_database.portfolio.name
+  partition_key_paths   = ["/bucket"]
+
+  # Same policy as ContactMessages
+  indexing_policy {
+    indexing_mode = "consistent"
+
+    included_path {
+      path = "/*"
+    }
+
+    excluded_path {
+      path = "/message/?"
+    }
+
+    excluded_path {
+      path = "/\"_etag\"/?"
+    }
+
+    composite_index {
+      index {
+        path  = "/analysis/is_spam"
+        order = "Ascending"
+      }
+      index {
+        path  = "/analysis/priority_score"
+        order = "Descending"
+      }
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+
+    composite_index {
+      index {
+        path  = "/analysis/priority_score"
+        order = "Descending"
+      }
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+
+    composite_index {
+      index {
+        path  = "/timestamp"
+        order = "Descending"
+      }
+      index {
+        path  = "/id"
+        order = "Descending"
+      }
+    }
+  }
+  
+  lifecycle {
+    prevent_destroy = true
+  }
+}
+
+resource "azurerm_cosmosdb_sql_container" "api_cache" {
+  name                  = "ApiCache"
+  resource_group_name   = azurerm_cosmosdb_account.portfolio.resource_group_name
+  account_name          = azurerm_cosmosdb_account.portfolio.name
+  database_name         = azurerm_cosmosdb_sql_database.portfolio.name
+  partition_key_paths   = ["/id"]
+  
+  # Entries carry their own ttl; -1 enables per-item expiry
+  default_ttl           = -1
+}
+
 # Application Insights for monitoring
 resource "azurerm_application_insights" "portfolio" {
   name                = "appi-portfolio-prod"
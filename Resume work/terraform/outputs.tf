@@ -36,7 +36,10 @@ output "deployment_summary" {
     containers       = [
       azurerm_cosmosdb_sql_container.counter.name,
       azurerm_cosmosdb_sql_container.resume_downloads.name,
-      azurerm_cosmosdb_sql_container.contact_messages.name
+      azurerm_cosmosdb_sql_container.contact_messages.name,
+      azurerm_cosmosdb_sql_container.resume_downloads_by_month.name,
+      azurerm_cosmosdb_sql_container.contact_messages_by_month.name,
+      azurerm_cosmosdb_sql_container.api_cache.name
     ]
   }
 }
@@ -44,6 +44,12 @@ variable "location" {
   type        = string
 }
 
+# Data Retention
+variable "resume_downloads_ttl_seconds" {
+  description = "TTL for raw ResumeDownloads events (null = keep forever, -1 = TTL on with per-item expiry only). Seed the download rollups before enabling."
+  type        = number
+  default     = null
+}
 
 # Tags
 variable "tags" {